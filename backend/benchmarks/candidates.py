@@ -0,0 +1,81 @@
+"""
+Report how two-stage ranking with a candidate budget compares to scoring every game.
+
+Synthetic libraries (see benchmarks/synthetic.py) are drawn from the catalog in the
+database (DATABASE_URL). Every user is ranked exhaustively and with each candidate budget.
+For each budget the report gives the mean overlap of the top-N lists, the share of users whose
+top-N is identical in order, and the ranking latency of both paths.
+
+Usage (from backend/): python -m benchmarks.candidates [--budgets 500 1000 2000 5000] [--users 100]
+                       [--library-sizes 10 100 1000] [--top-n 10] [--output candidates.json]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.suite import latency_summary
+from benchmarks.synthetic import generate_libraries
+from models import init_db
+from recommender import Recommender
+
+
+def rank_all(recommender: Recommender, libraries, top_n: int, budget: int):
+    """Rank every library one request at a time; returns (rankings, latencies in seconds)."""
+    rankings, latencies = [], []
+    for library in libraries:
+        start = time.perf_counter()
+        ranked = recommender.rank_batch({None: (library, {})}, top_n, candidate_budget=budget)[None]
+        latencies.append(time.perf_counter() - start)
+        rankings.append([appid for appid, _ in ranked])
+    return rankings, latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budgets", type=int, nargs="+", default=[500, 1000, 2000, 5000])
+    parser.add_argument("--users", type=int, default=100, help="Libraries per library size")
+    parser.add_argument("--library-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    db = sessionmaker(bind=init_db())()
+    recommender = Recommender(db)
+    db.close()
+    index = recommender.index
+
+    # Build the similarity index and shortlists up front so they are not timed as ranking
+    start = time.perf_counter()
+    recommender.similarity_index()
+    recommender.candidate_generator()
+    print(f"{len(index)} games; candidate structures built in {time.perf_counter() - start:.1f}s")
+
+    report = {"games": len(index), "top_n": args.top_n, "library_sizes": {}}
+    # popularity_score is total reviews scaled to [0, 1]; scale it back up so the library
+    # generator's +1 smoothing stays negligible
+    for size, libraries in generate_libraries(index.appids, index.popularity_scores * 1e6, args.library_sizes,
+                                              args.users, seed=args.seed).items():
+        exhaustive, exhaustive_latencies = rank_all(recommender, libraries, args.top_n, 0)
+        results = {"exhaustive": latency_summary(exhaustive_latencies), "budgets": {}}
+        print(f"\n{size} owned games, {len(libraries)} users: exhaustive p50 "
+              f"{results['exhaustive']['p50_ms']:.2f} ms, p99 {results['exhaustive']['p99_ms']:.2f} ms")
+        print(f"  {'budget':>8} {'overlap':>8} {'identical':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        for budget in args.budgets:
+            ranked, latencies = rank_all(recommender, libraries, args.top_n, budget)
+            overlaps = [len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(ranked, exhaustive)]
+            identical = [a == b for a, b in zip(ranked, exhaustive)]
+            summary = {"overlap": float(np.mean(overlaps)), "identical": float(np.mean(identical)),
+                       **latency_summary(latencies)}
+            results["budgets"][str(budget)] = summary
+            print(f"  {budget:>8} {summary['overlap']:>8.1%} {summary['identical']:>10.1%} "
+                  f"{summary['p50_ms']:>8.2f} {summary['p99_ms']:>8.2f}")
+        report["library_sizes"][str(size)] = results
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
@@ -0,0 +1,110 @@
+"""
+Compare the sparse feature space with TruncatedSVD embeddings on held-out owned games.
+
+Pseudo-users are sampled from the catalog in the database (DATABASE_URL): each library is a
+seed game plus games sharing its tags, with a few random games mixed in. A fraction of the
+tag-coherent games is held out, the per-user Ridge model is fitted on the rest, and the
+held-out games are ranked among all games the user does not own by content score alone.
+
+Usage (from backend/): python -m benchmarks.embedding_quality [--dims 64 128 256] [--users 200]
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import CountVectorizer
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from models import Game, init_db
+from recommender import Recommender, ridge_fit
+
+
+def tag_matrix(db, recommender: Recommender) -> sparse.csr_matrix:
+    """Binary game x tag matrix in catalog row order, read straight from the games table."""
+    rows = db.execute(select(Game.appid, Game.tags).where(Game.total_reviews >= recommender.min_reviews)).all()
+    idxs = recommender.index.lookup(np.array([row.appid for row in rows], dtype=np.int64))
+    encoder = CountVectorizer(analyzer=lambda tags: tags or [], binary=True)
+    tags = encoder.fit_transform([row.tags for row in rows]).tocsr()
+    order = np.empty(len(idxs), dtype=np.int64)
+    order[idxs] = np.arange(len(idxs))
+    return tags[order]
+
+
+def sample_users(tags: sparse.csr_matrix, n_users: int, seed: int = 0):
+    """Yield (train_idxs, train_targets, heldout_idxs) for tag-coherent pseudo-users."""
+    rng = np.random.default_rng(seed)
+    tag_counts = np.asarray(tags.sum(axis=1)).ravel()
+    for _ in range(n_users):
+        seed_idx = rng.integers(tags.shape[0])
+        overlap = np.asarray((tags @ tags[seed_idx].T).todense()).ravel()
+        jaccard = overlap / np.maximum(tag_counts + tag_counts[seed_idx] - overlap, 1)
+        # The seed plus its closest games by tag overlap, in random order
+        coherent = rng.permutation(np.argsort(-jaccard, kind="stable")[:rng.integers(20, 61)])
+        noise = rng.choice(tags.shape[0], max(len(coherent) // 4, 1), replace=False)
+        noise = np.setdiff1d(noise, coherent)
+
+        n_heldout = max(len(coherent) // 5, 1)
+        heldout, kept = coherent[:n_heldout], coherent[n_heldout:]
+        train = np.concatenate([kept, noise])
+        targets = np.concatenate([rng.uniform(0.5, 1.0, len(kept)), rng.uniform(0.0, 0.05, len(noise))])
+        order = np.argsort(train)
+        yield train[order], targets[order], heldout
+
+
+def evaluate(matrix, users, k: int = 100) -> dict:
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for train, targets, heldout in users:
+        start = time.perf_counter()
+        coef, intercept = ridge_fit(matrix[train], targets)
+        scores = matrix @ coef.astype(matrix.dtype, copy=False) + intercept
+        latencies.append(time.perf_counter() - start)
+
+        scores[train] = -np.inf
+        ranks = np.empty(len(scores), dtype=np.int64)
+        ranks[np.argsort(-scores, kind="stable")] = np.arange(1, len(scores) + 1)
+        heldout_ranks = ranks[heldout]
+        recalls.append(np.mean(heldout_ranks <= k))
+        reciprocal_ranks.append(np.mean(1.0 / heldout_ranks))
+    return {
+        f"recall@{k}": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+    }
+
+
+def matrix_mb(matrix) -> float:
+    if sparse.issparse(matrix):
+        return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20
+    return matrix.nbytes / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = init_db()
+    db = sessionmaker(bind=engine)()
+    recommender = Recommender(db)
+    users = list(sample_users(tag_matrix(db, recommender), args.users))
+    db.close()
+
+    spaces = {"sparse": recommender.index.feature_matrix}
+    for dim in args.dims:
+        if dim < recommender.index.feature_matrix.shape[1]:
+            svd = TruncatedSVD(n_components=dim, random_state=0)
+            spaces[f"svd-{dim}"] = np.ascontiguousarray(
+                svd.fit_transform(recommender.index.feature_matrix), dtype=np.float32
+            )
+
+    print(f"{recommender.index.feature_matrix.shape[0]} games, {recommender.index.feature_matrix.shape[1]} features, "
+          f"{len(users)} pseudo-users")
+    print(f"{'space':>10} {'MB':>8} {'recall@100':>11} {'MRR':>7} {'p50 ms':>8}")
+    for name, matrix in spaces.items():
+        result = evaluate(matrix, users)
+        print(f"{name:>10} {matrix_mb(matrix):>8.1f} {result['recall@100']:>11.3f} "
+              f"{result['mrr']:>7.3f} {result['p50_ms']:>8.2f}")
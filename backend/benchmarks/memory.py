@@ -0,0 +1,100 @@
+"""
+Report the memory a Recommender holds per API worker.
+
+Memory is read from /proc/self/smaps_rollup: RSS, PSS (shared pages split between the
+processes mapping them) and USS (pages private to this process, i.e. what each additional
+worker costs). The catalog is read from the database (DATABASE_URL). With --index-dir the
+recommender warm-starts from the saved artifact, whose memory-mapped arrays are shared
+between workers. The response card store (GameCardStore) is ordinary heap memory that
+every worker holds privately; it is reported separately, measured by loading a second copy.
+
+Usage (from backend/): python -m benchmarks.memory [--index-dir index] [--embedding-dim 128]
+"""
+import argparse
+import gc
+import time
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from cards import GameCardStore
+from models import Game, init_db
+from recommender import Recommender
+
+
+def memory_mb() -> dict:
+    """RSS, PSS and USS of this process in MB (RSS only where smaps_rollup is unavailable)."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        import resource
+        return {"rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def nbytes_mb(value) -> float:
+    if value is None:
+        return 0.0
+    if sparse.issparse(value):
+        return (value.data.nbytes + value.indices.nbytes + value.indptr.nbytes) / 2**20
+    return np.asarray(value).nbytes / 2**20
+
+
+def format_memory(memory: dict) -> str:
+    return "  ".join(f"{name.upper()} {value:8.1f} MB" for name, value in memory.items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--index-dir", default=None, help="Warm-start from a saved index instead of fitting")
+    parser.add_argument("--embedding-dim", type=int, default=None)
+    args = parser.parse_args()
+
+    engine = init_db()
+    db = sessionmaker(bind=engine)()
+    gc.collect()
+    before = memory_mb()
+
+    start = time.perf_counter()
+    recommender = Recommender(db, index_dir=args.index_dir, embedding_dim=args.embedding_dim)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    after = memory_mb()
+
+    cards = GameCardStore()
+    cards.load(db, recommender.min_reviews)
+    gc.collect()
+    after_cards = memory_mb()
+    description_chars = db.scalar(
+        select(func.sum(func.length(Game.detailed_description))).where(Game.total_reviews >= recommender.min_reviews)
+    ) or 0
+    db.close()
+
+    index = recommender.index
+    print(f"{len(index)} games, {index.feature_matrix.shape[1]} features, initialized in {elapsed:.2f}s "
+          f"({'artifact ' + args.index_dir if args.index_dir else 'fitted'})")
+    print(f"before:  {format_memory(before)}")
+    print(f"after:   {format_memory(after)}")
+    print(f"growth:  {format_memory({name: after[name] - before[name] for name in after})}")
+    print("catalog arrays:")
+    for name in ("feature_matrix", "embeddings", "genre_sets", "appids", "content_hashes",
+                 "review_scores", "popularity_scores", "developer_codes"):
+        value = getattr(index, name)
+        if value is not None:
+            kind = "csr " if sparse.issparse(value) else ""
+            print(f"  {name:>18}: {nbytes_mb(value):8.2f} MB {kind}{value.dtype}")
+    print("response card store (private to every worker, included in the growth above):")
+    print(f"  {len(cards)} cards, {cards.nbytes() / 2**20:.2f} MB on the heap, of which about "
+          f"{description_chars / 2**20:.2f} MB detailed descriptions")
+    print(f"  loading one more copy: {format_memory({name: after_cards[name] - after[name] for name in after})}")
@@ -0,0 +1,63 @@
+"""
+Check recommender.ridge_fit against sklearn's Ridge and compare fit times.
+
+The closed-form dual solve must reproduce Ridge(alpha=1.0) predictions over the whole
+catalog; the script exits non-zero if any library size exceeds the tolerance.
+tests/test_ridge.py checks the same equivalence on every solver branch in the test suite.
+
+Usage (from backend/): python -m benchmarks.ridge [--games 50000] [--library-sizes 1 10 100 300 1000]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+from sklearn.linear_model import Ridge
+
+from benchmarks.topn import synthetic_feature_matrix
+from recommender import ridge_fit
+
+# Compared against sklearn run to convergence; its default tol=1e-4 alone accounts for
+# differences of that order, so the timed default fit is not used as the reference
+TOLERANCE = 1e-6
+
+
+def check(feature_matrix, library_size: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    idxs = np.sort(rng.choice(feature_matrix.shape[0], library_size, replace=False))
+    X = feature_matrix[idxs]
+    y = np.minimum(rng.exponential(2000, library_size) / 6000, 1.0)
+
+    start = time.perf_counter()
+    model = Ridge(alpha=1.0).fit(X, y)
+    sklearn_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    coef, intercept = ridge_fit(X, y, alpha=1.0)
+    closed_form_ms = (time.perf_counter() - start) * 1000
+
+    reference = Ridge(alpha=1.0, tol=1e-12).fit(X, y)
+    expected = feature_matrix @ reference.coef_ + reference.intercept_
+    actual = feature_matrix @ coef + intercept
+    error = np.max(np.abs(expected - actual)) / max(np.max(np.abs(expected)), 1e-12)
+    return {"sklearn_ms": sklearn_ms, "closed_form_ms": closed_form_ms, "max_rel_error": error}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=50000)
+    parser.add_argument("--library-sizes", type=int, nargs="+", default=[1, 10, 100, 300, 1000])
+    args = parser.parse_args()
+
+    feature_matrix = synthetic_feature_matrix(args.games)
+    failed = False
+    print(f"{'library':>8} {'sklearn ms':>11} {'closed ms':>10} {'max rel err':>12}")
+    for library_size in args.library_sizes:
+        result = check(feature_matrix, library_size)
+        failed |= result["max_rel_error"] > TOLERANCE
+        print(f"{library_size:>8} {result['sklearn_ms']:>11.2f} {result['closed_form_ms']:>10.2f} "
+              f"{result['max_rel_error']:>12.2e}")
+
+    if failed:
+        print(f"ridge_fit differs from sklearn Ridge by more than {TOLERANCE}")
+        sys.exit(1)
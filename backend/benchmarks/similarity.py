@@ -0,0 +1,76 @@
+"""
+Measure recall and latency of the item-to-item similarity index against exact cosine similarity.
+
+The catalog is read from the database (DATABASE_URL). Games are sampled from outside the
+precomputed popular set, so recall reflects the IVF path (probing --probe of --lists inverted lists);
+precomputed lookups are exact.
+
+Usage (from backend/): python -m benchmarks.similarity [--queries 500] [--k 10] [--lists N] [--probe 8]
+                       [--precomputed 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+
+from models import init_db
+from recommender import Recommender
+from similarity import SimilarityIndex
+
+
+def percentiles_ms(latencies) -> str:
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return f"p50 {p50:.3f} ms, p99 {p99:.3f} ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=None, help="Number of inverted lists (default sqrt(n) / 2)")
+    parser.add_argument("--probe", type=int, default=8, help="Lists scored per query")
+    parser.add_argument("--precomputed", type=int, default=2000, help="Number of popular games with precomputed lists")
+    args = parser.parse_args()
+
+    db = sessionmaker(bind=init_db())()
+    recommender = Recommender(db)
+    db.close()
+    catalog = recommender.index
+
+    start = time.perf_counter()
+    similarity = SimilarityIndex(
+        catalog.scoring_matrix, catalog.appids, catalog.popularity_scores, n_lists=args.lists, n_probe=args.probe,
+        n_precomputed=args.precomputed
+    )
+    print(f"{len(catalog)} games in {similarity.n_lists} lists, built in {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(0)
+    popular = np.flatnonzero(similarity._precomputed_slot >= 0)
+    others = np.flatnonzero(similarity._precomputed_slot < 0)
+    sample = rng.choice(others, min(args.queries, len(others)), replace=False)
+
+    recalls, latencies, exact_latencies, n_candidates = [], [], [], []
+    for idx in sample:
+        appid = int(catalog.appids[idx])
+        start = time.perf_counter()
+        approximate = similarity.similar(appid, args.k)
+        latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        exact = similarity.similar(appid, args.k, exact=True)
+        exact_latencies.append(time.perf_counter() - start)
+        n_candidates.append(sum(np.diff(similarity.list_bounds)[similarity.probe(idx)]))
+        recalls.append(len({a for a, _ in approximate} & {a for a, _ in exact}) / max(len(exact), 1))
+
+    precomputed_latencies = []
+    for idx in rng.choice(popular, min(args.queries, len(popular)), replace=False):
+        start = time.perf_counter()
+        similarity.similar(int(catalog.appids[idx]), args.k)
+        precomputed_latencies.append(time.perf_counter() - start)
+
+    print(f"IVF recall@{args.k}: {np.mean(recalls):.3f} over {len(sample)} games "
+          f"(median {int(np.median(n_candidates))} candidates)")
+    print(f"IVF:         {percentiles_ms(latencies)}")
+    if precomputed_latencies:
+        print(f"precomputed: {percentiles_ms(precomputed_latencies)}")
+    print(f"exact scan:  {percentiles_ms(exact_latencies)}")
@@ -0,0 +1,314 @@
+"""
+Run the end-to-end benchmark suite on synthetic catalogs and write the results as JSON.
+
+For every catalog size, games.json is generated (see benchmarks/synthetic.py) into a scratch
+directory with its own SQLite database and index directory. Each phase runs in a fresh
+process and measures:
+
+* ingest: load_games_to_db throughput for a full load and an incremental re-sync
+* init: Recommender.__init__ time and memory growth when fitting and when restoring
+  the saved index, with the fit time of each feature block
+* recommend: Recommender.recommend latency per owned-library size
+* api: GET /recommendations throughput and latency at several concurrency levels, served
+  in-process through an ASGI transport with fetch_owned_games replaced by a stub that
+  returns a synthetic library after a fixed delay
+
+Every request uses a new steam_id, so the result cache and Steam client cache never hit.
+Pass --baseline with an earlier results file to print the relative change of every timing.
+
+Usage (from backend/): python -m benchmarks.suite [--games 10000 50000] [--library-sizes 10 100 1000]
+                       [--users 50] [--concurrency 1 8 32] [--requests 200] [--steam-latency 0.05]
+                       [--output benchmark-results.json] [--baseline previous.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.memory import memory_mb
+from benchmarks.synthetic import generate_catalog, generate_libraries
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Mean and percentiles of latencies given in seconds, reported in milliseconds."""
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(values.max()),
+    }
+
+
+def _growth(before: dict, after: dict) -> dict:
+    return {f"{name}_mb": after[name] - before[name] for name in after}
+
+
+def bench_ingest(games_path: str, n_games: int) -> dict:
+    from load_games import load_games_to_db
+
+    start = time.perf_counter()
+    load_games_to_db(games_path, full=True)
+    full_seconds = time.perf_counter() - start
+
+    # Touch the file so the fingerprint changes and every row is hashed but none rewritten
+    os.utime(games_path)
+    start = time.perf_counter()
+    load_games_to_db(games_path)
+    resync_seconds = time.perf_counter() - start
+
+    return {
+        "full_seconds": full_seconds,
+        "full_games_per_sec": n_games / full_seconds,
+        "resync_unchanged_seconds": resync_seconds,
+        "resync_unchanged_games_per_sec": n_games / resync_seconds,
+    }
+
+
+def bench_init(index_dir: str) -> dict:
+    """Time and memory of one Recommender construction; fits if index_dir has no matching artifact."""
+    from sqlalchemy.orm import sessionmaker
+    from models import init_db
+    from recommender import Recommender
+
+    db = sessionmaker(bind=init_db())()
+    gc.collect()
+    before = memory_mb()
+    start = time.perf_counter()
+    recommender = Recommender(db, index_dir=index_dir)
+    elapsed = time.perf_counter() - start
+    db.close()
+    gc.collect()
+    return {
+        "seconds": elapsed,
+        **_growth(before, memory_mb()),
+        "catalog_games": len(recommender.index),
+        "catalog_features": int(recommender.index.feature_matrix.shape[1]),
+        # Per feature block when fitting; blocks are fitted concurrently, so they overlap
+        "build": {f"{block}_seconds": elapsed for block, elapsed in recommender.build_timings.items()},
+    }
+
+
+def bench_recommend(recommender, libraries: Dict[int, List[List[dict]]], warmup: int = 3) -> dict:
+    results = {}
+    for size, users in libraries.items():
+        for library in users[:warmup]:
+            recommender.recommend(library, 10, {})
+        latencies = []
+        for library in users:
+            start = time.perf_counter()
+            recommender.recommend(library, 10, {})
+            latencies.append(time.perf_counter() - start)
+        results[str(size)] = latency_summary(latencies)
+    return results
+
+
+async def _drive_api(app, concurrency: int, n_requests: int, label: str) -> dict:
+    import httpx
+
+    latencies = []
+    statuses: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(f"bench-{label}-{i}")
+
+    async def client_loop(client: httpx.AsyncClient):
+        while True:
+            try:
+                steam_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            response = await client.get("/recommendations", params={"steam_id": steam_id})
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "seconds": elapsed,
+        "requests_per_sec": n_requests / elapsed,
+        "statuses": statuses,
+        **latency_summary(latencies),
+    }
+
+
+def bench_api(libraries: List[List[dict]], concurrency_levels: List[int], n_requests: int,
+              steam_latency: float) -> dict:
+    # Importing main builds the app's recommender from DATABASE_URL and INDEX_DIR
+    import main
+
+    async def stub_fetch_owned_games(steam_id: str) -> list:
+        await asyncio.sleep(steam_latency)
+        return libraries[int(steam_id.rsplit("-", 1)[1]) % len(libraries)]
+
+    main.fetch_owned_games = stub_fetch_owned_games
+    results = {}
+    for concurrency in concurrency_levels:
+        results[str(concurrency)] = asyncio.run(
+            _drive_api(main.app, concurrency, n_requests, f"c{concurrency}")
+        )
+    return results
+
+
+def prepare_catalog(n_games: int, games_path: str, seed: int) -> Tuple[dict, np.ndarray, np.ndarray]:
+    """Generate games.json and load it into the database; returns (results, appids, total reviews)."""
+    start = time.perf_counter()
+    appids, total_reviews = generate_catalog(n_games, games_path, seed=seed)
+    results = {
+        "games_json_mb": os.path.getsize(games_path) / 2**20,
+        "generate_seconds": time.perf_counter() - start,
+    }
+    print(f"[{n_games}] generated {results['games_json_mb']:.0f} MB in {results['generate_seconds']:.1f}s")
+    results["ingest"] = bench_ingest(games_path, n_games)
+    print(f"[{n_games}] ingest: {results['ingest']['full_games_per_sec']:.0f} games/sec")
+    return results, appids, total_reviews
+
+
+def bench_serving(n_games: int, libraries: Dict[int, List[List[dict]]], args: argparse.Namespace) -> dict:
+    """recommend() latency and, unless disabled, /recommendations throughput."""
+    from sqlalchemy.orm import sessionmaker
+    from models import init_db
+    from recommender import Recommender
+
+    db = sessionmaker(bind=init_db())()
+    recommender = Recommender(db, index_dir=os.environ["INDEX_DIR"])
+    db.close()
+    results = {"recommend": bench_recommend(recommender, libraries)}
+    del recommender
+    for size, summary in results["recommend"].items():
+        print(f"[{n_games}] recommend, {size} owned games: p50 {summary['p50_ms']:.1f} ms, "
+              f"p99 {summary['p99_ms']:.1f} ms")
+
+    if args.requests:
+        api_libraries = [library for users in libraries.values() for library in users]
+        results["api"] = bench_api(api_libraries, args.concurrency, args.requests, args.steam_latency)
+        for concurrency, summary in results["api"].items():
+            print(f"[{n_games}] /recommendations x{concurrency}: {summary['requests_per_sec']:.1f} req/sec, "
+                  f"p99 {summary['p99_ms']:.0f} ms")
+    return results
+
+
+def isolated(fn, *args):
+    """Run fn in a fresh process, so module state and memory readings do not leak between phases."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def run_catalog(n_games: int, args: argparse.Namespace) -> dict:
+    """Benchmark one catalog size in a scratch directory with its own database and index."""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{n_games}-") as work_dir:
+        # Inherited by the spawned phase processes
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'games.db')}"
+        os.environ["INDEX_DIR"] = os.path.join(work_dir, "index")
+
+        prepared, appids, total_reviews = isolated(
+            prepare_catalog, n_games, os.path.join(work_dir, "games.json"), args.seed
+        )
+        results: Dict[str, Any] = {"games": n_games, **prepared}
+
+        # The first construction fits and saves the index, the second restores it
+        results["init"] = {mode: isolated(bench_init, os.environ["INDEX_DIR"]) for mode in ("fit", "restore")}
+        print(f"[{n_games}] init: fit {results['init']['fit']['seconds']:.2f}s "
+              f"(+{results['init']['fit']['rss_mb']:.0f} MB RSS), "
+              f"restore {results['init']['restore']['seconds']:.2f}s "
+              f"(+{results['init']['restore']['rss_mb']:.0f} MB RSS)")
+
+        # Libraries are drawn from the qualifying games, which are the ones the recommender scores
+        qualifying = total_reviews >= 100
+        libraries = generate_libraries(appids[qualifying], total_reviews[qualifying], args.library_sizes,
+                                       args.users, seed=args.seed)
+        results.update(isolated(bench_serving, n_games, libraries, args))
+    return results
+
+
+def environment() -> dict:
+    import scipy
+    import sklearn
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def _timings(results: dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten the numeric results whose names mark them as durations."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_timings(value, name + "."))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("seconds")):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(results: dict, baseline: dict):
+    """Print the relative change of every timing present in both runs."""
+    current, previous = _timings(results["catalogs"]), _timings(baseline["catalogs"])
+    print(f"\nChange against baseline {baseline['environment'].get('commit') or '(unknown commit)'}:")
+    for name in sorted(current.keys() & previous.keys()):
+        if previous[name] > 0:
+            change = (current[name] - previous[name]) / previous[name] * 100
+            print(f"  {name:<60} {previous[name]:>10.2f} -> {current[name]:>10.2f}  ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, nargs="+", default=[10000, 50000], help="Catalog sizes")
+    parser.add_argument("--library-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--users", type=int, default=50, help="Libraries per library size")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level; 0 skips the API")
+    parser.add_argument("--steam-latency", type=float, default=0.05, help="Delay of the stubbed Steam call in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = {
+        "environment": environment(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "catalogs": {},
+    }
+    for n_games in args.games:
+        results["catalogs"][str(n_games)] = run_catalog(n_games, args)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
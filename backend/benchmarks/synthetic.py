@@ -0,0 +1,145 @@
+"""
+Generate a synthetic Steam catalog and owned-game libraries for benchmarks.
+
+The catalog is written in the games.json layout load_games.py reads (appid -> game dict).
+Description lengths are log-normal around a few hundred words of HTML, words, tags and
+developers follow Zipf-like distributions, and review counts are heavy-tailed, so that
+roughly a third of the games pass the recommender's default min_reviews filter.
+
+Usage (from backend/): python -m benchmarks.synthetic [--games 50000] [--seed 0] [--output games.json]
+"""
+import argparse
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+GENRES = [
+    "Action", "Adventure", "Casual", "Indie", "RPG", "Strategy", "Simulation", "Sports", "Racing",
+    "Massively Multiplayer", "Free to Play", "Early Access", "Violent", "Gore", "Nudity",
+    "Sexual Content", "Design & Illustration", "Utilities", "Education", "Animation & Modeling",
+]
+
+
+def _zipf_weights(n: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _ranked_sample(rng: np.random.Generator, weights: np.ndarray, counts: np.ndarray) -> List[np.ndarray]:
+    """Draw counts[i] distinct indices for every row i, favouring low (popular) indices."""
+    # Gumbel top-k: the k largest of log(w) + Gumbel noise are a weighted sample without replacement
+    keys = np.log(weights)
+    samples = []
+    for count in counts:
+        noisy = keys + rng.gumbel(size=len(keys))
+        samples.append(np.argpartition(-noisy, count - 1)[:count])
+    return samples
+
+
+def generate_catalog(n_games: int, path: str, seed: int = 0, vocabulary_size: int = 20000,
+                     n_tags: int = 400, mean_description_words: int = 250) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Write a synthetic games.json with n_games entries.
+
+    Args:
+        n_games: Number of games
+        path: Output file
+        seed: Random seed; the same seed always produces the same file
+        vocabulary_size: Number of distinct description words
+        n_tags: Number of distinct user tags
+        mean_description_words: Median length of a detailed description in words
+
+    Returns:
+        (appids, total reviews) of the generated games, in file order
+    """
+    rng = np.random.default_rng(seed)
+    appids = 10 + 10 * np.arange(n_games)
+    tags = np.array([f"Tag {i}" for i in range(n_tags)])
+    developers = np.array([f"Studio {i}" for i in range(max(n_games // 3, 1))])
+    publishers = np.array([f"Publisher {i}" for i in range(max(n_games // 10, 1))])
+    words = np.array([f"w{i}" for i in range(vocabulary_size)])
+
+    description_lengths = np.clip(rng.lognormal(np.log(mean_description_words), 0.8, n_games), 5, 5000).astype(int)
+    description_words = words[rng.choice(vocabulary_size, description_lengths.sum(), p=_zipf_weights(vocabulary_size, 1.07))]
+    description_bounds = np.concatenate([[0], np.cumsum(description_lengths)])
+
+    positive = np.floor(rng.pareto(0.9, n_games) * 40).astype(int)
+    negative = np.floor(positive * rng.beta(2, 6, n_games)).astype(int)
+    tag_counts = rng.integers(3, 21, n_games)
+    game_tags = _ranked_sample(rng, _zipf_weights(n_tags, 1.0), tag_counts)
+    genre_counts = rng.integers(1, 5, n_games)
+    game_genres = _ranked_sample(rng, _zipf_weights(len(GENRES), 1.2), genre_counts)
+    game_developers = rng.choice(len(developers), n_games, p=_zipf_weights(len(developers), 0.8))
+    game_publishers = rng.choice(len(publishers), n_games, p=_zipf_weights(len(publishers), 1.0))
+    years = rng.integers(2006, 2025, n_games)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for i, appid in enumerate(appids):
+            description = " ".join(description_words[description_bounds[i]:description_bounds[i + 1]])
+            game = {
+                "name": f"Game {appid}",
+                "release_date": f"Jan {1 + i % 28}, {years[i]}",
+                "detailed_description": f"<h1>About</h1><p>{description}</p><br><img src=\"https://cdn/{appid}.gif\">",
+                "short_description": description[:300],
+                "header_image": f"https://cdn/{appid}/header.jpg",
+                "screenshots": [f"https://cdn/{appid}/ss_{k}.jpg" for k in range(1 + i % 8)],
+                "genres": [GENRES[g] for g in game_genres[i]],
+                "tags": {tags[t]: int(500 - rank * 20) for rank, t in enumerate(game_tags[i])},
+                "positive": int(positive[i]),
+                "negative": int(negative[i]),
+                "price": round(float(rng.choice([0, 4.99, 9.99, 19.99, 29.99, 59.99])), 2),
+                "developers": [developers[game_developers[i]]],
+                "publishers": [publishers[game_publishers[i]]],
+            }
+            f.write(("," if i else "") + json.dumps(str(appid)) + ":" + json.dumps(game))
+        f.write("}")
+    return appids, positive + negative
+
+
+def generate_libraries(appids: np.ndarray, popularity: np.ndarray, sizes: List[int], users_per_size: int,
+                       seed: int = 0, unknown_fraction: float = 0.05) -> Dict[int, List[List[dict]]]:
+    """
+    Generate owned-game libraries shaped like the Steam GetOwnedGames response.
+
+    Games are drawn in proportion to popularity, playtimes are log-normal with many
+    unplayed games, and a fraction of every library are appids outside the catalog.
+
+    Args:
+        appids: Catalog appids
+        popularity: Weight of every appid (e.g. total reviews)
+        sizes: Library sizes to generate
+        users_per_size: Number of libraries per size
+        seed: Random seed
+        unknown_fraction: Fraction of each library with appids outside the catalog
+
+    Returns:
+        Dict of library size -> list of libraries
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.asarray(popularity, dtype=np.float64) + 1.0
+    weights /= weights.sum()
+    unknown_base = int(np.max(appids)) + 1
+    libraries = {}
+    for size in sizes:
+        libraries[size] = []
+        for _ in range(users_per_size):
+            n_unknown = int(size * unknown_fraction)
+            owned = rng.choice(appids, min(size - n_unknown, len(appids)), replace=False, p=weights)
+            owned = np.concatenate([owned, unknown_base + rng.choice(10 * size + 1, n_unknown, replace=False)])
+            playtimes = np.where(rng.random(len(owned)) < 0.3, 0, rng.lognormal(5.5, 1.6, len(owned))).astype(int)
+            libraries[size].append([
+                {"appid": int(appid), "playtime_forever": int(playtime)} for appid, playtime in zip(owned, playtimes)
+            ])
+    return libraries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="games.json")
+    args = parser.parse_args()
+    generate_catalog(args.games, args.output, seed=args.seed)
+    print(f"Wrote {args.games} games to {args.output}")
@@ -0,0 +1,86 @@
+"""
+Compare the legacy and masked top-N selection paths of Recommender.rank.
+
+Legacy: DataFrame isin over the catalog, a Python list of unseen indices, a CSR copy of
+the unseen rows and a full argsort. Masked: a boolean exclusion mask, a product over the
+full matrix and argpartition.
+
+Usage (from backend/): python -m benchmarks.topn [--games 50000 100000] [--repeats 20]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.linear_model import Ridge
+
+
+def synthetic_feature_matrix(n_games: int, n_text_features: int = 6100, density: float = 0.01,
+                             seed: int = 0) -> sparse.csr_matrix:
+    """Random CSR matrix shaped like Recommender.feature_matrix: TF-IDF blocks plus one-hot developer/publisher."""
+    rng = np.random.default_rng(seed)
+    text = sparse.random(n_games, n_text_features, density=density, format="csr", random_state=seed)
+    n_companies = max(n_games // 4, 1)
+    rows = np.arange(n_games)
+    developer = sparse.csr_matrix((np.ones(n_games), (rows, rng.integers(0, n_companies, n_games))),
+                                  shape=(n_games, n_companies))
+    publisher = sparse.csr_matrix((np.ones(n_games), (rows, rng.integers(0, n_companies, n_games))),
+                                  shape=(n_games, n_companies))
+    return sparse.hstack([text, developer, publisher], format="csr")
+
+
+def legacy_top_n(df, feature_matrix, model, base_scores, interacted, top_n):
+    unseen_mask = ~df["appid"].isin(interacted)
+    unseen_idxs = df[unseen_mask].index.tolist()
+    content_scores = model.predict(feature_matrix[unseen_idxs])
+    final_scores = content_scores + base_scores[unseen_idxs]
+    top_indices = np.argsort(final_scores)[-top_n:][::-1]
+    return np.asarray(unseen_idxs)[top_indices]
+
+
+def masked_top_n(appids, feature_matrix, model, base_scores, interacted_idxs, top_n):
+    unseen_mask = np.ones(len(appids), dtype=bool)
+    unseen_mask[interacted_idxs] = False
+    final_scores = feature_matrix @ model.coef_ + model.intercept_ + base_scores
+    candidate_scores = np.where(unseen_mask, final_scores, -np.inf)
+    top = np.argpartition(-candidate_scores, top_n - 1)[:top_n]
+    return top[np.argsort(-candidate_scores[top], kind="stable")]
+
+
+def bench(n_games: int, library_size: int = 300, top_n: int = 10, repeats: int = 20) -> dict:
+    rng = np.random.default_rng(n_games)
+    feature_matrix = synthetic_feature_matrix(n_games)
+    appids = np.arange(10, 10 * (n_games + 1), 10, dtype=np.int64)
+    df = pd.DataFrame({"appid": appids})
+    base_scores = rng.random(n_games)
+
+    owned_idxs = rng.choice(n_games, library_size, replace=False)
+    model = Ridge(alpha=1.0).fit(feature_matrix[np.sort(owned_idxs)], rng.random(library_size))
+    interacted = set(appids[owned_idxs].tolist())
+
+    timings = {"legacy": [], "masked": []}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        legacy = legacy_top_n(df, feature_matrix, model, base_scores, interacted, top_n)
+        timings["legacy"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        masked = masked_top_n(appids, feature_matrix, model, base_scores, owned_idxs, top_n)
+        timings["masked"].append(time.perf_counter() - start)
+
+    assert set(legacy.tolist()) == set(masked.tolist()), "paths disagree on the top N"
+    return {path: np.median(samples) * 1000 for path, samples in timings.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, nargs="+", default=[50000, 100000])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'games':>8} {'legacy ms':>10} {'masked ms':>10} {'speedup':>8}")
+    for n_games in args.games:
+        result = bench(n_games, repeats=args.repeats)
+        print(f"{n_games:>8} {result['legacy']:>10.2f} {result['masked']:>10.2f} "
+              f"{result['legacy'] / result['masked']:>7.1f}x")
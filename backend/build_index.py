@@ -0,0 +1,23 @@
+from typing import Optional
+from sqlalchemy.orm import sessionmaker
+from models import init_db
+from recommender import Recommender, recommender_settings
+
+def build_index(index_dir: str = "index", min_reviews: int = 100, embedding_dim: Optional[int] = None,
+                fit_workers: Optional[int] = None):
+    """Fit the recommender once and persist it so API workers can warm-start from disk."""
+    engine = init_db()
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        # Loads the existing artifact when the games table is unchanged, refits otherwise
+        Recommender(db, min_reviews=min_reviews, index_dir=index_dir, embedding_dim=embedding_dim,
+                    fit_workers=fit_workers)
+        print("Recommender index is up to date!")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    settings = recommender_settings()
+    build_index(settings["index_dir"], embedding_dim=settings["embedding_dim"], fit_workers=settings["fit_workers"])
@@ -0,0 +1,136 @@
+from typing import Any, Dict, List
+import numpy as np
+from scipy import sparse
+
+
+class Shortlists:
+    def __init__(self, memberships, rank: np.ndarray, size: int):
+        """
+        Best-ranked rows of every column of a game x category membership matrix.
+
+        Args:
+            memberships: Sparse game x category matrix; nonzero entries mark membership
+            rank: Position of every game in the global ordering (0 is best)
+            size: Maximum number of games kept per category
+        """
+        coo = sparse.coo_matrix(memberships)
+        order = np.lexsort((rank[coo.row], coo.col))
+        rows, columns = coo.row[order], coo.col[order]
+        starts = np.searchsorted(columns, np.arange(memberships.shape[1] + 1))
+        keep = np.arange(len(rows)) - starts[columns] < size
+        # Category j holds rows[bounds[j]:bounds[j + 1]], best first
+        self.rows = rows[keep].astype(np.int32)
+        self.bounds = np.searchsorted(columns[keep], np.arange(memberships.shape[1] + 1))
+
+    def __getitem__(self, column: int) -> np.ndarray:
+        return self.rows[self.bounds[column]:self.bounds[column + 1]]
+
+    def union(self, columns) -> np.ndarray:
+        parts: List[np.ndarray] = [self[column] for column in columns]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+
+class CandidateGenerator:
+    def __init__(self, genre_sets, features, tag_columns: slice, base_scores: np.ndarray, shortlist_size: int = 300,
+                 n_popular: int = 500, n_tags: int = 20):
+        """
+        First stage of two-stage ranking: picks the games worth scoring for a user.
+
+        Games are ranked once by the non-personalized part of the recommendation score (the
+        review and popularity terms). Every genre and tag keeps a shortlist of its best games
+        in that order, and the catalog as a whole keeps its n_popular best. A user's candidates
+        are the catalog shortlist, the shortlists of the genres and most common tags of their
+        seed games, and the feature-space neighbours of those games.
+
+        Args:
+            genre_sets: Binary game x genre matrix
+            features: CSR feature matrix whose tag_columns mark tagged games with nonzero entries;
+                it is referenced, not copied
+            tag_columns: Columns of the tag block in features
+            base_scores: Non-personalized score of every game
+            shortlist_size: Games kept per genre and per tag
+            n_popular: Games kept for the whole catalog
+            n_tags: Number of the seed games' most common tags whose shortlists are used
+        """
+        order = np.argsort(-np.asarray(base_scores), kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        self._attach(genre_sets, features, tag_columns, base_scores)
+        self.popular = order[:n_popular].astype(np.int32)
+        self.n_tags = n_tags
+        self.genre_lists = Shortlists(self.genre_sets, rank, shortlist_size)
+        self.tag_lists = Shortlists(features[:, tag_columns], rank, shortlist_size)
+
+    @classmethod
+    def from_state(cls, genre_sets, features, tag_columns: slice, base_scores: np.ndarray,
+                   state: Dict[str, Any]) -> "CandidateGenerator":
+        """Rebuild a generator from the state() of one built on the same catalog, without ranking it again."""
+        generator = cls.__new__(cls)
+        generator._attach(genre_sets, features, tag_columns, base_scores)
+        generator.popular = state["popular"]
+        generator.n_tags = state["n_tags"]
+        generator.genre_lists = state["genre_lists"]
+        generator.tag_lists = state["tag_lists"]
+        return generator
+
+    def _attach(self, genre_sets, features, tag_columns: slice, base_scores: np.ndarray):
+        self.base_scores = np.asarray(base_scores)
+        self.genre_sets = sparse.csr_matrix(genre_sets)
+        self.features = features
+        self.tag_columns = tag_columns
+
+    def state(self) -> Dict[str, Any]:
+        """The shortlists, which from_state combines with the catalog's own matrices."""
+        return {
+            "popular": self.popular,
+            "n_tags": self.n_tags,
+            "genre_lists": self.genre_lists,
+            "tag_lists": self.tag_lists,
+        }
+
+    def generate(self, seed_idxs: np.ndarray, neighbour_idxs: np.ndarray, excluded_idxs: np.ndarray,
+                 budget: int) -> np.ndarray:
+        """
+        Candidate rows for one user.
+
+        Neighbours are kept first; the remaining budget goes to the shortlisted games with
+        the best base scores. Excluded games are never candidates.
+
+        Args:
+            seed_idxs: Rows of the user's most played games
+            neighbour_idxs: Rows of feature-space neighbours of the seed games
+            excluded_idxs: Rows the user already owns or rated
+            budget: Maximum number of candidates
+
+        Returns:
+            Sorted candidate rows
+        """
+        genres = np.unique(self.genre_sets[seed_idxs].indices)
+        # Tag columns of the seed games' feature rows
+        start, stop = self.tag_columns.start, self.tag_columns.stop
+        columns = self.features[seed_idxs].indices
+        tag_counts = np.bincount(columns[(columns >= start) & (columns < stop)] - start, minlength=stop - start)
+        tags = np.argsort(-tag_counts, kind="stable")[:min(self.n_tags, np.count_nonzero(tag_counts))]
+
+        # Membership masks over the catalog: cheaper than sorting or hashing for set differences
+        n_games = len(self.base_scores)
+        available = np.ones(n_games, dtype=bool)
+        available[excluded_idxs] = False
+        is_neighbour = np.zeros(n_games, dtype=bool)
+        is_neighbour[neighbour_idxs] = True
+        is_neighbour &= available
+        is_shortlisted = np.zeros(n_games, dtype=bool)
+        is_shortlisted[self.popular] = True
+        is_shortlisted[self.genre_lists.union(genres)] = True
+        is_shortlisted[self.tag_lists.union(tags)] = True
+        is_shortlisted &= available & ~is_neighbour
+        neighbours, shortlisted = np.flatnonzero(is_neighbour), np.flatnonzero(is_shortlisted)
+
+        if len(neighbours) > budget:
+            neighbours = neighbours[np.argpartition(-self.base_scores[neighbours], budget - 1)[:budget]]
+        remaining = budget - len(neighbours)
+        if remaining <= 0:
+            shortlisted = shortlisted[:0]
+        elif len(shortlisted) > remaining:
+            shortlisted = shortlisted[np.argpartition(-self.base_scores[shortlisted], remaining - 1)[:remaining]]
+        return np.sort(np.concatenate([neighbours, shortlisted])).astype(np.int64)
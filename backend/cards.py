@@ -0,0 +1,103 @@
+import json
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Game
+
+CARD_COLUMNS = (
+    Game.appid,
+    Game.name,
+    Game.release_date,
+    Game.detailed_description,
+    Game.short_description,
+    Game.header_image,
+    Game.developer,
+    Game.publisher,
+    Game.screenshots,
+    Game.tags,
+)
+
+
+def _dumps(value: Any) -> str:
+    # Same settings as FastAPI's JSONResponse so cached and rendered responses match
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class GameCardStore:
+    """
+    Response cards for every recommendable game, serialized once and keyed by appid.
+
+    Each card is kept as the UTF-8 JSON of the game object without its closing brace,
+    so a response only appends the per-user recommendationScore and joins the cards.
+    """
+
+    def __init__(self):
+        self._cards: Dict[int, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def __contains__(self, appid: int) -> bool:
+        return appid in self._cards
+
+    def load(self, db: Session, min_reviews: int, appids: Optional[Iterable[int]] = None):
+        """
+        Fill the store from the games table with a single column-only query.
+
+        Args:
+            db: SQLAlchemy database session
+            min_reviews: Minimum number of total reviews, matching the Recommender catalog
+            appids: Only (re)load these games; by default the whole store is rebuilt
+        """
+        query = select(*CARD_COLUMNS).where(Game.total_reviews >= min_reviews)
+        if appids is not None:
+            appids = list(appids)
+            if not appids:
+                return
+            query = query.where(Game.appid.in_(appids))
+
+        cards = {} if appids is None else dict(self._cards)
+        for row in db.execute(query).yield_per(5000):
+            card = {
+                "appid": str(row.appid),
+                "name": row.name,
+                "releaseDate": row.release_date,
+                "detailedDescription": row.detailed_description,
+                "shortDescription": row.short_description,
+                "headerImage": row.header_image,
+                "developer": ' '.join(row.developer) if row.developer else "Unknown",
+                "publisher": ' '.join(row.publisher) if row.publisher else "Unknown",
+                "screenshots": row.screenshots if row.screenshots else [],
+                "tags": row.tags if row.tags else [],
+            }
+            cards[row.appid] = _dumps(card)[:-1].encode("utf-8")
+
+        # Swap in one assignment so concurrent readers see either the old or new store
+        self._cards = cards
+
+    def nbytes(self) -> int:
+        """Heap memory held by the cards and their dict (the cards are private to every worker process)."""
+        return sys.getsizeof(self._cards) + sum(sys.getsizeof(card) for card in self._cards.values())
+
+    def discard(self, appids: Iterable[int]):
+        """Remove games that left the catalog."""
+        cards = dict(self._cards)
+        for appid in appids:
+            cards.pop(appid, None)
+        self._cards = cards
+
+    def _render_card(self, appid: int, score: float) -> Optional[bytes]:
+        card = self._cards.get(appid)
+        if card is None:
+            return None
+        return card + f',"recommendationScore":{round(float(score), 1)}}}'.encode("utf-8")
+
+    def render(self, ranked: List[Tuple[int, float]]) -> bytes:
+        """Render ranked (appid, score) pairs as the JSON body of a recommendations response."""
+        cards = [self._render_card(appid, score) for appid, score in ranked]
+        return b"[" + b",".join(card for card in cards if card is not None) + b"]"
+
+    def to_dicts(self, ranked: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Return ranked (appid, score) pairs as response dicts."""
+        return json.loads(self.render(ranked))
@@ -0,0 +1,213 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+from metrics import add_job_profile, job_profiling, metrics, run_profiled
+
+EXECUTOR_MODES = ("thread", "process")
+
+# The recommender of a worker process, loaded by init_worker
+_recommender = None
+
+class ExecutorOverloaded(Exception):
+    """A job was rejected because the queue was full or it waited too long to start."""
+
+def _worker_context():
+    """
+    Start method for worker processes. Never fork: the API process runs other threads,
+    and a child forked while one of them holds a lock (e.g. the metrics lock) hangs.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        # Workers start from a server that has already imported numpy, scipy and scikit-learn
+        context.set_forkserver_preload(["recommender"])
+    return context
+
+def init_worker(settings: Dict[str, Any], structures: Optional[Dict[str, Any]] = None,
+                database_url: Optional[str] = None):
+    """Process pool initializer: load the recommender from its saved index and adopt the parent's lookup structures."""
+    global _recommender
+    from sqlalchemy.orm import sessionmaker
+    from models import init_db
+    from recommender import Recommender
+    with sessionmaker(bind=init_db(database_url))() as db:
+        _recommender = Recommender(db, **settings)
+    if structures is not None:
+        _recommender.adopt_ranking_structures(structures)
+
+def call_recommender(method: str, *args):
+    """Call a method of this process's recommender by name."""
+    return getattr(_recommender, method)(*args)
+
+def process_pool(recommender, workers: int) -> ProcessPoolExecutor:
+    """
+    Pool of worker processes running copies of recommender.
+
+    Workers memory-map the index artifact under recommender.index_dir, so its pages are
+    shared through the page cache. The similarity index and candidate shortlists are
+    built here once: their small parts are sent to the workers, and the similarity
+    index's normalized rows are saved into the artifact for the workers to memory-map.
+    """
+    if not recommender.index_dir:
+        raise ValueError("Worker processes load the recommender from its index_dir, which is not set")
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_worker_context(),
+        initializer=init_worker,
+        # The forkserver keeps the environment it started with; pass the current database explicitly
+        initargs=(recommender.settings(), recommender.ranking_structures(), os.getenv("DATABASE_URL")),
+    )
+
+def _ping() -> int:
+    return os.getpid()
+
+def _run_job(submitted_at: float, max_wait: float, method: str, args: tuple, recommender=None,
+             profile_top_functions: Optional[int] = None):
+    """
+    Call a recommender method unless the job already waited longer than max_wait.
+
+    Thread jobs pass their recommender, process jobs use the worker's. Process jobs also
+    return the metrics the call recorded, since the worker's own registry is never scraped.
+
+    Returns:
+        Tuple of the start time, the result, the recorded metrics (see MetricsRegistry.record)
+        and the job's profile if profile_top_functions is set (see run_profiled)
+    """
+    started_at = time.time()
+    if max_wait > 0 and started_at - submitted_at > max_wait:
+        raise ExecutorOverloaded(f"Job waited {started_at - submitted_at:.1f}s for a worker")
+    if recommender is not None:
+        result, profile = _call(getattr(recommender, method), args, profile_top_functions)
+        return started_at, result, [], profile
+    with metrics.record() as records:
+        result, profile = _call(functools.partial(call_recommender, method), args, profile_top_functions)
+    return started_at, result, records, profile
+
+def _call(call, args: tuple, profile_top_functions: Optional[int]):
+    if profile_top_functions is None:
+        return call(*args), None
+    return run_profiled(profile_top_functions, call, *args)
+
+class RecommendationExecutor:
+    def __init__(self, recommender, mode: str = "thread", workers: Optional[int] = None, max_queue: int = 32,
+                 max_queue_wait: float = 5.0):
+        """
+        Bounded pool that runs CPU-bound recommender calls off the event loop.
+
+        Jobs are recommender method calls by name, e.g. run("rank_batch", users, 10). At most
+        workers jobs run at once and at most max_queue more wait for a worker; beyond that,
+        and for jobs that waited longer than max_queue_wait, ExecutorOverloaded is raised so
+        the API can answer 503 instead of letting latency grow without bound.
+
+        Args:
+            recommender: Recommender the jobs call
+            mode: "thread" runs jobs on a thread pool (sparse products and BLAS release the GIL);
+                "process" runs them on worker processes that load the recommender's saved index
+                (see process_pool)
+            workers: Number of threads or processes; defaults to the number of CPUs
+            max_queue: Number of admitted jobs allowed to wait for a worker
+            max_queue_wait: Seconds a job may wait for a worker before it is dropped; 0 waits indefinitely
+        """
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode {mode!r}, expected one of {EXECUTOR_MODES}")
+        self.recommender = recommender
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self._pool: Optional[Executor] = None
+
+    def _create_pool(self) -> Executor:
+        if self.mode == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recommender")
+        return process_pool(self.recommender, self.workers)
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            self._pool = self._create_pool()
+        return self._pool
+
+    def _start_workers(self, pool: Executor):
+        if self.mode == "process":
+            for future in [pool.submit(_ping) for _ in range(self.workers)]:
+                future.result()
+
+    def start(self):
+        """Create the pool now, so process workers have loaded the recommender before the first job."""
+        self._start_workers(self._get_pool())
+
+    def restart(self):
+        """Replace process workers so they load a refreshed catalog; running jobs finish on the old pool."""
+        if self.mode != "process" or self._pool is None:
+            return
+        pool = self._create_pool()
+        self._start_workers(pool)
+        old, self._pool = self._pool, pool
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, method: str, *args) -> Any:
+        """
+        Run a recommender method on the pool. Must be called from the event loop thread.
+
+        Raises:
+            ExecutorOverloaded: The queue is full or the job waited longer than max_queue_wait
+        """
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            metrics.inc("executor_rejected_total", reason="queue_full")
+            raise ExecutorOverloaded(f"{self.in_flight} recommendation jobs already admitted")
+
+        self.in_flight += 1
+        metrics.set_gauge("executor_in_flight", self.in_flight)
+        submitted_at = time.time()
+        try:
+            # Process jobs run on the worker's own recommender rather than pickling this one
+            recommender = self.recommender if self.mode == "thread" else None
+            # Jobs of a request the profiler captures are profiled where they run
+            future = self._get_pool().submit(_run_job, submitted_at, self.max_queue_wait, method, args, recommender,
+                                             job_profiling())
+            started_at, result, records, profile = await asyncio.wrap_future(future)
+        except ExecutorOverloaded:
+            self.expired += 1
+            metrics.inc("executor_rejected_total", reason="queue_wait")
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the next job gets a fresh pool
+            self._pool = None
+            raise
+        finally:
+            self.in_flight -= 1
+            metrics.set_gauge("executor_in_flight", self.in_flight)
+
+        self.completed += 1
+        metrics.observe("executor_queue_wait_seconds", started_at - submitted_at)
+        metrics.replay(records)
+        if profile is not None:
+            add_job_profile(f"{method} ({self.mode})", profile)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "max_queue_wait": self.max_queue_wait,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
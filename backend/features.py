@@ -0,0 +1,106 @@
+import html
+import os
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+# Below this many documents per worker, process start-up costs more than it saves
+MIN_DOCUMENTS_PER_WORKER = 2000
+
+_HTML_TAG = re.compile(r"<[^>]*>")
+
+
+def strip_html(text: str) -> str:
+    """Drop HTML tags (and with them attribute noise like image URLs) and decode entities."""
+    if "<" not in text and "&" not in text:
+        return text
+    return html.unescape(_HTML_TAG.sub(" ", text))
+
+
+def _count_chunk(documents: List[str], params: dict) -> Tuple[np.ndarray, csr_matrix]:
+    """Term counts of one chunk of documents against the chunk's own sorted vocabulary."""
+    counter = CountVectorizer(**params)
+    counts = counter.fit_transform(documents)
+    return counter.get_feature_names_out(), counts.tocsr()
+
+
+def fit_transform_chunked(vectorizer: TfidfVectorizer, documents: List[str], n_jobs: Optional[int] = None):
+    """
+    Fit a TfidfVectorizer with vocabulary counting split across processes.
+
+    Each worker tokenizes and counts one chunk of the documents. The chunk vocabularies
+    are merged, the max_features most frequent terms are kept with the same rule as
+    TfidfVectorizer.fit, and the chunk count matrices are remapped onto that vocabulary,
+    so the documents are tokenized only once. The result equals vectorizer.fit_transform,
+    and the fitted vectorizer transforms new documents as usual.
+
+    Falls back to a plain fit_transform for small inputs, a single worker, or settings
+    this does not reproduce (min_df/max_df pruning, a fixed vocabulary, use_idf=False).
+
+    Args:
+        vectorizer: Unfitted TfidfVectorizer; fitted in place
+        documents: Documents to fit on
+        n_jobs: Number of worker processes; defaults to the number of CPUs
+
+    Returns:
+        TF-IDF matrix of the documents, as vectorizer.fit_transform would return it
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(documents) // MIN_DOCUMENTS_PER_WORKER)
+    params = vectorizer.get_params()
+    if (n_jobs < 2 or not params["use_idf"] or params["vocabulary"] is not None
+            or params["min_df"] != 1 or params["max_df"] != 1.0):
+        return vectorizer.fit_transform(documents)
+
+    count_params = {
+        name: value for name, value in params.items()
+        if name in CountVectorizer().get_params() and name not in ("max_features", "dtype")
+    }
+    # Two chunks per worker evens out differences in document length
+    bounds = np.linspace(0, len(documents), 2 * n_jobs + 1).astype(int)
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(_count_chunk)(documents[start:end], count_params) for start, end in zip(bounds[:-1], bounds[1:])
+    )
+
+    # Merged vocabulary in sorted order, with corpus-wide term frequencies
+    terms, inverse = np.unique(np.concatenate([chunk_terms for chunk_terms, _ in chunks]), return_inverse=True)
+    term_counts = np.zeros(len(terms), dtype=np.int64)
+    offset = 0
+    for chunk_terms, counts in chunks:
+        np.add.at(term_counts, inverse[offset:offset + len(chunk_terms)], np.asarray(counts.sum(axis=0)).ravel())
+        offset += len(chunk_terms)
+
+    keep = np.arange(len(terms))
+    if vectorizer.max_features is not None and len(terms) > vectorizer.max_features:
+        # Same selection as CountVectorizer._limit_features, which sums counts in the vectorizer's dtype
+        tfs = term_counts.astype(vectorizer.dtype)
+        keep = np.sort((-tfs).argsort()[:vectorizer.max_features])
+    kept_terms = terms[keep]
+
+    # Remap chunk columns onto the kept vocabulary and drop the others
+    rows = []
+    for chunk_terms, counts in chunks:
+        positions = np.searchsorted(kept_terms, chunk_terms)
+        positions[positions == len(kept_terms)] = 0
+        column_map = np.where(kept_terms[positions] == chunk_terms, positions, -1)
+        columns = column_map[counts.indices]
+        kept_entries = columns >= 0
+        entry_rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(entry_rows[kept_entries], minlength=counts.shape[0]))])
+        rows.append(csr_matrix(
+            (counts.data[kept_entries].astype(vectorizer.dtype), columns[kept_entries], indptr),
+            shape=(counts.shape[0], len(kept_terms)),
+        ))
+    counts = vstack(rows, format="csr")
+
+    tfidf = TfidfTransformer(norm=vectorizer.norm, use_idf=vectorizer.use_idf, smooth_idf=vectorizer.smooth_idf,
+                             sublinear_tf=vectorizer.sublinear_tf)
+    matrix = tfidf.fit_transform(counts)
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(kept_terms.tolist())}
+    vectorizer.idf_ = tfidf.idf_
+    vectorizer.fixed_vocabulary_ = False
+    return matrix
@@ -0,0 +1,288 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: versions are swapped and removed without a lock
+    fcntl = None
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix
+from sqlalchemy import String, cast, func, select
+from sqlalchemy.orm import Session
+from models import Game, GameSyncState
+
+# Bump whenever the on-disk layout or the fitted features change shape
+INDEX_FORMAT_VERSION = 4
+
+ARRAY_FILES = ("appids", "content_hashes", "review_ratio", "popularity_score", "developer_codes")
+OPTIONAL_ARRAY_FILES = ("embeddings",)
+SPARSE_FILES = ("feature_matrix", "genre_sets")
+
+
+def games_checksum(db: Session, min_reviews: int, embedding_dim: Optional[int] = None) -> str:
+    """
+    Compute a checksum of the part of the games table the recommender is fitted on.
+
+    Args:
+        db: SQLAlchemy database session
+        min_reviews: Minimum number of total reviews used to filter the catalog
+        embedding_dim: Dimension of the optional dense embedding stored with the index
+
+    Returns:
+        Hex digest that changes whenever a qualifying game is added, removed or edited
+    """
+    digest = hashlib.sha1(f"{INDEX_FORMAT_VERSION}:{min_reviews}:{embedding_dim}".encode())
+    # Per-game content hashes are maintained by load_games.py; games loaded without
+    # one fall back to their review counts and text lengths
+    query = (
+        select(
+            Game.appid,
+            Game.total_reviews,
+            Game.popularity_score,
+            GameSyncState.content_hash,
+            func.length(Game.detailed_description),
+            cast(Game.tags, String),
+        )
+        .outerjoin(GameSyncState, GameSyncState.appid == Game.appid)
+        .where(Game.total_reviews >= min_reviews)
+        .order_by(Game.appid)
+    )
+    for row in db.execute(query).yield_per(10000):
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def _version_dir(index_dir: str, checksum: str) -> str:
+    return os.path.join(index_dir, f"v{INDEX_FORMAT_VERSION}-{checksum[:16]}")
+
+
+@contextlib.contextmanager
+def _locked(index_dir: str, exclusive: bool):
+    """Hold index_dir's lock: exclusively while versions are swapped or removed, shared while one is opened."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(index_dir, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _discard(index_dir: str, path: str):
+    """Rename a directory out of the way in one step, then delete it; workers still mapping it keep their open pages."""
+    stale_dir = tempfile.mkdtemp(prefix=".stale-", dir=index_dir)
+    os.rename(path, os.path.join(stale_dir, "index"))
+    shutil.rmtree(stale_dir, ignore_errors=True)
+
+
+def _drop_old_versions(index_dir: str, target: str, keep_previous: int):
+    """Remove the versions written before target, except the keep_previous most recent of them."""
+    written = os.stat(target).st_mtime
+    older = []
+    for entry in os.listdir(index_dir):
+        path = os.path.join(index_dir, entry)
+        if entry.startswith(".stale-"):
+            # Left behind by an interrupted _discard
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry.startswith("v") and path != target and os.path.isdir(path):
+            mtime = os.stat(path).st_mtime
+            # Versions written since, e.g. by a worker already on a newer catalog, are kept
+            if mtime < written:
+                older.append((mtime, path))
+    for _, path in sorted(older, reverse=True)[keep_previous:]:
+        _discard(index_dir, path)
+
+
+def _save_csr(directory: str, name: str, matrix) -> list:
+    """Save a CSR matrix as raw .npy components (not a compressed .npz) so it can be memory-mapped; returns its shape."""
+    matrix = csr_matrix(matrix)
+    np.save(os.path.join(directory, f"{name}_data.npy"), matrix.data)
+    np.save(os.path.join(directory, f"{name}_indices.npy"), matrix.indices)
+    np.save(os.path.join(directory, f"{name}_indptr.npy"), matrix.indptr)
+    return list(matrix.shape)
+
+
+def _mmap(directory: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+
+def _load_csr(directory: str, name: str, shape) -> csr_matrix:
+    return csr_matrix(
+        (_mmap(directory, f"{name}_data"), _mmap(directory, f"{name}_indices"), _mmap(directory, f"{name}_indptr")),
+        shape=tuple(shape),
+        copy=False,
+    )
+
+
+def save_index(index_dir: str, checksum: str, index: Dict[str, Any], replace: bool = False,
+               keep_previous: int = 1) -> str:
+    """
+    Write a fitted index to a versioned directory under index_dir.
+
+    The artifact is written to a temporary directory first and renamed into place,
+    so concurrent workers never observe a partially written index. Versions written
+    before it are then removed, except the keep_previous most recent, which processes
+    that have not refreshed yet may still load. Swapping and removing versions holds
+    an exclusive lock on index_dir, and load_index a shared one.
+
+    Args:
+        index_dir: Root directory holding index versions
+        checksum: Checksum of the games table the index was fitted on
+        index: Dict with "vectorizers", "vocabularies" (JSON-serializable), the SPARSE_FILES
+            CSR matrices, the ARRAY_FILES arrays and optionally the OPTIONAL_ARRAY_FILES arrays
+        replace: Overwrite an existing artifact for the same checksum (e.g. after a full refit)
+        keep_previous: Number of older versions to keep
+
+    Returns:
+        Path of the version directory
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    target = _version_dir(index_dir, checksum)
+    if os.path.isdir(target) and not replace:
+        return target
+
+    tmp_dir = tempfile.mkdtemp(prefix=".build-", dir=index_dir)
+    try:
+        shapes = {name: _save_csr(tmp_dir, name, index[name]) for name in SPARSE_FILES}
+        for name in ARRAY_FILES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(index[name]))
+        for name in OPTIONAL_ARRAY_FILES:
+            if index.get(name) is not None:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(index[name]))
+        joblib.dump(index["vectorizers"], os.path.join(tmp_dir, "vectorizers.joblib"))
+        with open(os.path.join(tmp_dir, "vocabularies.json"), "w", encoding="utf-8") as f:
+            json.dump(index["vocabularies"], f, ensure_ascii=False)
+
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "format_version": INDEX_FORMAT_VERSION,
+                "checksum": checksum,
+                "shapes": shapes,
+            }, f)
+
+        with _locked(index_dir, exclusive=True):
+            if replace and os.path.isdir(target):
+                _discard(index_dir, target)
+            try:
+                os.rename(tmp_dir, target)
+                # The version's age is when it was written, not when its last file was
+                os.utime(target)
+            except OSError:
+                # Another worker finished the same version first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            _drop_old_versions(index_dir, target, keep_previous)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return target
+
+
+def load_index(index_dir: str, checksum: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a previously saved index, memory-mapping the numeric arrays.
+
+    Args:
+        index_dir: Root directory holding index versions
+        checksum: Checksum of the current games table
+
+    Returns:
+        The index dict as passed to save_index plus the version directory as "path",
+        or None if no matching version exists
+    """
+    path = _version_dir(index_dir, checksum)
+    if not os.path.isdir(index_dir):
+        return None
+
+    # Once mapped, the files stay readable even if the version is removed afterwards
+    with _locked(index_dir, exclusive=False):
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION or manifest.get("checksum") != checksum:
+            return None
+
+        with open(os.path.join(path, "vocabularies.json"), "r", encoding="utf-8") as f:
+            index = {
+                "path": path,
+                "vectorizers": joblib.load(os.path.join(path, "vectorizers.joblib")),
+                "vocabularies": json.load(f),
+            }
+        for name in SPARSE_FILES:
+            index[name] = _load_csr(path, name, manifest["shapes"][name])
+        for name in ARRAY_FILES:
+            index[name] = _mmap(path, name)
+        for name in OPTIONAL_ARRAY_FILES:
+            if os.path.exists(os.path.join(path, f"{name}.npy")):
+                index[name] = _mmap(path, name)
+    return index
+
+
+def save_similarity_vectors(index_path: str, layout: str, vectors) -> Optional[str]:
+    """
+    Write a similarity index's normalized rows into the index version they were built from.
+
+    Worker processes memory-map them (see load_similarity_vectors) rather than each holding
+    a private copy. Like save_index, they are written to a temporary directory and renamed
+    into place; an existing copy for the same layout is kept.
+
+    Args:
+        index_path: Version directory returned by save_index or load_index
+        layout: SimilarityIndex.layout() of the index the rows belong to
+        vectors: Normalized rows in list order, CSR or dense
+
+    Returns:
+        Path of the directory holding the rows, or None if the version no longer exists
+    """
+    target = os.path.join(index_path, f"similarity-{layout}")
+    # Keeps save_index from removing the version while the rows are written into it
+    with _locked(os.path.dirname(index_path), exclusive=False):
+        if not os.path.isdir(index_path):
+            # The version was removed; workers normalize the rows themselves
+            return None
+        if os.path.isdir(target):
+            return target
+        tmp_dir = tempfile.mkdtemp(prefix=".build-", dir=index_path)
+        try:
+            if isinstance(vectors, np.ndarray):
+                np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+                manifest = {"sparse": False}
+            else:
+                manifest = {"sparse": True, "shape": _save_csr(tmp_dir, "vectors", vectors)}
+            with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            try:
+                os.rename(tmp_dir, target)
+            except OSError:
+                # Another process saved the same rows first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    return target
+
+
+def load_similarity_vectors(index_path: str, layout: str):
+    """Memory-map rows saved by save_similarity_vectors, or return None if there are none for layout."""
+    path = os.path.join(index_path, f"similarity-{layout}")
+    with _locked(os.path.dirname(index_path), exclusive=False):
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["sparse"]:
+            return _load_csr(path, "vectors", manifest["shape"])
+        return _mmap(path, "vectors")
@@ -1,91 +1,268 @@
+import argparse
+import hashlib
+import io
 import json
+import os
+import time
 import ijson  # For streaming JSON parsing
-from sqlalchemy.orm import Session
-from models import Game, init_db
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.engine import Connection
+from models import Game, GameSyncState, CatalogMeta, UserGamePreference, dialect_insert, init_db
 import tqdm
 
-def load_games_to_db(json_file: str = "games.json", batch_size: int = 1000):
-    """Load games from JSON file into database in batches."""
+games_table = Game.__table__
+sync_table = GameSyncState.__table__
+meta_table = CatalogMeta.__table__
+preference_table = UserGamePreference.__table__
+GAME_COLUMNS = [column.name for column in games_table.columns]
+JSON_COLUMNS = {"screenshots", "genres", "tags", "developer", "publisher"}
+
+def parse_game(appid_str: str, game: dict) -> dict:
+    """Convert one games.json entry into a row for the games table."""
+    appid = int(appid_str)
+
+    # Calculate review metrics
+    positive = game.get('positive', 0)
+    negative = game.get('negative', 0)
+    total_reviews = positive + negative
+    review_ratio = positive / (total_reviews + 1e-6)
+
+    return {
+        "appid": appid,
+        "name": game.get('name', ''),
+        "release_date": game.get('release_date', ''),
+        "detailed_description": game.get('detailed_description', ''),
+        "short_description": game.get('short_description', ''),
+        "header_image": game.get('header_image', ''),
+        "screenshots": game.get('screenshots', []),
+        "genres": game.get('genres', []),
+        "tags": list(game.get('tags', {}).keys()) if isinstance(game.get('tags'), dict) else game.get('tags', []),
+        "positive": positive,
+        "negative": negative,
+        "developer": game.get('developers', []),
+        "publisher": game.get('publishers', []),
+        "total_reviews": total_reviews,
+        "review_ratio": review_ratio,
+        "popularity_score": 0.0  # Will be updated after all games are loaded
+    }
+
+def content_hash(row: dict) -> str:
+    """Hash of the source fields of a row, used to skip unchanged games on re-sync."""
+    payload = {key: value for key, value in row.items() if key != "popularity_score"}
+    return hashlib.md5(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def source_fingerprint(json_file: str) -> str:
+    """Cheap identity of the dataset file, so an untouched file is not even parsed."""
+    stat = os.stat(json_file)
+    return f"{os.path.abspath(json_file)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def iter_games(json_file: str):
+    """Stream (appid, game) pairs from games.json without loading the whole file."""
+    with open(json_file, 'rb') as f:
+        for appid_str, game in ijson.kvitems(f, '', use_float=True):
+            try:
+                yield parse_game(appid_str, game)
+            except Exception as e:
+                print(f"Error processing game {appid_str}: {e}")
+
+def _copy_field(value) -> str:
+    """Encode one value for COPY ... (FORMAT csv), keeping NULL and the empty string apart."""
+    if value is None:
+        # An unquoted empty field is the only thing COPY reads as NULL
+        return ""
+    if isinstance(value, str):
+        # Quoting every string keeps '' an empty string instead of NULL
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+def _copy_rows(batch: list[dict]) -> io.StringIO:
+    """Serialize a batch as COPY csv input in GAME_COLUMNS order."""
+    buffer = io.StringIO()
+    for row in batch:
+        buffer.write(",".join(
+            _copy_field(json.dumps(row[column]) if column in JSON_COLUMNS else row[column])
+            for column in GAME_COLUMNS
+        ))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+def _copy_batch(connection: Connection, batch: list[dict]):
+    """Insert a batch with Postgres COPY, which avoids per-row statement overhead."""
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {games_table.name} ({', '.join(GAME_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            _copy_rows(batch)
+        )
+    finally:
+        cursor.close()
+
+def _insert_batch(connection: Connection, batch: list[dict]):
+    """Insert a batch as a single Core executemany."""
+    connection.execute(games_table.insert(), batch)
+
+def _upsert_batch(connection: Connection, batch: list[dict]):
+    """Insert new games and overwrite changed ones with a single ON CONFLICT executemany."""
+    insert = dialect_insert(connection.dialect.name)
+    stmt = insert(games_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[games_table.c.appid],
+        set_={column: stmt.excluded[column] for column in GAME_COLUMNS if column != "appid"}
+    )
+    connection.execute(stmt, batch)
+
+def _write_hashes(connection: Connection, hashes: list[dict]):
+    insert = dialect_insert(connection.dialect.name)
+    stmt = insert(sync_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[sync_table.c.appid],
+        set_={"content_hash": stmt.excluded.content_hash}
+    )
+    connection.execute(stmt, hashes)
+
+def _delete_games(connection: Connection, appids: list[int], chunk_size: int = 500) -> int:
+    """Delete games with their sync state and the preferences that reference them; returns the count."""
+    for start in range(0, len(appids), chunk_size):
+        chunk = appids[start:start + chunk_size]
+        connection.execute(delete(preference_table).where(preference_table.c.appid.in_(chunk)))
+        connection.execute(delete(sync_table).where(sync_table.c.appid.in_(chunk)))
+        connection.execute(delete(games_table).where(games_table.c.appid.in_(chunk)))
+    return len(appids)
+
+def _read_meta(connection: Connection) -> dict:
+    return dict(connection.execute(select(meta_table.c.key, meta_table.c.value)).all())
+
+def _write_meta(connection: Connection, values: dict):
+    insert = dialect_insert(connection.dialect.name)
+    stmt = insert(meta_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[meta_table.c.key],
+        set_={"value": stmt.excluded.value}
+    )
+    connection.execute(stmt, [{"key": key, "value": str(value)} for key, value in values.items()])
+
+def load_games_to_db(json_file: str = "games.json", batch_size: int = 1000, full: bool = False):
+    """
+    Sync games from JSON file into database in batches.
+
+    By default only games whose content hash changed since the last sync are upserted,
+    games no longer in the file are deleted along with their preferences, and the file
+    is not parsed at all if it is unchanged. With full=True the games
+    table is emptied and reloaded with plain bulk inserts (COPY on Postgres).
+    """
     # Initialize database
     engine = init_db()
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
+    dialect = engine.dialect.name
+
+    if dialect == "sqlite":
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+    fingerprint = source_fingerprint(json_file)
+    with engine.connect() as connection:
+        meta = _read_meta(connection)
+        has_games = connection.execute(select(games_table.c.appid).limit(1)).first() is not None
+
+    if not full and has_games and meta.get("source_fingerprint") == fingerprint:
+        print(f"{json_file} is unchanged since the last sync, nothing to do")
+        return
+
+    print(f"Loading games from {json_file}...")
+    start = time.perf_counter()
+    seen_games = 0
+    written_games = 0
+    removed_games = 0
 
     try:
-        print(f"Loading games from {json_file}...")
-        batch = []
-        
-        # Load and parse JSON file
-        with open(json_file, 'r', encoding='utf-8') as f:
-            games_data = json.load(f)
-            total_games = len(games_data)
-            
-            # Process games in batches
-            for appid_str, game in tqdm.tqdm(games_data.items(), total=total_games, desc="Loading games"):
-                try:
-                    appid = int(appid_str)
-                    
-                    # Calculate review metrics
-                    positive = game.get('positive', 0)
-                    negative = game.get('negative', 0)
-                    total_reviews = positive + negative
-                    review_ratio = positive / (total_reviews + 1e-6)
-                    
-                    # Create Game instance
-                    game_obj = Game(
-                        appid=appid,
-                        name=game.get('name', ''),
-                        release_date=game.get('release_date', ''),
-                        detailed_description=game.get('detailed_description', ''),
-                        short_description=game.get('short_description', ''),
-                        header_image=game.get('header_image', ''),
-                        screenshots=game.get('screenshots', []),
-                        genres=game.get('genres', []),
-                        tags=list(game.get('tags', {}).keys()) if isinstance(game.get('tags'), dict) else game.get('tags', []),
-                        positive=positive,
-                        negative=negative,
-                        developer=game.get('developers', []),
-                        publisher=game.get('publishers', []),
-                        total_reviews=total_reviews,
-                        review_ratio=review_ratio,
-                        popularity_score=0.0  # Will be updated after all games are loaded
-                    )
-                    
-                    batch.append(game_obj)
-                    
-                    # When batch is full, commit to database
-                    if len(batch) >= batch_size:
-                        db.bulk_save_objects(batch)
-                        db.commit()
-                        batch = []
-                        
-                except Exception as e:
-                    print(f"Error processing game {appid_str}: {e}")
+        # One transaction for the whole load; rolled back as a unit on failure
+        with engine.begin() as connection:
+            if dialect == "sqlite":
+                connection.exec_driver_sql("PRAGMA synchronous=NORMAL")
+
+            if full:
+                connection.execute(delete(sync_table))
+                connection.execute(delete(games_table))
+                has_games = False
+
+            if has_games:
+                # Existing catalog: upsert only games whose content changed
+                write_batch = _upsert_batch
+                known_hashes = dict(connection.execute(
+                    select(sync_table.c.appid, sync_table.c.content_hash)
+                ).all())
+            else:
+                write_batch = _copy_batch if dialect == "postgresql" else _insert_batch
+                known_hashes = {}
+
+            # Rows written now use the current maximum; a moved maximum triggers a full pass below
+            previous_max = int(meta["max_total_reviews"]) if has_games and "max_total_reviews" in meta else None
+
+            batch = []
+            hashes = []
+            seen_appids = set()
+            for row in tqdm.tqdm(iter_games(json_file), desc="Syncing games", unit="games"):
+                seen_games += 1
+                seen_appids.add(row["appid"])
+                row_hash = content_hash(row)
+                if known_hashes.get(row["appid"]) == row_hash:
                     continue
-            
-            # Commit any remaining games
+
+                if previous_max is not None:
+                    row["popularity_score"] = row["total_reviews"] / (previous_max + 1e-6)
+                batch.append(row)
+                hashes.append({"appid": row["appid"], "content_hash": row_hash})
+
+                if len(batch) >= batch_size:
+                    write_batch(connection, batch)
+                    _write_hashes(connection, hashes)
+                    written_games += len(batch)
+                    batch = []
+                    hashes = []
+
             if batch:
-                db.bulk_save_objects(batch)
-                db.commit()
-        
-        # Update popularity scores
-        print("Updating popularity scores...")
-        max_reviews = db.query(Game.total_reviews).order_by(Game.total_reviews.desc()).first()[0]
-        db.query(Game).update({
-            Game.popularity_score: Game.total_reviews / (max_reviews + 1e-6)
-        })
-        db.commit()
-        
-        print("Games loaded successfully!")
-        
+                write_batch(connection, batch)
+                _write_hashes(connection, hashes)
+                written_games += len(batch)
+
+            if has_games:
+                # Games that left the dataset, as a full reload would drop them
+                removed_games = _delete_games(connection, [
+                    appid for appid in connection.execute(select(games_table.c.appid)).scalars()
+                    if appid not in seen_appids
+                ])
+
+            max_reviews = connection.execute(select(func.max(games_table.c.total_reviews))).scalar() or 0
+            if max_reviews != previous_max:
+                # Update popularity scores
+                print("Updating popularity scores...")
+                connection.execute(update(games_table).values(
+                    popularity_score=games_table.c.total_reviews / (max_reviews + 1e-6)
+                ))
+
+            if full:
+                # Preferences for games that left the dataset would fail the deferred foreign key at commit
+                connection.execute(delete(preference_table).where(
+                    preference_table.c.appid.not_in(select(games_table.c.appid))
+                ))
+
+            _write_meta(connection, {
+                "source_fingerprint": fingerprint,
+                "max_total_reviews": max_reviews,
+            })
     except Exception as e:
         print(f"Error loading games: {e}")
-        db.rollback()
         raise
-    finally:
-        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Games synced successfully! {written_games} of {seen_games} games written, {removed_games} removed "
+          f"in {elapsed:.1f}s "
+          f"({seen_games / max(elapsed, 1e-9):.0f} rows/sec)")
 
 if __name__ == "__main__":
-    load_games_to_db() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the Steam games dataset into the database.")
+    parser.add_argument("--file", default="games.json", help="Path to games.json")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--full", action="store_true", help="Drop all games and reload from scratch")
+    args = parser.parse_args()
+    load_games_to_db(args.file, args.batch_size, full=args.full)
@@ -1,23 +1,70 @@
 # main.py
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import hmac
+import json
+import os
+import time
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
-from pydantic import BaseModel
-from typing import Optional
-from recommender import Recommender
-from utils import fetch_owned_games
-from models import UserGamePreference, GameStatus, Game, init_db
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from recommender import Recommender, recommender_settings
+from result_cache import RecommendationCache
+from metrics import metrics, RequestProfiler
+from executor import ExecutorOverloaded, RecommendationExecutor
+import httpx
+from utils import fetch_owned_games, steam_client
+from models import UserGamePreference, GameStatus, Game, PrecomputedRecommendation, dialect_insert, init_db, load_user_preferences
 
 app = FastAPI()
 
+preference_table = UserGamePreference.__table__
+
 # Initialize database
 engine = init_db()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Initialize recommender with database session
-db = SessionLocal()
-recommender = Recommender(db)
+# Initialize recommender; requests get their own sessions from get_db
+with SessionLocal() as init_db_session:
+    recommender = Recommender(init_db_session, **recommender_settings())
+
+# Rendered recommendations per user, invalidated by preference writes; repeat views within
+# RESULT_CACHE_REVALIDATE seconds are served without calling Steam or the database
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+    revalidate_after=float(os.getenv("RESULT_CACHE_REVALIDATE", "300"))
+)
+
+# Ranking runs on a bounded pool off the event loop ("thread" or "process"); beyond
+# RECOMMENDER_MAX_QUEUE waiting jobs, or RECOMMENDER_MAX_QUEUE_WAIT seconds of waiting, requests get 503
+recommendation_executor = RecommendationExecutor(
+    recommender,
+    mode=os.getenv("RECOMMENDER_EXECUTOR", "thread"),
+    workers=int(os.getenv("RECOMMENDER_WORKERS", "0")) or None,
+    max_queue=int(os.getenv("RECOMMENDER_MAX_QUEUE", "32")),
+    max_queue_wait=float(os.getenv("RECOMMENDER_MAX_QUEUE_WAIT", "5"))
+)
+
+# Incremental catalog refresh cadence, and how often a refresh is a full refit instead
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "300"))
+CATALOG_REFIT_INTERVAL = float(os.getenv("CATALOG_REFIT_INTERVAL", "86400"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Maximum age of a row written by precompute.py before it is no longer served
+PRECOMPUTED_TTL = float(os.getenv("PRECOMPUTED_TTL", "86400"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+MAX_STATUS_BATCH_SIZE = 1000
+
+# Handler stages share the recommender's stage metric, e.g. stage="steam_fetch" next to stage="ridge_fit"
+STAGE_METRIC = "recommender_stage_seconds"
+
+# Sampling profiler for live requests; off unless PROFILE_SAMPLE_RATE or POST /admin/profiler enables it
+profiler = RequestProfiler(sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")))
 
 # Dependency to get DB session
 def get_db():
@@ -27,70 +74,309 @@ def get_db():
     finally:
         db.close()
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    if profiler.should_sample():
+        with profiler.capture(f"{request.method} {request.url.path}"):
+            response = await call_next(request)
+    else:
+        response = await call_next(request)
+    # Label by route template (/games/{appid}/status), not by raw path, to keep series bounded
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - start, method=request.method, path=path)
+    metrics.inc("http_requests_total", method=request.method, path=path, status=response.status_code)
+    return response
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Fail closed: without a configured token nobody can trigger refits or profiling
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def refresh_recommender(full: bool = False) -> dict:
+    """Refresh the recommender from the database and drop recommendations ranked on the old catalog."""
+    db = SessionLocal()
+    try:
+        summary = recommender.refresh(db, full=full)
+        if summary["changed"]:
+            db.query(PrecomputedRecommendation).filter(
+                PrecomputedRecommendation.catalog_version != recommender.checksum
+            ).delete()
+            db.commit()
+    finally:
+        db.close()
+    if summary["changed"]:
+        recommendation_cache.clear()
+        recommendation_executor.restart()
+        recommender.similarity_index()
+    return summary
+
+async def refresh_catalog_periodically():
+    last_refit = time.monotonic()
+    while True:
+        await asyncio.sleep(CATALOG_REFRESH_INTERVAL)
+        full = time.monotonic() - last_refit >= CATALOG_REFIT_INTERVAL
+        try:
+            await run_in_threadpool(refresh_recommender, full)
+            if full:
+                last_refit = time.monotonic()
+        except Exception as e:
+            print(f"Scheduled catalog refresh failed: {e}")
+
 class GameStatusUpdate(BaseModel):
     status: str
     steamid: str
 
+class GameStatusEvent(BaseModel):
+    appid: int
+    status: str
+
+class GameStatusBatch(BaseModel):
+    steamid: str
+    events: List[GameStatusEvent] = Field(..., min_length=1, max_length=MAX_STATUS_BATCH_SIZE)
+
+class BatchRecommendationRequest(BaseModel):
+    steam_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    top_n: int = Field(10, ge=1, le=100)
+
+def with_session(fn, *args):
+    """Call fn(db, *args) in a short-lived session, so async handlers hold no connection across awaits."""
+    with SessionLocal() as db:
+        return fn(db, *args)
+
+async def run_recommendation_job(method: str, *args):
+    """Run a recommender method on the executor, mapping overload to 503 and failures to 500."""
+    try:
+        return await recommendation_executor.run(method, *args)
+    except ExecutorOverloaded as e:
+        metrics.inc("recommendations_served_total", source="rejected")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def load_precomputed(db: Session, fingerprints: dict, top_n: int, catalog_version: str) -> dict:
+    """
+    Return the precomputed response bodies still valid for the given users.
+
+    A row is valid while it is younger than PRECOMPUTED_TTL, has top_n results, and was
+    ranked on the current catalog and on the library and preferences the user has now.
+
+    Args:
+        db: SQLAlchemy database session
+        fingerprints: RecommendationCache.fingerprint of every user's current library and preferences
+        top_n: Number of results requested
+        catalog_version: Recommender.checksum of the current catalog
+    """
+    rows = db.query(PrecomputedRecommendation).filter(
+        PrecomputedRecommendation.steam_id.in_(list(fingerprints)),
+        PrecomputedRecommendation.created_at >= time.time() - PRECOMPUTED_TTL,
+        PrecomputedRecommendation.top_n == top_n,
+        PrecomputedRecommendation.catalog_version == catalog_version
+    ).all()
+    return {row.steam_id: row.payload.encode("utf-8") for row in rows if row.fingerprint == fingerprints[row.steam_id]}
+
+
+def upsert_preferences(db: Session, steam_id: str, statuses: dict):
+    """Write {appid: GameStatus} for one user with a single ON CONFLICT upsert and drop their cached results."""
+    updated_at = time.time()
+    insert = dialect_insert(db.get_bind().dialect.name)
+    statement = insert(preference_table)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[preference_table.c.steam_id, preference_table.c.appid],
+        set_={"status": statement.excluded.status, "updated_at": statement.excluded.updated_at},
+    ), [
+        {"steam_id": steam_id, "appid": appid, "status": status, "updated_at": updated_at}
+        for appid, status in statuses.items()
+    ])
+    # Precomputed recommendations no longer reflect the user's preferences
+    db.query(PrecomputedRecommendation).filter(PrecomputedRecommendation.steam_id == steam_id).delete()
+    db.commit()
+    recommendation_cache.invalidate(steam_id)
 
 @app.post("/games/{appid}/status")
-async def update_game_status(appid: str, status_update: GameStatusUpdate, db: Session = Depends(get_db)):
+def update_game_status(appid: int, status_update: GameStatusUpdate, db: Session = Depends(get_db)):
     try:
         # Validate status
         game_status = GameStatus(status_update.status.lower())
-        
-        # Check if game exists
-        game = db.query(Game).filter(Game.appid == appid).first()
-        if not game:
-            raise HTTPException(status_code=404, detail="Game not found")
-        
-        # Check if preference already exists
-        existing_pref = db.query(UserGamePreference).filter(
-            UserGamePreference.steam_id == status_update.steamid,
-            UserGamePreference.appid == appid
-        ).first()
-        
-        if existing_pref:
-            # Update existing preference
-            existing_pref.status = game_status
-        else:
-            # Create new preference
-            new_pref = UserGamePreference(
-                steam_id=status_update.steamid,
-                appid=appid,
-                status=game_status
-            )
-            db.add(new_pref)
-        
-        db.commit()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid status. Must be 'liked' or 'disliked'")
+
+    try:
+        # The foreign key to games rejects unknown games, so no lookup is needed first
+        upsert_preferences(db, status_update.steamid, {appid: game_status})
         return {"message": "Game status updated successfully"}
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Game not found")
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/games/status/batch")
+def update_game_statuses(batch: GameStatusBatch, db: Session = Depends(get_db)):
+    """Apply many like/dislike events of one user in one transaction; later events for a game win."""
+    try:
+        statuses = {event.appid: GameStatus(event.status.lower()) for event in batch.events}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid status. Must be 'liked' or 'disliked'")
+
+    try:
+        known = set(db.scalars(select(Game.appid).where(Game.appid.in_(list(statuses)))))
+        unknown = sorted(set(statuses) - known)
+        if known:
+            upsert_preferences(db, batch.steamid, {appid: statuses[appid] for appid in known})
+        return {"updated": len(known), "unknown": unknown}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/recommendations")
-async def get_recommendations(steam_id: str, db: Session = Depends(get_db)):
-    user_games = fetch_owned_games(steam_id)
+async def get_recommendations(steam_id: str):
+    # Repeat views are answered from memory before any Steam or database round-trip
+    body = recommendation_cache.get(steam_id)
+    if body is not None:
+        metrics.inc("recommendations_served_total", source="cache")
+        return Response(content=body, media_type="application/json")
+    cache_generation = recommendation_cache.generation
+
+    try:
+        with metrics.timer(STAGE_METRIC, stage="steam_fetch"):
+            user_games = await fetch_owned_games(steam_id)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Steam API request failed: {e}")
     if not user_games:
         raise HTTPException(status_code=404, detail="No games found or Steam ID invalid")
     
     # Get user preferences
-    preferences = db.query(UserGamePreference).filter(
-        UserGamePreference.steam_id == steam_id
-    ).all()
-    
-    # Convert preferences to dict for easier lookup
-    user_preferences = {
-        pref.appid: pref.status.value 
-        for pref in preferences
+    # Database reads run in the threadpool so they do not block the event loop
+    with metrics.timer(STAGE_METRIC, stage="preferences_query"):
+        user_preferences = (await run_in_threadpool(with_session, load_user_preferences, [steam_id]))[steam_id]
+
+    # Entries past their revalidation window are still served while the inputs are unchanged
+    fingerprint = RecommendationCache.fingerprint(user_games, user_preferences)
+    body = recommendation_cache.get(steam_id, fingerprint)
+    if body is not None:
+        metrics.inc("recommendations_served_total", source="cache")
+        return Response(content=body, media_type="application/json")
+
+    # Users covered by the offline precompute job are served with a single indexed read
+    with metrics.timer(STAGE_METRIC, stage="precomputed_lookup"):
+        body = (await run_in_threadpool(with_session, load_precomputed, {steam_id: fingerprint}, 10,
+                                          recommender.checksum)).get(steam_id)
+    if body is not None:
+        recommendation_cache.put(steam_id, fingerprint, body, cache_generation)
+        metrics.inc("recommendations_served_total", source="precomputed")
+        return Response(content=body, media_type="application/json")
+
+    # Includes the time the job waited for a worker
+    with metrics.timer(STAGE_METRIC, stage="rank"):
+        ranked = await run_recommendation_job("rank", user_games, 10, user_preferences)
+    # Cards are pre-serialized, so the body is assembled without touching the DB
+    with metrics.timer(STAGE_METRIC, stage="render"):
+        body = recommender.cards.render(ranked)
+
+    recommendation_cache.put(steam_id, fingerprint, body, cache_generation)
+    metrics.inc("recommendations_served_total", source="ranked")
+    return Response(content=body, media_type="application/json")
+
+@app.post("/recommendations/batch")
+async def get_batch_recommendations(batch: BatchRecommendationRequest):
+    """Recommendations for many users, keyed by steam_id; users without a readable library get []."""
+    steam_ids = list(dict.fromkeys(batch.steam_ids))
+    with metrics.timer(STAGE_METRIC, stage="batch_steam_fetch"):
+        libraries = await asyncio.gather(*(fetch_owned_games(steam_id) for steam_id in steam_ids),
+                                         return_exceptions=True)
+    preferences = await run_in_threadpool(with_session, load_user_preferences, steam_ids)
+    users = {
+        steam_id: (games, preferences[steam_id])
+        for steam_id, games in zip(steam_ids, libraries)
+        if not isinstance(games, Exception)
     }
-    
+
+    # Precomputed rows still valid for a user's current library and preferences spare their ranking
+    fingerprints = {steam_id: RecommendationCache.fingerprint(*user) for steam_id, user in users.items()}
+    bodies = await run_in_threadpool(with_session, load_precomputed, fingerprints, batch.top_n,
+                                    recommender.checksum)
+    users = {steam_id: user for steam_id, user in users.items() if steam_id not in bodies}
+
+    # One rank_batch job shares the catalog-wide work across all pending users
+    ranked = await run_recommendation_job("rank_batch", users, batch.top_n) if users else {}
+    for steam_id, user_ranked in ranked.items():
+        bodies[steam_id] = recommender.cards.render(user_ranked)
+
+    body = b"{" + b",".join(
+        json.dumps(steam_id).encode("utf-8") + b":" + bodies.get(steam_id, b"[]") for steam_id in steam_ids
+    ) + b"}"
+    return Response(content=body, media_type="application/json")
+
+@app.get("/games/{appid}/similar")
+async def get_similar_games(appid: int, top_n: int = 10):
+    if not 1 <= top_n <= 100:
+        raise HTTPException(status_code=400, detail="top_n must be between 1 and 100")
+    similarity = await run_in_threadpool(recommender.similarity_index)
+    similar = similarity.similar(appid, top_n)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    # Cosine similarity in percent takes the place of the recommendation score
+    return Response(
+        content=recommender.cards.render([(similar_appid, score * 100) for similar_appid, score in similar]),
+        media_type="application/json"
+    )
+
+@app.get("/executor/stats")
+async def get_executor_stats():
+    return recommendation_executor.stats()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return recommendation_cache.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    cache_stats = recommendation_cache.stats()
+    for name in ("hits", "misses", "evictions", "invalidations"):
+        metrics.set_counter(f"recommendation_cache_{name}_total", cache_stats[name])
+    for name in ("size", "max_entries", "hit_ratio"):
+        metrics.set_gauge(f"recommendation_cache_{name}", cache_stats[name])
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/profiler", dependencies=[Depends(require_admin)])
+async def get_profiler():
+    return profiler.status()
+
+@app.post("/admin/profiler", dependencies=[Depends(require_admin)])
+async def configure_profiler(sample_rate: float = 0.0, max_profiles: Optional[int] = None):
+    """Profile a fraction of live requests; sample_rate=0 turns profiling off again."""
+    if not 0 <= sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+    if max_profiles is not None and max_profiles < 1:
+        raise HTTPException(status_code=400, detail="max_profiles must be at least 1")
+    profiler.configure(sample_rate, max_profiles)
+    return {"sample_rate": profiler.sample_rate, "max_profiles": profiler.profiles.maxlen}
+
+@app.post("/admin/reload", dependencies=[Depends(require_admin)])
+async def reload_catalog(full: bool = False):
     try:
-        return recommender.recommend(user_games, 10, user_preferences)
+        # Refresh runs off the event loop; requests keep using the current index until the swap
+        return await run_in_threadpool(refresh_recommender, full)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.on_event("startup")
+async def startup_event():
+    # Process workers load the saved index now rather than on the first request
+    recommendation_executor.start()
+    # Build the similarity index in the background instead of on the first request
+    asyncio.get_running_loop().run_in_executor(None, recommender.similarity_index)
+    if CATALOG_REFRESH_INTERVAL > 0:
+        app.state.refresh_task = asyncio.create_task(refresh_catalog_periodically())
+
 @app.on_event("shutdown")
-def shutdown_event():
-    db.close()
\ No newline at end of file
+async def shutdown_event():
+    if hasattr(app.state, "refresh_task"):
+        app.state.refresh_task.cancel()
+    await steam_client.aclose()
+    recommendation_executor.shutdown()
\ No newline at end of file
@@ -0,0 +1,286 @@
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Set by RequestProfiler.capture for the captured request: executor jobs it runs are profiled
+# where they run (see run_profiled) and their stats are added to the capture
+_job_profiles: ContextVar[Optional[Dict[str, Any]]] = ContextVar("job_profiles", default=None)
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Summary:
+    def __init__(self, window: int):
+        """Running count and sum plus the most recent window observations for quantiles."""
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.recent:
+            return {q: float("nan") for q in QUANTILES}
+        values = np.percentile(np.fromiter(self.recent, dtype=np.float64), [q * 100 for q in QUANTILES])
+        return dict(zip(QUANTILES, values.tolist()))
+
+
+class MetricsRegistry:
+    def __init__(self, window: int = 1024):
+        """
+        In-process counters, gauges and summaries, rendered in the Prometheus text format.
+
+        Summaries report p50/p95/p99 over the last window observations of each label set,
+        plus the all-time count and sum.
+
+        Args:
+            window: Number of recent observations kept per summary for quantiles
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._help: Dict[str, str] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, Summary]] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        self._forward("inc", name, value, labels)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_counter(self, name: str, value: float, **labels):
+        """Publish a counter that is maintained elsewhere (e.g. cache hit totals)."""
+        with self._lock:
+            self._counters.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def observe(self, name: str, value: float, **labels):
+        self._forward("observe", name, value, labels)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                summary = series[key] = Summary(self.window)
+            summary.observe(float(value))
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the wall time of the block in seconds, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _forward(self, kind: str, name: str, value: float, labels: Dict[str, Any]):
+        records = getattr(self._local, "records", None)
+        if records is not None:
+            records.append((kind, name, value, labels))
+
+    @contextmanager
+    def record(self):
+        """
+        Also collect the increments and observations this thread makes in the block, e.g. in a
+        worker process, so the process serving /metrics can replay() them. Gauges are not collected.
+        """
+        records: List[Tuple[str, str, float, Dict[str, Any]]] = []
+        self._local.records = records
+        try:
+            yield records
+        finally:
+            self._local.records = None
+
+    def replay(self, records: List[Tuple[str, str, float, Dict[str, Any]]]):
+        """Apply increments and observations collected by record()."""
+        for kind, name, value, labels in records:
+            getattr(self, kind)(name, value, **labels)
+
+    def quantiles(self, name: str, **labels) -> Dict[float, float]:
+        with self._lock:
+            summary = self._summaries.get(name, {}).get(_label_key(labels))
+            return summary.quantiles() if summary else {}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+
+        def header(name: str, kind: str):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                header(name, "counter")
+                lines.extend(f"{name}{_format_labels(key)} {value:g}" for key, value in series.items())
+            for name, series in sorted(self._gauges.items()):
+                header(name, "gauge")
+                lines.extend(f"{name}{_format_labels(key)} {value:g}" for key, value in series.items())
+            for name, series in sorted(self._summaries.items()):
+                header(name, "summary")
+                for key, summary in series.items():
+                    for quantile, value in summary.quantiles().items():
+                        lines.append(f"{name}{_format_labels(key, ('quantile', str(quantile)))} {value:.6g}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {summary.sum:.6g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {summary.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_stats(profiler: cProfile.Profile, top_functions: int) -> str:
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top_functions)
+    return output.getvalue()
+
+
+def job_profiling() -> Optional[int]:
+    """Number of functions to keep from executor jobs of the current request, or None if it is not captured."""
+    capture = _job_profiles.get()
+    return capture["top_functions"] if capture is not None else None
+
+
+def add_job_profile(label: str, profile: Dict[str, Any]):
+    """Attach a profile returned by run_profiled to the current request's capture."""
+    capture = _job_profiles.get()
+    if capture is not None:
+        capture["jobs"].append({"label": label, **profile})
+
+
+def run_profiled(top_functions: int, fn, *args) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Call fn under cProfile in the calling thread; returns its result and the profile, or None
+    if another profiler is active there (Python 3.12+ allows only one at a time).
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return fn(*args), None
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+    finally:
+        profiler.disable()
+    return result, {
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "stats": _format_stats(profiler, top_functions),
+    }
+
+
+class RequestProfiler:
+    def __init__(self, sample_rate: float = 0.0, max_profiles: int = 20, top_functions: int = 30):
+        """
+        Opt-in sampling profiler: runs cProfile on a random fraction of requests.
+
+        Only one request is profiled at a time. Each capture keeps the top functions by
+        cumulative time as text; the oldest captures are dropped beyond max_profiles.
+        Recommender jobs the request runs on the executor are profiled in their thread or
+        worker process and listed under the capture's "jobs".
+
+        Args:
+            sample_rate: Fraction of requests to profile; 0 disables profiling
+            max_profiles: Number of captured profiles kept
+            top_functions: Number of functions kept per profile
+        """
+        self.sample_rate = sample_rate
+        self.top_functions = top_functions
+        self.profiles = deque(maxlen=max_profiles)
+        self._active = threading.Lock()
+
+    def configure(self, sample_rate: float, max_profiles: Optional[int] = None):
+        self.sample_rate = sample_rate
+        if max_profiles is not None and max_profiles != self.profiles.maxlen:
+            self.profiles = deque(self.profiles, maxlen=max_profiles)
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def capture(self, label: str):
+        """Profile the block if no other capture is running; otherwise run it unprofiled."""
+        if not self._active.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        jobs = []
+        token = _job_profiles.set({"top_functions": self.top_functions, "jobs": jobs})
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            self.profiles.append({
+                "label": label,
+                "captured_at": time.time(),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "stats": _format_stats(profiler, self.top_functions),
+                "jobs": jobs,
+            })
+        finally:
+            _job_profiles.reset(token)
+            self._active.release()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "max_profiles": self.profiles.maxlen,
+            "profiles": list(self.profiles),
+        }
+
+
+metrics = MetricsRegistry()
+metrics.describe("recommender_stage_seconds", "Time spent in each stage of the recommendation pipeline")
+metrics.describe("recommender_fit_seconds", "Time to fit, restore or refresh the recommender index")
+metrics.describe("recommender_build_seconds", "Time to build each feature block when the recommender is fitted")
+metrics.describe("recommender_catalog_games", "Number of games in the recommender catalog")
+metrics.describe("recommender_catalog_features", "Number of feature columns in the recommender catalog")
+metrics.describe("recommender_user_library_games", "Number of owned games per ranked user")
+metrics.describe("http_request_duration_seconds", "HTTP request latency by route")
+metrics.describe("http_requests_total", "HTTP requests by route and status code")
+metrics.describe("recommendations_served_total", "Recommendation responses by source (precomputed, cache, ranked)")
+metrics.describe("executor_in_flight", "Recommendation jobs running or waiting for a worker")
+metrics.describe("executor_queue_wait_seconds", "Time recommendation jobs waited for a worker")
+metrics.describe("executor_rejected_total", "Recommendation jobs rejected by admission control, by reason")
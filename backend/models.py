@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, create_engine, UniqueConstraint, JSON, Float, ARRAY
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, create_engine, UniqueConstraint, JSON, Float, ARRAY, Text, select, event, inspect, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import enum
+import os
 
 Base = declarative_base()
 
@@ -34,18 +35,152 @@ class UserGamePreference(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     steam_id = Column(String, nullable=False, index=True)
-    appid = Column(String, nullable=False)
+    # Checked at commit, so a full reload of the games table can delete and re-insert games
+    appid = Column(
+        Integer,
+        ForeignKey("games.appid", name="fk_user_game_preferences_appid", deferrable=True, initially="DEFERRED"),
+        nullable=False
+    )
     status = Column(Enum(GameStatus), nullable=False)
+    # Unix time of the last write; precomputed recommendations record the newest one they saw
+    updated_at = Column(Float, nullable=False, default=0.0, server_default="0")
 
-    # Create a composite unique constraint to ensure one status per game per user
+    # Create a composite unique constraint to ensure one status per game per user;
+    # its (steam_id, appid) index also serves per-user reads and the upsert conflict target
     __table_args__ = (
         UniqueConstraint('steam_id', 'appid', name='uq_user_game'),
     )
 
+class GameSyncState(Base):
+    __tablename__ = "game_sync_state"
+
+    appid = Column(Integer, primary_key=True)
+    content_hash = Column(String(32), nullable=False)  # Hash of the row as last loaded from games.json
+
+class CatalogMeta(Base):
+    __tablename__ = "catalog_meta"
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
+class PrecomputedRecommendation(Base):
+    __tablename__ = "precomputed_recommendations"
+
+    steam_id = Column(String, primary_key=True)
+    payload = Column(Text, nullable=False)  # Rendered /recommendations JSON body
+    created_at = Column(Float, nullable=False)  # Unix time the payload was ranked
+    top_n = Column(Integer, nullable=False)  # Number of recommendations in the payload
+    # Newest UserGamePreference.updated_at of the user when ranked
+    preferences_updated_at = Column(Float, nullable=False)
+    # Recommender.checksum of the catalog the payload was ranked on
+    catalog_version = Column(String, nullable=False)
+    # RecommendationCache.fingerprint of the library and preferences the payload was ranked on
+    fingerprint = Column(String, nullable=False)
+
+def load_user_preferences(db, steam_ids) -> dict:
+    """Return {steam_id: {appid: status}} for many users with one query per 500 ids."""
+    steam_ids = list(steam_ids)
+    preferences = {steam_id: {} for steam_id in steam_ids}
+    for start in range(0, len(steam_ids), 500):
+        query = select(UserGamePreference.steam_id, UserGamePreference.appid, UserGamePreference.status).where(
+            UserGamePreference.steam_id.in_(steam_ids[start:start + 500])
+        )
+        for steam_id, appid, status in db.execute(query):
+            preferences[steam_id][appid] = status.value
+    return preferences
+
+def load_preference_versions(db, steam_ids) -> dict:
+    """Return {steam_id: newest preference updated_at} (0.0 for users without preferences) with one query per 500 ids."""
+    steam_ids = list(steam_ids)
+    versions = {steam_id: 0.0 for steam_id in steam_ids}
+    for start in range(0, len(steam_ids), 500):
+        query = select(UserGamePreference.steam_id, func.max(UserGamePreference.updated_at)).where(
+            UserGamePreference.steam_id.in_(steam_ids[start:start + 500])
+        ).group_by(UserGamePreference.steam_id)
+        for steam_id, updated_at in db.execute(query):
+            versions[steam_id] = updated_at or 0.0
+    return versions
+
+def dialect_insert(dialect_name: str):
+    """Return the dialect-specific insert() that supports ON CONFLICT upserts."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect_name}")
+    return insert
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def _migrate_preference_appids(engine):
+    """Convert a user_game_preferences table created with a string appid to the integer schema."""
+    inspector = inspect(engine)
+    if "user_game_preferences" not in inspector.get_table_names():
+        return
+    appid_column = next(c for c in inspector.get_columns("user_game_preferences") if c["name"] == "appid")
+    if isinstance(appid_column["type"], Integer):
+        return
+
+    print("Migrating user_game_preferences.appid to integer...")
+    # Preferences for non-numeric appids or games that are not in the catalog are dropped
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            connection.exec_driver_sql(
+                "DELETE FROM user_game_preferences WHERE appid !~ '^[0-9]+$' "
+                "OR appid::integer NOT IN (SELECT appid FROM games)"
+            )
+            connection.exec_driver_sql(
+                "ALTER TABLE user_game_preferences ALTER COLUMN appid TYPE INTEGER USING appid::integer"
+            )
+            connection.exec_driver_sql(
+                "ALTER TABLE user_game_preferences ADD CONSTRAINT fk_user_game_preferences_appid "
+                "FOREIGN KEY (appid) REFERENCES games (appid) DEFERRABLE INITIALLY DEFERRED"
+            )
+        else:
+            # SQLite cannot change a column type; rebuild the table instead
+            connection.exec_driver_sql("ALTER TABLE user_game_preferences RENAME TO user_game_preferences_old")
+            connection.exec_driver_sql("DROP INDEX IF EXISTS ix_user_game_preferences_steam_id")
+            UserGamePreference.__table__.create(connection)
+            connection.exec_driver_sql(
+                "INSERT INTO user_game_preferences (id, steam_id, appid, status) "
+                "SELECT id, steam_id, CAST(appid AS INTEGER), status FROM user_game_preferences_old "
+                "WHERE CAST(CAST(appid AS INTEGER) AS TEXT) = appid "
+                "AND CAST(appid AS INTEGER) IN (SELECT appid FROM games)"
+            )
+            connection.exec_driver_sql("DROP TABLE user_game_preferences_old")
+
+def _migrate_preference_versions(engine):
+    """Add the preference and precomputed-row version columns to tables created before them."""
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    with engine.begin() as connection:
+        if "user_game_preferences" in tables and not any(
+            column["name"] == "updated_at" for column in inspector.get_columns("user_game_preferences")
+        ):
+            print("Adding user_game_preferences.updated_at...")
+            connection.exec_driver_sql(
+                "ALTER TABLE user_game_preferences ADD COLUMN updated_at FLOAT NOT NULL DEFAULT 0"
+            )
+        if "precomputed_recommendations" in tables and not {
+            "preferences_updated_at", "catalog_version", "fingerprint"
+        } <= {column["name"] for column in inspector.get_columns("precomputed_recommendations")}:
+            # Rows without versions cannot be checked for staleness; precompute.py rebuilds them
+            print("Dropping precomputed_recommendations from before payload versions...")
+            PrecomputedRecommendation.__table__.drop(connection)
+
 # Create tables
-def init_db(database_url="sqlite:///./game_recommender.db"):
+def init_db(database_url=None):
+    database_url = database_url or os.getenv("DATABASE_URL", "sqlite:///./game_recommender.db")
     engine = create_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _enable_sqlite_foreign_keys)
     print("Created engine")
+    _migrate_preference_appids(engine)
+    _migrate_preference_versions(engine)
     Base.metadata.create_all(engine)
     print("Create all")
     return engine 
\ No newline at end of file
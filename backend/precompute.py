@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session, sessionmaker
+from models import (PrecomputedRecommendation, UserGamePreference, dialect_insert, init_db, load_preference_versions,
+                    load_user_preferences)
+from executor import call_recommender, process_pool
+from recommender import Recommender, recommender_settings
+from result_cache import RecommendationCache
+from utils import SteamClient, STEAM_API_KEY
+
+precomputed_table = PrecomputedRecommendation.__table__
+
+async def fetch_libraries(steam_ids: List[str], max_concurrency: int = 10) -> Dict[str, list]:
+    """Fetch owned games for many users; users whose request fails are left out."""
+    client = SteamClient(STEAM_API_KEY, max_concurrency=max_concurrency, cache_ttl=0)
+    try:
+        results = await asyncio.gather(
+            *(client.get_owned_games(steam_id) for steam_id in steam_ids), return_exceptions=True
+        )
+    finally:
+        await client.aclose()
+
+    libraries = {}
+    for steam_id, result in zip(steam_ids, results):
+        if isinstance(result, Exception):
+            print(f"Skipping {steam_id}: {result}")
+        else:
+            libraries[steam_id] = result
+    return libraries
+
+def _write_payloads(db: Session, payloads: Dict[str, bytes], created_at: float, top_n: int,
+                    versions: Dict[str, float], fingerprints: Dict[str, str], catalog_version: str) -> int:
+    """
+    Upsert rendered payloads, skipping users whose preferences changed after they were read.
+
+    Args:
+        db: SQLAlchemy database session
+        payloads: Rendered response body by steam_id
+        created_at: Unix time of the run
+        top_n: Number of recommendations in every payload
+        versions: Newest preference updated_at of every user when their preferences were read
+        fingerprints: RecommendationCache.fingerprint of the library and preferences every user was ranked on
+        catalog_version: Recommender.checksum of the catalog the users were ranked on
+
+    Returns:
+        Number of payloads written
+    """
+    current = load_preference_versions(db, payloads)
+    rows = [
+        {"steam_id": steam_id, "payload": payload.decode("utf-8"), "created_at": created_at, "top_n": top_n,
+         "preferences_updated_at": versions[steam_id], "catalog_version": catalog_version,
+         "fingerprint": fingerprints[steam_id]}
+        for steam_id, payload in payloads.items()
+        if current[steam_id] <= versions[steam_id]
+    ]
+    if rows:
+        insert = dialect_insert(db.get_bind().dialect.name)
+        statement = insert(precomputed_table)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[precomputed_table.c.steam_id],
+            set_={name: statement.excluded[name] for name in
+                  ("payload", "created_at", "top_n", "preferences_updated_at", "catalog_version", "fingerprint")},
+        ), rows)
+    db.commit()
+    return len(rows)
+
+def precompute(steam_ids: List[str], top_n: int = 10, workers: int = os.cpu_count() or 1, chunk_size: int = 64,
+               settings: Optional[Dict[str, Any]] = None, ttl: float = 86400.0):
+    """
+    Rank recommendations for many users offline and store the rendered responses.
+
+    Libraries are fetched concurrently, preferences are read in bulk, and users are
+    ranked in chunks through Recommender.rank_batch on a pool of worker processes.
+
+    Args:
+        steam_ids: Users to precompute
+        top_n: Number of recommendations per user
+        workers: Number of ranking processes; 1 ranks in this process
+        chunk_size: Users per rank_batch call
+        settings: Recommender keyword arguments; by default the API's, from recommender_settings(),
+            so the payloads match what /recommendations would rank
+        ttl: Rows older than this many seconds are deleted after the run
+    """
+    start = time.perf_counter()
+    engine = init_db()
+    db = sessionmaker(bind=engine)()
+    try:
+        recommender = Recommender(db, **(settings if settings is not None else recommender_settings()))
+
+        libraries = asyncio.run(fetch_libraries(steam_ids))
+        # Versions are read first, so a change between the two reads makes the payload stale, never current
+        versions = load_preference_versions(db, libraries)
+        preferences = load_user_preferences(db, libraries)
+        users = {steam_id: (games, preferences[steam_id]) for steam_id, games in libraries.items() if games}
+        fingerprints = {steam_id: RecommendationCache.fingerprint(*user) for steam_id, user in users.items()}
+        keys = list(users)
+        chunks = [{key: users[key] for key in keys[i:i + chunk_size]} for i in range(0, len(keys), chunk_size)]
+        print(f"Fetched {len(libraries)} of {len(steam_ids)} libraries, ranking {len(users)} users "
+              f"in {len(chunks)} chunks")
+
+        created_at = time.time()
+        written = 0
+        with contextlib.ExitStack() as stack:
+            if workers > 1 and len(chunks) > 1:
+                pool = stack.enter_context(process_pool(recommender, workers))
+                results = pool.map(call_recommender, ["rank_batch"] * len(chunks), chunks, [top_n] * len(chunks))
+            else:
+                results = (recommender.rank_batch(chunk, top_n) for chunk in chunks)
+            for ranked in results:
+                payloads = {key: recommender.cards.render(r) for key, r in ranked.items()}
+                written += _write_payloads(db, payloads, created_at, top_n, versions, fingerprints,
+                                           recommender.checksum)
+
+        db.execute(delete(PrecomputedRecommendation).where(PrecomputedRecommendation.created_at < created_at - ttl))
+        db.commit()
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Precomputed {written} users ({len(users) - written} skipped after a preference change) "
+          f"in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} users/sec)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute recommendations for many Steam users.")
+    parser.add_argument("steam_ids", nargs="*", help="Steam IDs to precompute")
+    parser.add_argument("--file", help="File with one Steam ID per line")
+    parser.add_argument("--known-users", action="store_true", help="Include every user with saved preferences")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    args = parser.parse_args()
+
+    steam_ids = list(args.steam_ids)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            steam_ids.extend(line.strip() for line in f if line.strip())
+    if args.known_users:
+        db = sessionmaker(bind=init_db())()
+        steam_ids.extend(db.scalars(select(UserGamePreference.steam_id).distinct()))
+        db.close()
+
+    precompute(
+        list(dict.fromkeys(steam_ids)),
+        top_n=args.top_n,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        ttl=float(os.getenv("PRECOMPUTED_TTL", "86400")),
+    )
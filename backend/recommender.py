@@ -1,15 +1,283 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import Ridge
+from sklearn.decomposition import TruncatedSVD
 from sklearn.preprocessing import OneHotEncoder
+from scipy.linalg import solve
+from scipy.sparse import csr_matrix, hstack, vstack
+from scipy.sparse.linalg import LinearOperator, cg
 from sqlalchemy.orm import Session
-from models import Game
-from typing import List, Dict, Any
+from sqlalchemy import select
+from models import Game, GameSyncState
+from cards import GameCardStore
+from features import fit_transform_chunked, strip_html
+from similarity import SimilarityIndex
+from candidates import CandidateGenerator
+from metrics import metrics
+from index_store import games_checksum, load_index, load_similarity_vectors, save_index, save_similarity_vectors
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 
+CATALOG_COLUMNS = [
+    'appid', 'content_hash', 'description', 'tags', 'genres',
+    'developer', 'publisher', 'review_ratio', 'popularity_score'
+]
+
+# Column order of the feature blocks in feature_matrix
+FEATURE_BLOCKS = ("description", "tags", "genres", "developer", "publisher")
+
+# Two-stage ranking: candidates come from the neighbours of this many of the user's most
+# played games, this many neighbours each
+CANDIDATE_SEED_GAMES = 5
+CANDIDATE_NEIGHBOURS = 50
+# Catalog size from which the deployment ranks in two stages when CANDIDATE_BUDGET is set. On
+# synthetic catalogs (python -m benchmarks.candidates) budgets of 500-1000 kept 98-100% of the
+# exhaustive top 10 at every size, but were no faster up to ~15k games; at ~44k games they cut
+# the p50 from 12-15 ms to 3-9 ms. Budgets of 200 kept under 60% of it even on 700 games.
+CANDIDATE_MIN_GAMES = 20000
+
+# Above this many samples the O(n^3) direct dual solve loses to conjugate gradients
+DIRECT_SOLVE_MAX_SAMPLES = 128
+
+def recommender_settings() -> Dict[str, Any]:
+    """
+    Recommender keyword arguments of the deployment, read from the environment.
+
+    Shared by the API, the offline jobs and the worker processes, so they all rank the same way.
+    """
+    return {
+        "index_dir": os.getenv("INDEX_DIR", "index"),
+        "embedding_dim": int(os.getenv("EMBEDDING_DIM", "0")) or None,
+        "fit_workers": int(os.getenv("FIT_WORKERS", "0")) or None,
+        "candidate_budget": int(os.getenv("CANDIDATE_BUDGET", "0")) or None,
+        "candidate_min_games": int(os.getenv("CANDIDATE_MIN_GAMES", str(CANDIDATE_MIN_GAMES))),
+    }
+
+def ridge_fit(X, targets: np.ndarray, alpha: float = 1.0) -> Tuple[np.ndarray, float]:
+    """
+    Fit a Ridge(alpha) regression with an unpenalized intercept in closed form.
+
+    A user owns a few hundred games while the feature space has thousands of columns,
+    so the dual problem (K + alpha * I) a = y over the n x n centered Gram matrix K of
+    the rows is solved instead of the primal one: directly for small n, and with
+    matrix-free conjugate gradients for large libraries. When there are more rows than
+    features, as in the dense embedding space, the primal system is solved. The result matches
+    sklearn.linear_model.Ridge(alpha=alpha).
+
+    Args:
+        X: Feature rows of the user's games (sparse or dense)
+        targets: Target score for each row
+        alpha: L2 regularization strength
+
+    Returns:
+        Tuple of the coefficient vector and the intercept
+    """
+    # The catalog is stored in float32; the few training rows are solved in double precision
+    X = X.astype(np.float64) if hasattr(X, "tocsr") else np.asarray(X, dtype=np.float64)
+    n_samples = X.shape[0]
+    x_mean = np.asarray(X.mean(axis=0)).ravel()
+    y_mean = targets.mean()
+    X_T = X.T.tocsr() if hasattr(X, "tocsr") else X.T
+
+    if n_samples > X.shape[1]:
+        # More samples than features (embedding mode): the primal system is the small one
+        gram = X_T @ X
+        gram = gram.toarray() if hasattr(gram, "toarray") else np.asarray(gram, dtype=np.float64)
+        centered_gram = gram - n_samples * np.outer(x_mean, x_mean)
+        centered_gram[np.diag_indices_from(centered_gram)] += alpha
+        coef = solve(centered_gram, np.asarray(X_T @ (targets - y_mean), dtype=np.float64).ravel(), assume_a="pos")
+        return coef, float(y_mean - x_mean @ coef)
+
+    if n_samples <= DIRECT_SOLVE_MAX_SAMPLES:
+        # Gram matrix of the centered rows, without densifying X
+        gram = X @ X_T
+        gram = gram.toarray() if hasattr(gram, "toarray") else np.asarray(gram)
+        row_dot_mean = X @ x_mean
+        centered_gram = gram - row_dot_mean[:, None] - row_dot_mean[None, :] + x_mean @ x_mean
+        centered_gram[np.diag_indices_from(centered_gram)] += alpha
+        dual_coef = solve(centered_gram, targets - y_mean, assume_a="pos")
+    else:
+        def matvec(v):
+            # (Xc Xc^T + alpha * I) v with Xc = X - x_mean, never materializing Xc
+            u = X_T @ v - x_mean * v.sum()
+            return X @ u - x_mean @ u + alpha * v
+
+        system = LinearOperator((n_samples, n_samples), matvec=matvec, dtype=np.float64)
+        dual_coef, _ = cg(system, targets - y_mean, rtol=1e-8, maxiter=10 * n_samples)
+
+    coef = np.asarray(X_T @ dual_coef).ravel() - x_mean * dual_coef.sum()
+    intercept = y_mean - x_mean @ coef
+    return coef, float(intercept)
+
+def _encode_categories(values: List[str], names: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """Map values to integer codes, extending a copy of the known names with unseen values."""
+    names = list(names)
+    codes_by_name = {name: code for code, name in enumerate(names)}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        code = codes_by_name.get(value)
+        if code is None:
+            code = codes_by_name[value] = len(names)
+            names.append(value)
+        codes[i] = code
+    return codes, names
+
+def _encode_genre_sets(genres: List[str], names: List[str]) -> Tuple[csr_matrix, List[str]]:
+    """Binary game x genre-token matrix for space-joined genre strings, extending the known tokens."""
+    tokens = [genre_string.split() for genre_string in genres]
+    codes, names = _encode_categories([token for game_tokens in tokens for token in game_tokens], names)
+    indptr = np.zeros(len(tokens) + 1, dtype=np.int32)
+    np.cumsum([len(game_tokens) for game_tokens in tokens], out=indptr[1:])
+    genre_sets = csr_matrix(
+        (np.ones(len(codes), dtype=np.float32), codes, indptr), shape=(len(tokens), len(names))
+    )
+    genre_sets.sum_duplicates()
+    genre_sets.data[:] = 1.0
+    return genre_sets, names
+
+class CatalogIndex:
+    def __init__(self, vectorizers: Dict[str, Any], appids: np.ndarray, content_hashes: np.ndarray,
+                 review_scores: np.ndarray, popularity_scores: np.ndarray, developer_codes: np.ndarray,
+                 developer_names: List[str], genre_sets: csr_matrix, genre_names: List[str], feature_matrix,
+                 embeddings: Optional[np.ndarray] = None):
+        """
+        Fitted catalog snapshot read by Recommender.rank.
+
+        Games are stored column-wise in compact NumPy arrays, one row per game, with no
+        text beyond the developer and genre vocabularies. A snapshot is never mutated after
+        construction. Refreshes build a new one and swap it in with a single attribute
+        assignment, so in-flight requests keep a consistent view.
+
+        Args:
+            vectorizers: Fitted feature transformers by block name
+            appids: int32 appid of every row
+            content_hashes: Content hash of every row as 32-byte strings
+            review_scores: float32 review ratio of every row
+            popularity_scores: float32 popularity score of every row
+            developer_codes: int32 index into developer_names of every row
+            developer_names: Developer vocabulary
+            genre_sets: Binary float32 CSR game x genre-token matrix
+            genre_names: Genre-token vocabulary, one per genre_sets column
+            feature_matrix: float32 CSR feature matrix
+            embeddings: Optional dense float32 low-rank projection of feature_matrix
+        """
+        self.vectorizers = vectorizers
+        self.appids = appids
+        self.content_hashes = content_hashes
+        self.review_scores = review_scores
+        self.popularity_scores = popularity_scores
+        self.developer_codes = developer_codes
+        self.developer_names = developer_names
+        self.genre_sets = genre_sets
+        self.genre_names = genre_names
+        self.feature_matrix = feature_matrix
+        self.embeddings = embeddings
+
+        # Space the per-user models are fitted and scored in
+        self.scoring_matrix = embeddings if embeddings is not None else feature_matrix
+
+        # Sorted view of appids for searchsorted lookups
+        self._appid_order = np.argsort(self.appids, kind="stable")
+        self._sorted_appids = self.appids[self._appid_order]
+        self.genre_counts = np.asarray(self.genre_sets.sum(axis=1)).ravel()
+
+    @classmethod
+    def from_catalog(cls, vectorizers: Dict[str, Any], df: pd.DataFrame, feature_matrix,
+                     embeddings: Optional[np.ndarray] = None,
+                     base: Optional["CatalogIndex"] = None, keep: Optional[np.ndarray] = None) -> "CatalogIndex":
+        """
+        Encode catalog rows (as returned by Recommender._load_catalog) into a snapshot.
+
+        Args:
+            vectorizers: Fitted feature transformers by block name
+            df: Catalog rows to encode; the text columns are not retained
+            feature_matrix: Feature rows of df
+            embeddings: Embedding rows of df, if embeddings are enabled
+            base: Existing snapshot whose rows keep are placed before df's rows
+            keep: Rows of base to carry over (all by default)
+        """
+        developer_codes, developer_names = _encode_categories(
+            df["developer"].tolist(), base.developer_names if base is not None else []
+        )
+        genre_sets, genre_names = _encode_genre_sets(
+            df["genres"].tolist(), base.genre_names if base is not None else []
+        )
+        columns = {
+            "appids": df["appid"].to_numpy(dtype=np.int32),
+            "content_hashes": df["content_hash"].fillna("").to_numpy(dtype="S32"),
+            "review_scores": df["review_ratio"].to_numpy(dtype=np.float32),
+            "popularity_scores": df["popularity_score"].to_numpy(dtype=np.float32),
+            "developer_codes": developer_codes,
+        }
+        feature_matrix = csr_matrix(feature_matrix, dtype=np.float32)
+
+        if base is not None:
+            keep = np.arange(len(base)) if keep is None else keep
+            for name in columns:
+                columns[name] = np.concatenate([getattr(base, name)[keep], columns[name]])
+            base_genres = base.genre_sets[keep]
+            base_genres.resize(len(keep), len(genre_names))
+            genre_sets = vstack([base_genres, genre_sets], format="csr")
+            feature_matrix = vstack([base.feature_matrix[keep], feature_matrix], format="csr")
+            if embeddings is not None:
+                embeddings = np.vstack([base.embeddings[keep], embeddings])
+
+        if embeddings is not None:
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        return cls(vectorizers, genre_sets=genre_sets, genre_names=genre_names, developer_names=developer_names,
+                   feature_matrix=feature_matrix, embeddings=embeddings, **columns)
+
+    def with_scores(self, review_scores: np.ndarray, popularity_scores: np.ndarray) -> "CatalogIndex":
+        """Copy of the snapshot with new review and popularity scores."""
+        return CatalogIndex(
+            self.vectorizers, self.appids, self.content_hashes,
+            np.asarray(review_scores, dtype=np.float32), np.asarray(popularity_scores, dtype=np.float32),
+            self.developer_codes, self.developer_names, self.genre_sets, self.genre_names,
+            self.feature_matrix, self.embeddings
+        )
+
+    def take(self, rows: np.ndarray) -> "CatalogIndex":
+        """Copy of the snapshot restricted to the given rows, in that order."""
+        return CatalogIndex(
+            self.vectorizers, self.appids[rows], self.content_hashes[rows], self.review_scores[rows],
+            self.popularity_scores[rows], self.developer_codes[rows], self.developer_names,
+            self.genre_sets[rows], self.genre_names, self.feature_matrix[rows],
+            self.embeddings[rows] if self.embeddings is not None else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.appids)
+
+    def block_columns(self, name: str) -> slice:
+        """Columns of one feature block (see FEATURE_BLOCKS) in feature_matrix."""
+        start = 0
+        for block in FEATURE_BLOCKS:
+            vectorizer = self.vectorizers[block]
+            width = len(vectorizer.vocabulary_) if hasattr(vectorizer, "vocabulary_") else len(vectorizer.categories_[0])
+            if block == name:
+                return slice(start, start + width)
+            start += width
+        raise KeyError(name)
+
+    def lookup(self, appids: np.ndarray) -> np.ndarray:
+        """Map appids to catalog row indices, with -1 for games not in the catalog."""
+        if len(self._sorted_appids) == 0 or len(appids) == 0:
+            return np.full(len(appids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_appids, appids), len(self._sorted_appids) - 1)
+        found = self._sorted_appids[positions] == appids
+        return np.where(found, self._appid_order[positions], -1)
+
 class Recommender:
     def __init__(self, db: Session, min_reviews: int = 100, review_weight: float = 0.3, 
-                 popularity_weight: float = 0.6, diversity_weight: float = 0.1):
+                 popularity_weight: float = 0.6, diversity_weight: float = 0.1,
+                 index_dir: Optional[str] = None, embedding_dim: Optional[int] = None,
+                 fit_workers: Optional[int] = None, candidate_budget: Optional[int] = None,
+                 candidate_min_games: int = 0):
         """
         Initialize the recommender system.
         
@@ -19,185 +287,647 @@ class Recommender:
             review_weight: Weight given to review ratio in final score (0-1)
             popularity_weight: Weight given to popularity (total reviews) in final score (0-1)
             diversity_weight: Weight given to diversity penalty in final score (0-1)
+            index_dir: Directory of prebuilt index artifacts. When set, a matching artifact is
+                loaded instead of refitting, and a fresh one is written after any refit.
+            embedding_dim: If set, project feature_matrix to this many dense float32 dimensions
+                with TruncatedSVD and fit and score user models in that space
+            fit_workers: Processes that count the description vocabulary when fitting;
+                defaults to the number of CPUs
+            candidate_budget: If set, rank in two stages: pick at most this many candidate games
+                per user from genre/tag shortlists and neighbours of their most played games,
+                and score only those. None or 0 scores every game
+            candidate_min_games: Score every game regardless of candidate_budget while the catalog
+                has fewer games than this; on small catalogs the first stage costs what it saves
         """
         print("Initializing recommender")
-        self.db = db
         self.min_reviews = min_reviews
         self.review_weight = review_weight
         self.popularity_weight = popularity_weight
         self.diversity_weight = diversity_weight
+        self.index_dir = index_dir
+        self.embedding_dim = embedding_dim
+        self.fit_workers = fit_workers
+        self.candidate_budget = candidate_budget
+        self.candidate_min_games = candidate_min_games
+        # Seconds per feature block of the last fit; empty when the index was restored
+        self.build_timings: Dict[str, float] = {}
+        self._refresh_lock = threading.Lock()
+        self._similarity: Optional[Tuple[CatalogIndex, SimilarityIndex]] = None
+        self._similarity_lock = threading.Lock()
+        self._candidates: Optional[Tuple[CatalogIndex, CandidateGenerator]] = None
+        self._candidates_lock = threading.Lock()
+        # Snapshot saved to or loaded from index_dir, with its version directory
+        self._artifact: Optional[Tuple[CatalogIndex, str]] = None
+
+        # Serialized response cards for every recommendable game
+        self.cards = GameCardStore()
+        self.cards.load(db, min_reviews)
+
+        # Identifies the games the current snapshot was fitted on
+        self.checksum = games_checksum(db, min_reviews, embedding_dim)
+        saved = load_index(index_dir, self.checksum) if index_dir else None
+
+        start = time.perf_counter()
+        if saved is not None:
+            print(f"Loaded recommender index {self.checksum[:16]} from {index_dir}")
+            self.index = self._restore(saved)
+            self._artifact = (self.index, saved["path"])
+            metrics.observe("recommender_fit_seconds", time.perf_counter() - start, mode="restore")
+        else:
+            self.index = self._fit(db)
+            metrics.observe("recommender_fit_seconds", time.perf_counter() - start, mode="fit")
+            self._save()
+        self._publish_catalog_metrics()
+
+    def _load_catalog(self, db: Session, appids: Optional[List[int]] = None) -> pd.DataFrame:
+        """Read the columns the features are built from for all qualifying games, or only appids."""
+        # Column-only query: no ORM instances, screenshots or unused text are loaded
+        query = (
+            select(
+                Game.appid, GameSyncState.content_hash, Game.detailed_description, Game.short_description,
+                Game.tags, Game.genres, Game.developer, Game.publisher, Game.review_ratio, Game.popularity_score
+            )
+            .outerjoin(GameSyncState, GameSyncState.appid == Game.appid)
+            .where(Game.total_reviews >= self.min_reviews)
+        )
+        if appids is not None:
+            query = query.where(Game.appid.in_(appids))
+
+        records = []
+        for row in db.execute(query).yield_per(5000):
+            record = {
+                'appid': row.appid,
+                'content_hash': row.content_hash,
+                'description': strip_html(row.detailed_description or row.short_description or ''),
+                'tags': ' '.join(row.tags) if row.tags else '',
+                'genres': ' '.join(row.genres) if row.genres else '',
+                'developer': ' '.join(row.developer) if row.developer else 'Unknown',
+                'publisher': ' '.join(row.publisher) if row.publisher else 'Unknown',
+                'review_ratio': row.review_ratio,
+                'popularity_score': row.popularity_score
+            }
+            if record['content_hash'] is None:
+                # Games loaded without load_games.py have no sync hash; hash what their features are built from
+                record['content_hash'] = hashlib.md5(
+                    json.dumps([record[block] for block in FEATURE_BLOCKS]).encode()
+                ).hexdigest()
+            records.append(record)
+        return pd.DataFrame(records, columns=CATALOG_COLUMNS)
+
+    def _fit(self, db: Session) -> CatalogIndex:
+        """Load the qualifying games and fit all feature transformers, recording build_timings per block."""
+        timings = {}
+        start = time.perf_counter()
+        df = self._load_catalog(db)
+        timings["load"] = time.perf_counter() - start
         
-        # Get all games that meet minimum review threshold
-        self.games = db.query(Game).filter(Game.total_reviews >= min_reviews).all()
-        
-        # Convert to DataFrame for easier processing
-        self.df = pd.DataFrame([{
-            'appid': g.appid,
-            'name': g.name,
-            'description': g.detailed_description or g.short_description or '',
-            'tags': ' '.join(g.tags) if g.tags else '',
-            'genres': ' '.join(g.genres) if g.genres else '',
-            'developer': ' '.join(g.developer) if g.developer else 'Unknown',
-            'publisher': ' '.join(g.publisher) if g.publisher else 'Unknown',
-            'review_ratio': g.review_ratio,
-            'popularity_score': g.popularity_score
-        } for g in self.games])
-        
-        # Create feature transformers
-        self.description_vectorizer = TfidfVectorizer(max_features=5000, stop_words='english')
-        self.tags_vectorizer = TfidfVectorizer(max_features=1000)
-        self.genres_vectorizer = TfidfVectorizer(max_features=100)
-        self.developer_encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=True)
-        self.publisher_encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=True)
-        
-        # Fit transformers
-        self.description_matrix = self.description_vectorizer.fit_transform(self.df["description"])
-        self.tags_matrix = self.tags_vectorizer.fit_transform(self.df["tags"])
-        self.genres_matrix = self.genres_vectorizer.fit_transform(self.df["genres"])
-        self.developer_matrix = self.developer_encoder.fit_transform(self.df[["developer"]])
-        self.publisher_matrix = self.publisher_encoder.fit_transform(self.df[["publisher"]])
-        
-        # Combine all feature matrices
-        from scipy.sparse import hstack
-        self.feature_matrix = hstack([
-            self.description_matrix,
-            self.tags_matrix,
-            self.genres_matrix,
-            self.developer_matrix,
-            self.publisher_matrix
-        ])
-
-    def recommend(self, user_games: List[Dict[str, Any]], top_n: int = 10, user_preferences: Dict[str, str] = None) -> List[Dict[str, Any]]:
-        if not user_games:
-            return []
+        # Create feature transformers; float32 output halves the size of the feature matrix
+        vectorizers = {
+            "description": TfidfVectorizer(max_features=5000, stop_words='english', dtype=np.float32),
+            "tags": TfidfVectorizer(max_features=1000, dtype=np.float32),
+            "genres": TfidfVectorizer(max_features=100, dtype=np.float32),
+            "developer": OneHotEncoder(handle_unknown='ignore', sparse_output=True, dtype=np.float32),
+            "publisher": OneHotEncoder(handle_unknown='ignore', sparse_output=True, dtype=np.float32),
+        }
+
+        def fit_block(name: str):
+            block_start = time.perf_counter()
+            if name == "description":
+                # The largest block: vocabulary counting is split across worker processes
+                block = fit_transform_chunked(vectorizers[name], df[name].tolist(), n_jobs=self.fit_workers)
+            elif name in ("developer", "publisher"):
+                block = vectorizers[name].fit_transform(df[[name]])
+            else:
+                block = vectorizers[name].fit_transform(df[name])
+            return block, time.perf_counter() - block_start
+
+        # Fit the five transformers concurrently and combine the blocks into one CSR matrix;
+        # the blocks are not kept
+        with ThreadPoolExecutor(max_workers=len(vectorizers)) as pool:
+            fitted = dict(zip(vectorizers, pool.map(fit_block, vectorizers)))
+        for name, (_, elapsed) in fitted.items():
+            timings[name] = elapsed
+        start = time.perf_counter()
+        feature_matrix = hstack([fitted.pop(name)[0] for name in vectorizers], format="csr", dtype=np.float32)
+        timings["hstack"] = time.perf_counter() - start
+        for name in ("description", "tags", "genres"):
+            # Terms cut by max_features are kept only for introspection (older scikit-learn);
+            # on large catalogs they outweigh the vocabulary itself
+            if hasattr(vectorizers[name], "stop_words_"):
+                del vectorizers[name].stop_words_
+
+        embeddings = None
+        if self.embedding_dim:
+            # Dense, contiguous low-rank projection of the feature space
+            start = time.perf_counter()
+            svd = TruncatedSVD(n_components=self.embedding_dim, random_state=0)
+            embeddings = svd.fit_transform(feature_matrix)
+            vectorizers["svd"] = svd
+            timings["svd"] = time.perf_counter() - start
+            print(f"Embedded {feature_matrix.shape[1]} features into {self.embedding_dim} dimensions "
+                  f"({svd.explained_variance_ratio_.sum():.1%} of variance)")
+
+        start = time.perf_counter()
+        index = CatalogIndex.from_catalog(vectorizers, df, feature_matrix, embeddings)
+        timings["index"] = time.perf_counter() - start
+
+        self.build_timings = timings
+        for block, elapsed in timings.items():
+            metrics.observe("recommender_build_seconds", elapsed, block=block)
+        # Blocks are fitted concurrently, so their times overlap
+        print(f"Built features for {len(df)} games: "
+              + ", ".join(f"{block} {elapsed:.2f}s" for block, elapsed in timings.items()))
+        return index
+
+    def _transform(self, vectorizers: Dict[str, Any], df: pd.DataFrame):
+        """Featurize games with already-fitted transformers, in feature_matrix column layout."""
+        return hstack([
+            vectorizers["description"].transform(df["description"]),
+            vectorizers["tags"].transform(df["tags"]),
+            vectorizers["genres"].transform(df["genres"]),
+            vectorizers["developer"].transform(df[["developer"]]),
+            vectorizers["publisher"].transform(df[["publisher"]])
+        ], format="csr", dtype=np.float32)
+
+    def refresh(self, db: Session, full: bool = False) -> Dict[str, Any]:
+        """
+        Bring the index up to date with the games table while requests keep being served.
+
+        Incremental refreshes transform only new or changed games (by content hash) with the
+        already-fitted transformers and splice them into a copy of the index; review and
+        popularity scores are re-read for every game. A full refresh refits the transformers
+        to pick up vocabulary drift. Either way the new index is swapped in atomically.
+
+        Args:
+            db: SQLAlchemy database session
+            full: Refit all transformers from scratch instead of updating incrementally
+
+        Returns:
+            Summary with the numbers of added, updated (content changed) and removed games,
+            whether anything changed, and the duration
+        """
+        with self._refresh_lock:
+            start = time.perf_counter()
+            current = self.index
+
+            if full:
+                index = self._fit(db)
+                known = dict(zip(current.appids.tolist(), current.content_hashes.tolist()))
+                fitted = dict(zip(index.appids.tolist(), index.content_hashes.tolist()))
+                removed_appids = set(known) - set(fitted)
+                added = len(set(fitted) - set(known))
+                updated = sum(1 for appid, content_hash in fitted.items()
+                              if appid in known and known[appid] != content_hash)
+                changed_appids = None
+            else:
+                rows = db.execute(
+                    select(Game.appid, GameSyncState.content_hash, Game.review_ratio, Game.popularity_score)
+                    .outerjoin(GameSyncState, GameSyncState.appid == Game.appid)
+                    .where(Game.total_reviews >= self.min_reviews)
+                ).all()
+                latest = {row.appid: row for row in rows}
+                known = dict(zip(current.appids.tolist(), current.content_hashes.tolist()))
+                # Games without a sync hash are compared by the hash _load_catalog derives for them
+                hashes = {appid: row.content_hash for appid, row in latest.items()}
+                unhashed = [appid for appid, content_hash in hashes.items() if content_hash is None]
+                if unhashed:
+                    derived = self._load_catalog(db, unhashed)
+                    hashes.update(zip(derived["appid"].tolist(), derived["content_hash"].tolist()))
+
+                removed_appids = set(known) - set(latest)
+                changed_appids = [appid for appid, content_hash in hashes.items()
+                                  if appid not in known or known[appid] != (content_hash or "").encode()]
+                added = sum(1 for appid in changed_appids if appid not in known)
+                updated = len(changed_appids) - added
+
+                if not changed_appids and not removed_appids:
+                    index = current
+                else:
+                    # Keep untouched rows, append freshly transformed ones
+                    dropped = removed_appids.union(changed_appids)
+                    keep = np.flatnonzero(~np.isin(current.appids, np.fromiter(dropped, dtype=np.int64)))
+                    if not changed_appids:
+                        # Only removals: the transformers reject an empty batch
+                        index = current.take(keep)
+                    else:
+                        changed = self._load_catalog(db, changed_appids)
+                        changed_matrix = self._transform(current.vectorizers, changed)
+                        changed_embeddings = None
+                        if current.embeddings is not None:
+                            changed_embeddings = current.vectorizers["svd"].transform(changed_matrix)
+                        index = CatalogIndex.from_catalog(
+                            current.vectorizers, changed, changed_matrix, changed_embeddings, base=current, keep=keep
+                        )
 
+                # Popularity moves for every game when max(total_reviews) changes
+                appids = index.appids.tolist()
+                review_ratio = np.array([latest[appid].review_ratio for appid in appids], dtype=np.float32)
+                popularity_score = np.array([latest[appid].popularity_score for appid in appids], dtype=np.float32)
+                if index is current:
+                    if (np.array_equal(review_ratio, current.review_scores)
+                            and np.array_equal(popularity_score, current.popularity_scores)):
+                        return self._refresh_summary("incremental", start, 0, 0, 0, changed=False)
+                index = index.with_scores(review_ratio, popularity_score)
+
+            if full:
+                self.cards.load(db, self.min_reviews)
+            else:
+                self.cards.load(db, self.min_reviews, changed_appids)
+                self.cards.discard(removed_appids)
+            checksum = games_checksum(db, self.min_reviews, self.embedding_dim)
+            self.index = index
+            self.checksum = checksum
+            self._publish_catalog_metrics()
+            self._save(replace=full)
+
+            return self._refresh_summary("full" if full else "incremental", start,
+                                         added, updated, len(removed_appids), changed=True)
+
+    def _refresh_summary(self, mode: str, start: float, added: int, updated: int, removed: int,
+                         changed: bool) -> Dict[str, Any]:
+        duration = time.perf_counter() - start
+        metrics.observe("recommender_fit_seconds", duration, mode=f"refresh_{mode}")
+        print(f"Refreshed recommender index ({mode}): {added} added, {updated} updated, "
+              f"{removed} removed in {duration:.2f}s")
+        return {
+            "mode": mode,
+            "changed": changed,
+            "games": len(self.index),
+            "added": added,
+            "updated": updated,
+            "removed": removed,
+            "duration_ms": round(duration * 1000, 1),
+        }
+
+    def _publish_catalog_metrics(self):
+        metrics.set_gauge("recommender_catalog_games", len(self.index))
+        metrics.set_gauge("recommender_catalog_features", self.index.scoring_matrix.shape[1])
+
+    def _save(self, replace: bool = False):
+        """Persist the current index so restarted workers can warm-start from it."""
+        if not self.index_dir:
+            return
+        index = self.index
+        path = save_index(self.index_dir, self.checksum, self._export(index), replace=replace)
+        self._artifact = (index, path)
+        print(f"Saved recommender index to {path}")
+
+    def _export(self, index: CatalogIndex) -> Dict[str, Any]:
+        """Collect the fitted state in the layout expected by index_store.save_index."""
+        return {
+            "vectorizers": index.vectorizers,
+            "feature_matrix": index.feature_matrix,
+            "genre_sets": index.genre_sets,
+            "appids": index.appids,
+            "content_hashes": index.content_hashes,
+            "review_ratio": index.review_scores,
+            "popularity_score": index.popularity_scores,
+            "developer_codes": index.developer_codes,
+            "embeddings": index.embeddings,
+            "vocabularies": {"developers": index.developer_names, "genres": index.genre_names},
+        }
+
+    def _restore(self, saved: Dict[str, Any]) -> CatalogIndex:
+        """Restore the fitted state from an index loaded by index_store.load_index."""
+        return CatalogIndex(
+            saved["vectorizers"], saved["appids"], saved["content_hashes"], saved["review_ratio"],
+            saved["popularity_score"], saved["developer_codes"], saved["vocabularies"]["developers"],
+            saved["genre_sets"], saved["vocabularies"]["genres"], saved["feature_matrix"], saved.get("embeddings")
+        )
+
+    def similarity_index(self, index: Optional[CatalogIndex] = None) -> SimilarityIndex:
+        """Item-to-item similarity index of a snapshot (the current one by default), built on first use."""
+        index = self.index if index is None else index
+        similarity = self._similarity
+        if similarity is None or similarity[0] is not index:
+            with self._similarity_lock:
+                similarity = self._similarity
+                if similarity is None or similarity[0] is not index:
+                    start = time.perf_counter()
+                    similarity = (index, SimilarityIndex(index.scoring_matrix, index.appids, index.popularity_scores))
+                    self._similarity = similarity
+                    print(f"Built similarity index for {len(index)} games in {time.perf_counter() - start:.1f}s")
+        return similarity[1]
+
+    def candidate_generator(self, index: Optional[CatalogIndex] = None) -> CandidateGenerator:
+        """Genre/tag shortlists of a snapshot (the current one by default) for two-stage ranking, built on first use."""
+        index = self.index if index is None else index
+        candidates = self._candidates
+        if candidates is None or candidates[0] is not index:
+            with self._candidates_lock:
+                candidates = self._candidates
+                if candidates is None or candidates[0] is not index:
+                    start = time.perf_counter()
+                    generator = CandidateGenerator(
+                        index.genre_sets, index.feature_matrix, index.block_columns("tags"), self._base_scores(index)
+                    )
+                    candidates = (index, generator)
+                    self._candidates = candidates
+                    print(f"Built candidate shortlists for {len(index)} games in {time.perf_counter() - start:.1f}s")
+        return candidates[1]
+
+    def _base_scores(self, index: CatalogIndex) -> np.ndarray:
+        """Non-personalized review and popularity part of every game's score."""
+        return self.review_weight * index.review_scores + self.popularity_weight * index.popularity_scores
+
+    def settings(self) -> Dict[str, Any]:
+        """Constructor arguments that load an equivalent recommender from the same database and index_dir."""
+        return {
+            "min_reviews": self.min_reviews,
+            "review_weight": self.review_weight,
+            "popularity_weight": self.popularity_weight,
+            "diversity_weight": self.diversity_weight,
+            "index_dir": self.index_dir,
+            "embedding_dim": self.embedding_dim,
+            "fit_workers": self.fit_workers,
+            "candidate_budget": self.candidate_budget,
+            "candidate_min_games": self.candidate_min_games,
+        }
+
+    def ranking_structures(self) -> Optional[Dict[str, Any]]:
+        """
+        Build the lookup structures ranking uses beyond the snapshot itself, for the current snapshot.
+
+        Worker processes receive these (see adopt_ranking_structures) instead of each
+        building their own. Only the small parts are included: the similarity index's
+        lists, centroids and precomputed neighbours, and the candidate shortlists. Its
+        normalized rows are saved into the snapshot's index version for workers to
+        memory-map. None when ranking scores every game and needs none.
+        """
+        index = self.index
+        if not self._budget(index):
+            return None
+        similarity = self.similarity_index(index)
+        artifact = self._artifact
+        if artifact is not None and artifact[0] is index:
+            save_similarity_vectors(artifact[1], similarity.layout(), similarity.vectors)
+        return {
+            "appids": index.appids,
+            "content_hashes": index.content_hashes,
+            "review_scores": index.review_scores,
+            "popularity_scores": index.popularity_scores,
+            "similarity": similarity.state(),
+            "candidates": self.candidate_generator(index).state(),
+        }
+
+    def adopt_ranking_structures(self, structures: Dict[str, Any]) -> bool:
+        """
+        Use lookup structures built by another process from the same snapshot.
+
+        The similarity index's normalized rows are memory-mapped from the index version
+        when the other process saved them there, and normalized again otherwise.
+
+        Returns:
+            Whether they were adopted; structures of a different snapshot are ignored and
+            the recommender builds its own on first use
+        """
+        index = self.index
+        if not (np.array_equal(index.appids, structures["appids"])
+                and np.array_equal(index.content_hashes, structures["content_hashes"])
+                and np.array_equal(index.review_scores, structures["review_scores"])
+                and np.array_equal(index.popularity_scores, structures["popularity_scores"])):
+            return False
+        state = structures["similarity"]
+        artifact = self._artifact
+        vectors = None
+        if artifact is not None and artifact[0] is index:
+            vectors = load_similarity_vectors(artifact[1], state["layout"])
+        similarity = SimilarityIndex.from_state(index.scoring_matrix, index.appids, state, vectors)
+        candidates = CandidateGenerator.from_state(
+            index.genre_sets, index.feature_matrix, index.block_columns("tags"), self._base_scores(index),
+            structures["candidates"]
+        )
+        with self._similarity_lock:
+            self._similarity = (index, similarity)
+        with self._candidates_lock:
+            self._candidates = (index, candidates)
+        return True
+
+    def _budget(self, index: CatalogIndex, candidate_budget: Optional[int] = None) -> int:
+        """
+        Candidates per user when ranking on index; 0 scores every game.
+        An explicit candidate_budget is used regardless of candidate_min_games.
+        """
+        if candidate_budget is None:
+            if len(index) < self.candidate_min_games:
+                return 0
+            candidate_budget = self.candidate_budget
+        return candidate_budget if candidate_budget and candidate_budget < len(index) else 0
+
+    def _candidate_rows(self, index: CatalogIndex, profile: Dict[str, Any], budget: int) -> np.ndarray:
+        """Stage one of two-stage ranking: the rows worth scoring for one user."""
+        similarity = self.similarity_index(index)
+        seeds = profile["user_game_idxs"][np.argsort(-profile["playtimes"], kind="stable")[:CANDIDATE_SEED_GAMES]]
+        neighbours = [similarity.neighbours(int(seed), CANDIDATE_NEIGHBOURS)[0] for seed in seeds]
+        return self.candidate_generator(index).generate(
+            seeds, np.concatenate(neighbours), profile["excluded_idxs"], budget
+        )
+
+    def similar(self, appid: int, top_n: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """Return the top N games most similar to appid as (appid, cosine similarity) pairs, or None if unknown."""
+        return self.similarity_index().similar(appid, top_n)
+
+    def recommend(self, user_games: List[Dict[str, Any]], top_n: int = 10, user_preferences: Dict[int, str] = None) -> List[Dict[str, Any]]:
+        """Return the top N recommendations as response dicts."""
+        return self.cards.to_dicts(self.rank(user_games, top_n, user_preferences))
+
+    def rank(self, user_games: List[Dict[str, Any]], top_n: int = 10, user_preferences: Dict[int, str] = None) -> List[Tuple[int, float]]:
+        """Return the top N recommendations as (appid, recommendation score) pairs, best first."""
+        return self.rank_batch({None: (user_games, user_preferences)}, top_n)[None]
+
+    def _profile(self, index: CatalogIndex, user_games: List[Dict[str, Any]],
+                 user_preferences: Optional[Dict[int, str]]) -> Optional[Dict[str, Any]]:
+        """Build one user's training rows, targets and exclusions; None if none of their games are in the catalog."""
         # Build user profile
         user_game_ids = {int(g["appid"]): float(g["playtime_forever"]) for g in user_games}
+        owned_appids = np.fromiter(user_game_ids.keys(), dtype=np.int64, count=len(user_game_ids))
+        owned_playtimes = np.fromiter(user_game_ids.values(), dtype=np.float64, count=len(user_game_ids))
+
+        user_preferences = user_preferences or {}
+        pref_appids = np.fromiter(user_preferences.keys(), dtype=np.int64, count=len(user_preferences))
+        pref_liked = np.array([status == "liked" for status in user_preferences.values()], dtype=bool)
+        pref_disliked = np.array([status == "disliked" for status in user_preferences.values()], dtype=bool)
         
-        # Track all games the user has interacted with (owned, liked, or disliked)
-        interacted_games = set(user_game_ids.keys())
-        if user_preferences:
-            interacted_games.update(int(appid) for appid in user_preferences.keys())
-        
-        # Find indices of user's games that exist in our filtered dataset
-        user_game_mask = self.df["appid"].isin(user_game_ids)
-        user_game_idxs = self.df[user_game_mask].index.tolist()
+        # Find indices of user's games that exist in our filtered dataset (in catalog order)
+        owned_idxs = index.lookup(owned_appids)
+        in_catalog = owned_idxs >= 0
+        order = np.argsort(owned_idxs[in_catalog])
+        user_game_idxs = owned_idxs[in_catalog][order]
         
-        if not user_game_idxs:
-            return []
+        if len(user_game_idxs) == 0:
+            return None
+
+        pref_idxs = index.lookup(pref_appids)
+        liked_idxs = pref_idxs[pref_liked & (pref_idxs >= 0)]
+        disliked_idxs = pref_idxs[pref_disliked & (pref_idxs >= 0)]
 
         # Get user's preferred developers and genres from liked games
-        liked_game_idxs = []
-        if user_preferences:
-            liked_game_idxs = [idx for idx in user_game_idxs 
-                             if str(self.df.loc[idx, "appid"]) in user_preferences 
-                             and user_preferences[str(self.df.loc[idx, "appid"])] == "liked"]
+        liked_game_idxs = user_game_idxs[np.isin(user_game_idxs, liked_idxs)]
+        user_developers = np.unique(index.developer_codes[user_game_idxs])
+        user_genres = np.zeros(index.genre_sets.shape[1])
+        if len(liked_game_idxs):
+            user_genres = (np.asarray(index.genre_sets[liked_game_idxs].sum(axis=0)).ravel() > 0).astype(np.float64)
         
-        user_developers = set(self.df.loc[user_game_idxs, "developer"].unique())
-        user_genres = set()
-        if liked_game_idxs:
-            user_genres = set(' '.join(self.df.loc[liked_game_idxs, "genres"].values).split())
-        
-        # Normalize playtimes with stronger preference weights
-        playtimes = []
-        for idx in user_game_idxs:
-            appid = int(self.df.loc[idx, "appid"])
-            if appid in user_game_ids:
-                playtime = min(user_game_ids[appid] / 6000, 1.0)  # 100h = 6000min
-                # Adjust playtime based on user preference if it exists
-                if user_preferences and str(appid) in user_preferences:
-                    if user_preferences[str(appid)] == "disliked":
-                        playtime *= 0.05  # Stronger reduction for disliked games
-                    elif user_preferences[str(appid)] == "liked":
-                        playtime *= 2.0  # Stronger boost for liked games
-                playtimes.append(playtime)
-            else:
-                playtimes.append(0.0)
-        
-        playtimes = np.array(playtimes)
-        X_train = self.feature_matrix[user_game_idxs]
-        y_train = playtimes
-
-        # Train regression model
-        model = Ridge(alpha=1.0)
-        model.fit(X_train, y_train)
-
-        # Predict content-based scores
-        # Exclude all interacted games (owned, liked, or disliked)
-        unseen_mask = ~self.df["appid"].isin(interacted_games)
-        unseen_idxs = self.df[unseen_mask].index.tolist()
-        
-        if not unseen_idxs:
+        # Normalize playtimes (100h = 6000min) with stronger preference weights
+        playtimes = np.minimum(owned_playtimes[in_catalog][order] / 6000, 1.0)
+        playtimes[np.isin(user_game_idxs, disliked_idxs)] *= 0.05  # Stronger reduction for disliked games
+        playtimes[np.isin(user_game_idxs, liked_idxs)] *= 2.0  # Stronger boost for liked games
+
+        # All interacted games (owned, liked, or disliked) are excluded from the results
+        interacted_idxs = np.concatenate([owned_idxs, pref_idxs])
+        return {
+            "user_game_idxs": user_game_idxs,
+            "playtimes": playtimes,
+            "excluded_idxs": interacted_idxs[interacted_idxs >= 0],
+            "developers": user_developers,
+            "genres": user_genres,
+        }
+
+    def rank_batch(self, users: Dict[Any, Tuple[List[Dict[str, Any]], Optional[Dict[int, str]]]],
+                   top_n: int = 10, candidate_budget: Optional[int] = None) -> Dict[Any, List[Tuple[int, float]]]:
+        """
+        Rank recommendations for many users at once.
+
+        Catalog-wide work is shared by the batch: the review and popularity terms are
+        computed once, and content and genre scores for all users come from one sparse
+        product each against the stacked per-user model and genre vectors.
+
+        With a candidate budget, each user's games are instead scored only on the candidates
+        from _candidate_rows, and their 1-100 scores are normalized over those candidates.
+
+        Args:
+            users: Maps any user key to (owned games, preferences) as taken by rank()
+            top_n: Number of recommendations per user
+            candidate_budget: Overrides the recommender's candidate_budget and candidate_min_games;
+                0 scores every game
+
+        Returns:
+            Maps each user key to its (appid, recommendation score) pairs, best first
+        """
+        # Read the index once so a concurrent refresh cannot mix two snapshots
+        index = self.index
+        results = {key: [] for key in users}
+        budget = self._budget(index, candidate_budget)
+        two_stage = budget > 0
+
+        with metrics.timer("recommender_stage_seconds", stage="profile"):
+            profiles = {}
+            for key, (user_games, user_preferences) in users.items():
+                metrics.observe("recommender_user_library_games", len(user_games or []))
+                if user_games:
+                    profile = self._profile(index, user_games, user_preferences)
+                    if profile is not None:
+                        profiles[key] = profile
+        if not profiles:
+            return results
+
+        # Train one regression model per user and stack their coefficients
+        with metrics.timer("recommender_stage_seconds", stage="ridge_fit"):
+            scoring_matrix = index.scoring_matrix
+            coefs = np.empty((scoring_matrix.shape[1], len(profiles)), dtype=scoring_matrix.dtype)
+            intercepts = np.empty(len(profiles))
+            for column, profile in enumerate(profiles.values()):
+                coef, intercepts[column] = ridge_fit(scoring_matrix[profile["user_game_idxs"]], profile["playtimes"])
+                coefs[:, column] = coef
+
+        content_weight = 1 - self.review_weight - self.popularity_weight - self.diversity_weight
+        if two_stage:
+            with metrics.timer("recommender_stage_seconds", stage="candidates"):
+                candidates = [self._candidate_rows(index, profile, budget) for profile in profiles.values()]
+
+            with metrics.timer("recommender_stage_seconds", stage="score"):
+                scored = []
+                for column, (rows, profile) in enumerate(zip(candidates, profiles.values())):
+                    content_scores = np.asarray(scoring_matrix[rows] @ coefs[:, column]) + intercepts[column]
+                    base_scores = (self.review_weight * index.review_scores[rows]
+                                   + self.popularity_weight * index.popularity_scores[rows])
+                    genre_intersection = np.asarray(index.genre_sets[rows] @ profile["genres"])
+                    scored.append((content_weight * content_scores + base_scores, genre_intersection))
+
+            with metrics.timer("recommender_stage_seconds", stage="select"):
+                for (key, profile), rows, (scores, genre_intersection) in zip(profiles.items(), candidates, scored):
+                    results[key] = self._finish_user(index, profile, scores, genre_intersection, top_n, rows)
+            return results
+
+        with metrics.timer("recommender_stage_seconds", stage="score"):
+            # Predict content-based scores for the whole catalog; scoring the full matrix
+            # is cheaper than copying out the unseen rows, which are most of it
+            content_scores = np.asarray(scoring_matrix @ coefs) + intercepts
+            base_scores = self.review_weight * index.review_scores + self.popularity_weight * index.popularity_scores
+
+            # Genre overlap of every game with every user's liked genres
+            user_genres = np.column_stack([profile["genres"] for profile in profiles.values()])
+            genre_intersections = np.asarray(index.genre_sets @ user_genres)
+
+        with metrics.timer("recommender_stage_seconds", stage="select"):
+            for column, (key, profile) in enumerate(profiles.items()):
+                results[key] = self._finish_user(
+                    index, profile, content_weight * content_scores[:, column] + base_scores,
+                    genre_intersections[:, column], top_n
+                )
+
+        return results
+
+    def _finish_user(self, index: CatalogIndex, profile: Dict[str, Any], scores: np.ndarray,
+                     genre_intersection: np.ndarray, top_n: int,
+                     rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Apply one user's diversity penalty, genre boost and exclusions, and pick their top N.
+
+        scores and genre_intersection cover every game, or only the given rows.
+        """
+        if rows is None:
+            appids, developer_codes, genre_counts = index.appids, index.developer_codes, index.genre_counts
+            unseen_mask = np.ones(len(appids), dtype=bool)
+            unseen_mask[profile["excluded_idxs"]] = False
+        else:
+            appids, developer_codes, genre_counts = index.appids[rows], index.developer_codes[rows], index.genre_counts[rows]
+            unseen_mask = ~np.isin(rows, profile["excluded_idxs"])
+        n_unseen = int(unseen_mask.sum())
+        if n_unseen == 0:
             return []
-            
-        X_test = self.feature_matrix[unseen_idxs]
-        content_scores = model.predict(X_test)
-        
-        # Get review scores and popularity scores
-        review_scores = self.df.loc[unseen_idxs, 'review_ratio'].values
-        popularity_scores = self.df.loc[unseen_idxs, 'popularity_score'].values
-        
-        # Calculate diversity penalty and genre similarity
-        unseen_developers = self.df.loc[unseen_idxs, "developer"].values
-        unseen_genres = self.df.loc[unseen_idxs, "genres"].values
-        
+
         # Stronger diversity penalty for games from same developers as disliked games
-        diversity_penalty = np.array([0.7 if dev in user_developers else 0.0 for dev in unseen_developers])
+        diversity_penalty = np.where(np.isin(developer_codes, profile["developers"]), 0.7, 0.0)
         
-        # Calculate genre similarity score for games similar to liked ones
-        genre_similarity = np.zeros(len(unseen_idxs))
-        for i, genres in enumerate(unseen_genres):
-            game_genres = set(genres.split())
-            if game_genres and user_genres:
-                # Calculate Jaccard similarity between game genres and user's liked genres
-                similarity = len(game_genres.intersection(user_genres)) / len(game_genres.union(user_genres))
-                genre_similarity[i] = similarity
+        # Jaccard similarity between each game's genres and the user's liked genres
+        user_genre_count = profile["genres"].sum()
+        genre_union = genre_counts + user_genre_count - genre_intersection
+        genre_similarity = np.divide(
+            genre_intersection, genre_union,
+            out=np.zeros(len(appids)),
+            where=(genre_counts > 0) & (user_genre_count > 0)
+        )
         
         # Apply preference boost based on genre similarity
         preference_boost = 1.0 + (genre_similarity * 0.5)  # Up to 1.5x boost for very similar games
         
         # Combine scores with weighted average
-        final_scores = (
-            (1 - self.review_weight - self.popularity_weight - self.diversity_weight) * content_scores +
-            self.review_weight * review_scores +
-            self.popularity_weight * popularity_scores -
-            self.diversity_weight * diversity_penalty
-        ) * preference_boost
+        final_scores = (scores - self.diversity_weight * diversity_penalty) * preference_boost
+
+        return self._top_n(appids, final_scores, unseen_mask, min(top_n, n_unseen))
+
+    def _top_n(self, appids: np.ndarray, final_scores: np.ndarray, unseen_mask: np.ndarray,
+               top_n: int) -> List[Tuple[int, float]]:
+        """Select the best unseen games and map their scores to the 1-100 range."""
+        # Get top N unseen recommendations without sorting the whole catalog
+        candidate_scores = np.where(unseen_mask, final_scores, -np.inf)
+        top_game_idxs = np.argpartition(-candidate_scores, top_n - 1)[:top_n]
+        top_game_idxs = top_game_idxs[np.argsort(-candidate_scores[top_game_idxs], kind="stable")]
 
         # Normalize scores to 1-100 range using sigmoid function
         # This ensures scores are bounded and more stable than min-max normalization
         def sigmoid(x):
             return 1 / (1 + np.exp(-x))
         
-        # Scale scores to reasonable range before sigmoid
-        scaled_scores = (final_scores - np.mean(final_scores)) / (np.std(final_scores) + 1e-6)
+        # Scale scores to reasonable range before sigmoid, using only the unseen games
+        unseen_scores = final_scores[unseen_mask]
+        scaled_scores = (final_scores[top_game_idxs] - np.mean(unseen_scores)) / (np.std(unseen_scores) + 1e-6)
         normalized_scores = sigmoid(scaled_scores)
         # Convert to 1-100 range
         normalized_scores = 1 + (normalized_scores * 99)
 
-        # Get top N recommendations
-        top_n = min(top_n, len(final_scores))
-        top_indices = np.argsort(final_scores)[-top_n:][::-1]
-        top_game_idxs = [unseen_idxs[i] for i in top_indices]
-
-        # Get full game data from database
-        recommended_games = []
-        for idx, score in zip(top_game_idxs, normalized_scores[top_indices]):
-            appid = int(self.df.loc[idx, "appid"])
-            game = self.db.query(Game).filter(Game.appid == appid).first()
-            if game:
-                recommended_games.append({
-                    "appid": str(game.appid),
-                    "name": game.name,
-                    "releaseDate": game.release_date,
-                    "detailedDescription": game.detailed_description,
-                    "shortDescription": game.short_description,
-                    "headerImage": game.header_image,
-                    "developer": ' '.join(game.developer) if game.developer else "Unknown",
-                    "publisher": ' '.join(game.publisher) if game.publisher else "Unknown",
-                    "screenshots": game.screenshots if game.screenshots else [],
-                    "tags": game.tags if game.tags else [],
-                    "recommendationScore": round(float(score), 1)  # Round to 1 decimal place
-                })
-
-        return recommended_games
\ No newline at end of file
+        return [
+            (int(appid), float(score))
+            for appid, score in zip(appids[top_game_idxs], normalized_scores)
+        ]
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class RecommendationCache:
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0, revalidate_after: float = 300.0):
+        """
+        Bounded LRU cache of rendered /recommendations responses, keyed by steam_id.
+
+        An entry is served without any lookup for revalidate_after seconds after it was
+        stored or last checked; invalidate() drops it sooner when the user's preferences
+        change. After that it is only served while the fingerprint of the user's library
+        and preferences still matches, which catches purchases and writes made through
+        other processes. No entry is served once it is older than ttl seconds.
+
+        Args:
+            max_entries: Maximum number of cached users; least recently used are evicted
+            ttl: Maximum age of an entry in seconds
+            revalidate_after: Seconds an entry is served without comparing fingerprints
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.revalidate_after = revalidate_after
+        # steam_id -> (fingerprint, expiry, body, time after which the fingerprint must be compared)
+        self._entries: OrderedDict[str, Tuple[str, float, bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; see put()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def fingerprint(user_games: List[Dict[str, Any]], user_preferences: Dict[Any, str]) -> str:
+        """Digest of everything the ranking depends on besides the catalog itself."""
+        digest = hashlib.blake2b(digest_size=16)
+        for appid, playtime in sorted((int(g["appid"]), float(g["playtime_forever"])) for g in user_games):
+            digest.update(f"{appid}:{playtime};".encode())
+        digest.update(b"|")
+        for appid, status in sorted((int(appid), status) for appid, status in user_preferences.items()):
+            digest.update(f"{appid}:{status};".encode())
+        return digest.hexdigest()
+
+    def get(self, steam_id: str, fingerprint: Optional[str] = None) -> Optional[bytes]:
+        """
+        Return a user's cached body, or None.
+
+        Without a fingerprint, only entries within revalidate_after are served, and a miss
+        is not counted: the caller is expected to fetch the inputs and ask again with their
+        fingerprint. A matching fingerprint restarts the entry's revalidate_after window.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(steam_id)
+            if fingerprint is None:
+                if entry is None or entry[1] < now or entry[3] < now:
+                    return None
+            elif entry is None or entry[0] != fingerprint or entry[1] < now:
+                self.misses += 1
+                return None
+            else:
+                entry = self._entries[steam_id] = (entry[0], entry[1], entry[2], now + self.revalidate_after)
+            self._entries.move_to_end(steam_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, steam_id: str, fingerprint: str, body: bytes, generation: Optional[int] = None):
+        """
+        Store a user's body.
+
+        Args:
+            steam_id: User the body was ranked for
+            fingerprint: Fingerprint of the library and preferences it was ranked on
+            body: Rendered response
+            generation: The cache's generation before those inputs were read; if an
+                invalidation happened since, the entry is only served after a fingerprint check
+        """
+        now = time.monotonic()
+        with self._lock:
+            current = generation is None or generation == self.generation
+            revalidate_at = now + self.revalidate_after if current else 0.0
+            self._entries[steam_id] = (fingerprint, now + self.ttl, body, revalidate_at)
+            self._entries.move_to_end(steam_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, steam_id: str):
+        """Drop a user's entry, e.g. after one of their preferences changed."""
+        with self._lock:
+            self.generation += 1
+            if self._entries.pop(steam_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the catalog changed."""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,248 @@
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+
+class SimilarityIndex:
+    def __init__(self, matrix, appids: np.ndarray, popularity_scores: np.ndarray, n_lists: Optional[int] = None,
+                 n_probe: int = 8, n_iter: int = 10, n_precomputed: int = 2000, precomputed_k: int = 50,
+                 seed: int = 0):
+        """
+        Item-to-item cosine similarity over a catalog's feature rows.
+
+        Rows are L2-normalized and partitioned into inverted lists with spherical k-means
+        (an IVF index). A query scores only the rows of the n_probe lists whose centroids
+        are closest to it, exactly. Rows are stored grouped by list, so each probed list is
+        one contiguous slice of the matrix; no copy in catalog order is kept. The exact top
+        neighbours of the most popular games are computed up front, so the most requested
+        lookups are a single array slice.
+
+        Args:
+            matrix: Catalog feature rows, sparse or dense, in catalog order
+            appids: Appid of every row
+            popularity_scores: Used to pick the games whose neighbours are precomputed
+            n_lists: Number of inverted lists; by default about sqrt(n_games) / 2
+            n_probe: Lists scored per query; more lists raise recall and query time
+            n_iter: Number of k-means iterations
+            n_precomputed: Number of most popular games with precomputed neighbours
+            precomputed_k: Neighbours stored per precomputed game
+            seed: Seed of the k-means initialization
+        """
+        self.appids = np.asarray(appids)
+        vectors = self.normalize(matrix)
+
+        n_games = len(self.appids)
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(n_games) / 2), n_games)) if n_games else 0
+        self.n_probe = min(n_probe, self.n_lists)
+        if n_games == 0:
+            # Nothing to cluster; every lookup misses
+            centroids, labels = np.empty((0, vectors.shape[1]), dtype=np.float32), np.empty(0, dtype=np.int64)
+        else:
+            centroids, labels = self._spherical_kmeans(vectors, n_iter, np.random.default_rng(seed))
+
+        # Rows grouped by list: list i holds rows list_rows[list_bounds[i]:list_bounds[i + 1]]
+        list_rows = np.argsort(labels, kind="stable").astype(np.int32)
+        list_bounds = np.searchsorted(labels[list_rows], np.arange(self.n_lists + 1))
+        self._attach(vectors[list_rows], np.ascontiguousarray(centroids.T), list_rows, list_bounds)
+        del vectors
+
+        # Exact neighbours of the most popular games
+        self.precomputed_k = max(min(precomputed_k, n_games - 1), 0)
+        popular = np.argsort(-np.asarray(popularity_scores), kind="stable")[:n_precomputed]
+        self._precomputed_slot = np.full(n_games, -1, dtype=np.int32)
+        self._precomputed_slot[popular] = np.arange(len(popular), dtype=np.int32)
+        self._precomputed_idxs = np.empty((len(popular), self.precomputed_k), dtype=np.int32)
+        self._precomputed_scores = np.empty((len(popular), self.precomputed_k), dtype=np.float32)
+        for start in range(0, len(popular), 256):
+            rows = popular[start:start + 256]
+            block_scores = np.asarray(self.vectors @ self._dense(self._rows(rows)).T).T
+            for slot, (idx, scores) in enumerate(zip(rows, block_scores), start=start):
+                self._precomputed_idxs[slot], self._precomputed_scores[slot] = self._top_k(
+                    idx, scores, self.list_rows, self.precomputed_k
+                )
+
+    @classmethod
+    def from_state(cls, matrix, appids: np.ndarray, state: Dict[str, Any], vectors=None) -> "SimilarityIndex":
+        """
+        Rebuild an index from the state() of one built on the same rows, without clustering
+        or precomputing neighbours again.
+
+        Args:
+            matrix: Catalog feature rows the original index was built on
+            appids: Appid of every row
+            state: Output of the original's state()
+            vectors: The original's normalized rows in list order (its vectors attribute), e.g.
+                memory-mapped from index_store.load_similarity_vectors; normalized from matrix by default
+        """
+        index = cls.__new__(cls)
+        index.appids = np.asarray(appids)
+        index.n_lists = len(state["list_bounds"]) - 1
+        index.n_probe = state["n_probe"]
+        if vectors is None:
+            vectors = cls.normalize(matrix)[state["list_rows"]]
+        index._attach(vectors, state["centroids_t"], state["list_rows"], state["list_bounds"])
+        index.precomputed_k = state["precomputed_k"]
+        index._precomputed_slot = state["precomputed_slot"]
+        index._precomputed_idxs = state["precomputed_idxs"]
+        index._precomputed_scores = state["precomputed_scores"]
+        return index
+
+    def _attach(self, vectors, centroids_t: np.ndarray, list_rows: np.ndarray, list_bounds: np.ndarray):
+        """Set the normalized rows (in list order) and the inverted lists, and derive the lookup arrays."""
+        self.vectors = vectors
+        self._centroids_t = centroids_t
+        self.list_rows = list_rows
+        self.list_bounds = list_bounds
+        # Position of every catalog row in vectors
+        self._positions = np.empty(len(list_rows), dtype=np.int32)
+        self._positions[list_rows] = np.arange(len(list_rows), dtype=np.int32)
+        self._blocks = [self._list_block(i) for i in range(self.n_lists)]
+        self._appid_order = np.argsort(self.appids, kind="stable")
+        self._sorted_appids = self.appids[self._appid_order]
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Everything but the normalized rows: the centroids, the list of every row and the
+        precomputed neighbours. A small fraction of the index; see from_state.
+        """
+        return {
+            "layout": self.layout(),
+            "n_probe": self.n_probe,
+            "centroids_t": self._centroids_t,
+            "list_rows": self.list_rows,
+            "list_bounds": self.list_bounds,
+            "precomputed_k": self.precomputed_k,
+            "precomputed_slot": self._precomputed_slot,
+            "precomputed_idxs": self._precomputed_idxs,
+            "precomputed_scores": self._precomputed_scores,
+        }
+
+    def layout(self) -> str:
+        """Digest of the order of the rows in vectors; saved vectors fit any index with the same layout and rows."""
+        return hashlib.blake2b(np.ascontiguousarray(self.list_rows).tobytes(), digest_size=8).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.appids)
+
+    @staticmethod
+    def _dense(rows) -> np.ndarray:
+        return rows.toarray() if sparse.issparse(rows) else np.asarray(rows)
+
+    @staticmethod
+    def normalize(matrix):
+        """L2-normalized float32 copy of feature rows, sparse or dense."""
+        if matrix.shape[0] == 0:
+            # normalize rejects an empty matrix
+            return sparse.csr_matrix(matrix, dtype=np.float32) if sparse.issparse(matrix) else np.array(matrix, np.float32)
+        if sparse.issparse(matrix):
+            return normalize(sparse.csr_matrix(matrix, dtype=np.float32))
+        return normalize(np.asarray(matrix, dtype=np.float32))
+
+    def _rows(self, idxs):
+        """Normalized rows of the given catalog rows."""
+        return self.vectors[self._positions[idxs]]
+
+    def _spherical_kmeans(self, vectors, n_iter: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster normalized rows by cosine similarity; returns (centroids, row labels)."""
+        n_games = len(self.appids)
+        centroids = self._dense(vectors[rng.choice(n_games, self.n_lists, replace=False)])
+        for iteration in range(n_iter + 1):
+            labels = np.asarray(vectors @ np.ascontiguousarray(centroids.T)).argmax(axis=1)
+            if iteration == n_iter:
+                break
+            membership = sparse.csr_matrix(
+                (np.ones(n_games, dtype=np.float32), (labels, np.arange(n_games))), shape=(self.n_lists, n_games)
+            )
+            centroids = normalize(self._dense(membership @ vectors))
+            # Reseed lists that lost all their rows
+            empty = np.flatnonzero(np.bincount(labels, minlength=self.n_lists) == 0)
+            if len(empty):
+                centroids[empty] = self._dense(vectors[rng.choice(n_games, len(empty), replace=False)])
+        return np.ascontiguousarray(centroids, dtype=np.float32), labels
+
+    def _list_block(self, list_id: int):
+        """Rows of one inverted list as a view of vectors."""
+        grouped = self.vectors
+        start, end = self.list_bounds[list_id], self.list_bounds[list_id + 1]
+        if not sparse.issparse(grouped):
+            return grouped[start:end]
+        lo, hi = grouped.indptr[start], grouped.indptr[end]
+        # Assigned after construction: the constructor copies views much smaller than their buffer
+        block = sparse.csr_matrix((end - start, grouped.shape[1]), dtype=grouped.dtype)
+        block.data, block.indices = grouped.data[lo:hi], grouped.indices[lo:hi]
+        block.indptr = (grouped.indptr[start:end + 1] - lo).astype(grouped.indices.dtype)
+        return block
+
+    def lookup(self, appid: int) -> int:
+        """Return the row of an appid, or -1 if it is not in the index."""
+        pos = np.searchsorted(self._sorted_appids, appid)
+        if pos < len(self._sorted_appids) and self._sorted_appids[pos] == appid:
+            return int(self._appid_order[pos])
+        return -1
+
+    def probe(self, idx: int) -> np.ndarray:
+        """Inverted lists whose centroids are most similar to row idx."""
+        centroid_scores = np.asarray(self._rows(idx) @ self._centroids_t).ravel()
+        return np.argpartition(-centroid_scores, self.n_probe - 1)[:self.n_probe]
+
+    @staticmethod
+    def _top_k(idx: int, scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k of the scored rows by score, excluding idx itself."""
+        keep = rows != idx
+        rows, scores = rows[keep], scores[keep]
+        k = min(k, len(rows))
+        if k == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top].astype(np.int32), scores[top].astype(np.float32)
+
+    def neighbours(self, idx: int, k: int = 10, exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the rows most similar to row idx.
+
+        Args:
+            idx: Row of the query game
+            k: Number of neighbours
+            exact: Score the whole catalog instead of using precomputed lists or the IVF index
+
+        Returns:
+            Tuple of neighbour rows and their cosine similarities, most similar first
+        """
+        slot = self._precomputed_slot[idx]
+        if not exact and slot >= 0 and k <= self.precomputed_k:
+            return self._precomputed_idxs[slot, :k], self._precomputed_scores[slot, :k]
+
+        query = self._dense(self._rows(idx)).ravel()
+        rows = None
+        if not exact:
+            probe = self.probe(idx)
+            rows = np.concatenate([self.list_rows[self.list_bounds[i]:self.list_bounds[i + 1]] for i in probe])
+            if len(rows) > k:
+                scores = np.concatenate([np.asarray(self._blocks[i] @ query) for i in probe])
+            else:
+                # Too few games in the probed lists; fall back to scoring the whole catalog
+                rows = None
+        if rows is None:
+            rows, scores = self.list_rows, np.asarray(self.vectors @ query)
+        return self._top_k(idx, scores, rows, k)
+
+    def similar(self, appid: int, k: int = 10, exact: bool = False) -> Optional[List[Tuple[int, float]]]:
+        """
+        Find the games most similar to appid.
+
+        Args:
+            appid: Steam appid of the query game
+            k: Number of neighbours
+            exact: Score the whole catalog instead of using precomputed lists or the IVF index
+
+        Returns:
+            (appid, cosine similarity) pairs, most similar first, or None if appid is unknown
+        """
+        idx = self.lookup(appid)
+        if idx < 0:
+            return None
+        idxs, scores = self.neighbours(idx, k, exact)
+        return [(int(self.appids[i]), float(score)) for i, score in zip(idxs, scores)]
@@ -1,8 +1,11 @@
 #!/bin/bash
 
-# Check if database exists and has games
+# Sync games.json into the database; a no-op when the file is unchanged
 python load_games.py
 
+# Fit the recommender index once so every worker can warm-start from it
+python build_index.py
+
 # Start the FastAPI server
 echo "Starting FastAPI server..."
 exec uvicorn main:app --host 0.0.0.0 --port 8000 
\ No newline at end of file
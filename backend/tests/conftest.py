@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# Tests import the backend modules the way the app does, by their flat module names
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_catalog  # noqa: E402
+from load_games import load_games_to_db  # noqa: E402
+from models import init_db  # noqa: E402
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'games.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    return url
+
+
+@pytest.fixture
+def games_json(tmp_path):
+    path = tmp_path / "games.json"
+    generate_catalog(300, str(path), seed=1, vocabulary_size=2000, n_tags=50, mean_description_words=40)
+    return path
+
+
+@pytest.fixture
+def session_factory(database_url, games_json):
+    """Sessions on a SQLite database loaded with a small synthetic catalog."""
+    load_games_to_db(str(games_json))
+    return sessionmaker(bind=init_db(database_url))
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """The API module, imported once against its own synthetic catalog."""
+    directory = tmp_path_factory.mktemp("api")
+    url = f"sqlite:///{directory / 'games.db'}"
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("DATABASE_URL", url)
+        patch.setenv("INDEX_DIR", str(directory / "index"))
+        patch.setenv("CATALOG_REFRESH_INTERVAL", "0")
+        generate_catalog(300, str(directory / "games.json"), seed=2, vocabulary_size=2000, n_tags=50,
+                         mean_description_words=40)
+        load_games_to_db(str(directory / "games.json"))
+        # Settings are read at import; the environment is restored for the other tests
+        import main
+    yield main
+    main.recommendation_executor.shutdown()
@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(main_module):
+    return TestClient(main_module.app)
+
+
+@pytest.mark.parametrize("method, path", [
+    ("post", "/admin/reload?full=true"),
+    ("get", "/admin/profiler"),
+    ("post", "/admin/profiler?sample_rate=1"),
+])
+def test_admin_routes_are_disabled_without_a_token(client, main_module, monkeypatch, method, path):
+    monkeypatch.setattr(main_module, "ADMIN_TOKEN", None)
+    response = getattr(client, method)(path, headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+    assert main_module.profiler.sample_rate == 0
+
+
+def test_admin_routes_require_the_configured_token(client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/profiler").status_code == 403
+    assert client.get("/admin/profiler", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/profiler", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+    response = client.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["mode"] == "incremental"
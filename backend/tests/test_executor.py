@@ -0,0 +1,137 @@
+import asyncio
+
+import numpy as np
+import pytest
+from scipy import sparse
+from sqlalchemy import delete
+
+import executor
+from executor import RecommendationExecutor
+from metrics import RequestProfiler, metrics
+from models import Game, GameSyncState
+from recommender import Recommender
+from similarity import SimilarityIndex
+
+
+def _library(recommender, n=5):
+    return [{"appid": int(appid), "playtime_forever": 60.0 * (i + 1)}
+            for i, appid in enumerate(recommender.index.appids[:n])]
+
+
+@pytest.fixture
+def recommender(session_factory, tmp_path):
+    with session_factory() as db:
+        return Recommender(db, index_dir=str(tmp_path / "index"), candidate_budget=50)
+
+
+def _mapped(vectors) -> bool:
+    """Whether the (sparse or dense) rows are a view of a memory-mapped file."""
+    array = vectors.data if sparse.issparse(vectors) else vectors
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+@pytest.mark.parametrize("embedding_dim", [None, 16])
+def test_workers_adopt_the_parents_ranking_structures(session_factory, tmp_path, database_url, monkeypatch,
+                                                      embedding_dim):
+    with session_factory() as db:
+        recommender = Recommender(db, index_dir=str(tmp_path / "index"), candidate_budget=50,
+                                  embedding_dim=embedding_dim)
+    monkeypatch.setattr(executor, "_recommender", None)
+    structures = recommender.ranking_structures()
+    executor.init_worker(recommender.settings(), structures, database_url)
+    worker = executor._recommender
+    assert worker is not recommender
+    # Workers memory-map the parent's normalized rows instead of receiving a copy
+    similarity = worker.similarity_index()
+    assert _mapped(similarity.vectors) and all(_mapped(block) for block in similarity._blocks if block.size)
+    for idx in range(0, len(recommender.index), 7):
+        expected = recommender.similarity_index().neighbours(idx, 20)
+        assert all(np.array_equal(a, b) for a, b in zip(similarity.neighbours(idx, 20), expected))
+    assert worker.rank(_library(recommender), 10) == recommender.rank(_library(recommender), 10)
+
+    other = recommender.index.take(list(range(1, len(recommender.index))))
+    worker.index = other
+    assert not worker.adopt_ranking_structures(structures)
+
+
+def test_small_catalogs_rank_every_game_despite_a_budget(session_factory, recommender):
+    with session_factory() as db:
+        small = Recommender(db, candidate_budget=50, candidate_min_games=len(recommender.index) + 1)
+    library = _library(recommender)
+    assert small.ranking_structures() is None
+    assert small.rank(library, 10) == recommender.rank_batch({None: (library, {})}, 10, candidate_budget=0)[None]
+    assert recommender.ranking_structures() is not None
+
+
+def test_adopted_similarity_without_saved_vectors_normalizes_them_again(recommender):
+    similarity = recommender.similarity_index()
+    rebuilt = SimilarityIndex.from_state(recommender.index.scoring_matrix, recommender.index.appids,
+                                         similarity.state())
+    assert not _mapped(rebuilt.vectors)
+    for idx in range(0, len(recommender.index), 7):
+        assert all(np.array_equal(a, b) for a, b in zip(rebuilt.neighbours(idx, 20), similarity.neighbours(idx, 20)))
+
+
+def test_process_workers_rank_like_the_parent(session_factory, recommender):
+    library = _library(recommender)
+    expected = recommender.rank(library, 10)
+    pool = RecommendationExecutor(recommender, mode="process", workers=2)
+    try:
+        pool.start()
+        assert pool._pool._mp_context.get_start_method() != "fork"
+        assert asyncio.run(pool.run("rank", library, 10)) == expected
+        assert asyncio.run(pool.run("settings")) == recommender.settings()
+
+        # Workers restarted after a refresh load the refreshed catalog
+        removed = [appid for appid, _ in expected[:3]]
+        with session_factory() as db:
+            db.execute(delete(GameSyncState).where(GameSyncState.appid.in_(removed)))
+            db.execute(delete(Game).where(Game.appid.in_(removed)))
+            db.commit()
+            recommender.refresh(db)
+        pool.restart()
+        expected = recommender.rank(library, 10)
+        assert not {appid for appid, _ in expected} & set(removed)
+        assert asyncio.run(pool.run("rank", library, 10)) == expected
+    finally:
+        pool.shutdown()
+
+
+def test_process_mode_requires_a_saved_index(session_factory):
+    with session_factory() as db:
+        recommender = Recommender(db)
+    with pytest.raises(ValueError):
+        RecommendationExecutor(recommender, mode="process", workers=1).start()
+
+
+def _stage_count(stage: str) -> int:
+    prefix = f'recommender_stage_seconds_count{{stage="{stage}"}} '
+    return next((int(line[len(prefix):]) for line in metrics.render().splitlines() if line.startswith(prefix)), 0)
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_jobs_report_stage_timings_and_profiles(recommender, mode):
+    library = _library(recommender)
+    profiler = RequestProfiler()
+    pool = RecommendationExecutor(recommender, mode=mode, workers=1)
+
+    async def profiled_request():
+        with profiler.capture("GET /recommendations"):
+            return await pool.run("rank", library, 10)
+
+    before = _stage_count("score")
+    try:
+        assert asyncio.run(profiled_request()) == recommender.rank(library, 10)
+    finally:
+        pool.shutdown()
+    # Once for the job, once for the comparison above
+    assert _stage_count("score") == before + 2
+    jobs = profiler.profiles[0]["jobs"]
+    if mode == "process":
+        # Worker processes are profiled in the worker; a thread job only when no other profiler is active
+        assert len(jobs) == 1
+    for job in jobs:
+        assert job["label"] == f"rank ({mode})"
+        assert "recommender.py" in job["stats"]
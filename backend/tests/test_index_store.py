@@ -0,0 +1,54 @@
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from index_store import ARRAY_FILES, SPARSE_FILES, load_index, save_index
+
+
+def _index():
+    index = {name: sparse.random(5, 8, density=0.5, format="csr", random_state=0) for name in SPARSE_FILES}
+    index.update({name: np.arange(5) for name in ARRAY_FILES})
+    index.update(vectorizers={}, vocabularies={})
+    return index
+
+
+def _versions(index_dir):
+    return sorted(entry for entry in os.listdir(index_dir) if entry.startswith("v"))
+
+
+def test_saving_keeps_the_previous_version(tmp_path):
+    index_dir = str(tmp_path)
+    paths = []
+    for checksum in ("a" * 40, "b" * 40, "c" * 40):
+        paths.append(save_index(index_dir, checksum, _index()))
+        # Versions are ordered by modification time
+        time.sleep(0.01)
+
+    assert _versions(index_dir) == sorted(os.path.basename(path) for path in paths[1:])
+    assert load_index(index_dir, "a" * 40) is None
+    assert load_index(index_dir, "b" * 40)["path"] == paths[1]
+    assert not [entry for entry in os.listdir(index_dir) if entry.startswith((".build-", ".stale-"))]
+
+
+def test_versions_written_since_are_kept(tmp_path):
+    index_dir = str(tmp_path)
+    newer = save_index(index_dir, "b" * 40, _index())
+    # Another process wrote "b" after this one started writing "a"
+    later = time.time() + 60
+    os.utime(newer, (later, later))
+    older = save_index(index_dir, "a" * 40, _index(), keep_previous=0)
+
+    assert _versions(index_dir) == sorted([os.path.basename(older), os.path.basename(newer)])
+
+
+def test_replacing_a_version_keeps_it_loadable(tmp_path):
+    index_dir = str(tmp_path)
+    save_index(index_dir, "a" * 40, _index())
+    replacement = _index()
+    replacement["appids"] = np.arange(5) + 100
+    path = save_index(index_dir, "a" * 40, replacement, replace=True, keep_previous=0)
+
+    assert _versions(index_dir) == [os.path.basename(path)]
+    np.testing.assert_array_equal(load_index(index_dir, "a" * 40)["appids"], np.arange(5) + 100)
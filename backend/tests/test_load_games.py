@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import select
+
+from load_games import GAME_COLUMNS, _copy_field, _copy_rows, load_games_to_db, parse_game
+from models import Game, GameStatus, GameSyncState, UserGamePreference, init_db
+
+# A Postgres database the COPY path can be tested against; those tests are skipped without one
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def _write_games(path, games):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(appid): game for appid, game in games.items()}, f)
+
+
+def _game(name, **fields):
+    return {"name": name, "positive": 150, "negative": 10, "genres": ["Action"], "tags": {"Shooter": 10},
+            "developers": ["Studio"], "publishers": ["Publisher"], **fields}
+
+
+def test_copy_rows_keep_empty_strings_apart_from_null():
+    # COPY csv reads an unquoted empty field as NULL and a quoted one as ''
+    assert _copy_field(None) == ""
+    assert _copy_field("") == '""'
+    assert _copy_field('He said "hi", twice\nthen left') == '"He said ""hi"", twice\nthen left"'
+    assert _copy_field(0.5) == "0.5"
+
+    row = parse_game("10", _game(""))
+    row["release_date"] = None
+    assert GAME_COLUMNS[:3] == ["appid", "name", "release_date"]
+    assert _copy_rows([row]).read().startswith('10,"",,')
+
+
+def test_full_load_keeps_empty_strings(tmp_path, database_url):
+    path = tmp_path / "games.json"
+    _write_games(path, {10: _game(""), 20: _game("Named", header_image="")})
+    load_games_to_db(str(path), full=True)
+
+    with init_db(database_url).connect() as connection:
+        rows = {row.appid: row for row in connection.execute(select(Game))}
+    assert rows[10].name == ""
+    assert rows[10].release_date == ""
+    assert rows[20].header_image == ""
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+def test_copy_load_keeps_empty_strings(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", POSTGRES_URL)
+    path = tmp_path / "games.json"
+    _write_games(path, {10: _game(""), 20: _game("Named", release_date="", header_image="")})
+    load_games_to_db(str(path), full=True)
+
+    with init_db(POSTGRES_URL).connect() as connection:
+        rows = {row.appid: row for row in connection.execute(select(Game).where(Game.appid.in_([10, 20])))}
+    assert rows[10].name == ""
+    assert rows[20].release_date == ""
+    assert rows[20].header_image == ""
+
+
+def test_incremental_sync_deletes_games_that_left_the_dataset(tmp_path, database_url):
+    games = {appid: _game(f"Game {appid}", positive=100 + appid) for appid in (10, 20, 30, 40)}
+    path = tmp_path / "games.json"
+    _write_games(path, games)
+    load_games_to_db(str(path))
+
+    engine = init_db(database_url)
+    with engine.begin() as connection:
+        connection.execute(UserGamePreference.__table__.insert(), [
+            {"steam_id": "1", "appid": 20, "status": GameStatus.LIKED},
+            {"steam_id": "1", "appid": 30, "status": GameStatus.DISLIKED},
+        ])
+
+    # 40 had the most reviews, so its removal also moves every popularity score
+    del games[20], games[40]
+    games[50] = _game("Game 50")
+    _write_games(path, games)
+    load_games_to_db(str(path))
+
+    def snapshot():
+        with engine.connect() as connection:
+            return (
+                sorted(tuple(row) for row in connection.execute(select(Game))),
+                sorted(connection.execute(select(GameSyncState.appid)).scalars()),
+                sorted(connection.execute(select(UserGamePreference.appid)).scalars()),
+            )
+
+    incremental = snapshot()
+    assert [row[0] for row in incremental[0]] == [10, 30, 50]
+    assert incremental[1] == [10, 30, 50]
+    assert incremental[2] == [30]
+
+    load_games_to_db(str(path), full=True)
+    assert snapshot() == incremental
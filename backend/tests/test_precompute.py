@@ -0,0 +1,123 @@
+import time
+
+import pytest
+from sqlalchemy import select
+
+import precompute
+from models import GameStatus, PrecomputedRecommendation
+from recommender import Recommender, recommender_settings
+from result_cache import RecommendationCache
+
+
+@pytest.fixture
+def catalog(session_factory, tmp_path, monkeypatch):
+    """Checksum and appids of the catalog, and two users whose Steam libraries precompute fetches from a stub."""
+    monkeypatch.setenv("INDEX_DIR", str(tmp_path / "index"))
+    with session_factory() as db:
+        recommender = Recommender(db, index_dir=str(tmp_path / "index"))
+    appids = recommender.index.appids.tolist()
+    libraries = {
+        steam_id: [{"appid": appid, "playtime_forever": 60 * (i + 1)} for i, appid in enumerate(owned)]
+        for steam_id, owned in (("a", appids[:5]), ("b", appids[5:12]))
+    }
+
+    async def fetch_libraries(steam_ids, max_concurrency=10):
+        return {steam_id: libraries[steam_id] for steam_id in steam_ids}
+
+    monkeypatch.setattr(precompute, "fetch_libraries", fetch_libraries)
+    return recommender.checksum, appids, libraries
+
+
+def _precompute(top_n=10):
+    precompute.precompute(["a", "b"], top_n=top_n, workers=1)
+
+
+def _fingerprints(libraries, preferences=None):
+    preferences = preferences or {}
+    return {steam_id: RecommendationCache.fingerprint(games, preferences.get(steam_id, {}))
+            for steam_id, games in libraries.items()}
+
+
+def test_precomputed_rows_are_served_for_their_top_n(main_module, session_factory, catalog, tmp_path):
+    checksum, _, libraries = catalog
+    _precompute(top_n=20)
+    with session_factory() as db:
+        assert main_module.load_precomputed(db, _fingerprints(libraries), 10, checksum) == {}
+        served = main_module.load_precomputed(db, _fingerprints(libraries), 20, checksum)
+    assert set(served) == {"a", "b"}
+
+
+def test_payloads_are_ranked_with_the_api_settings(session_factory, catalog, monkeypatch):
+    _, _, libraries = catalog
+    monkeypatch.setenv("CANDIDATE_BUDGET", "30")
+    monkeypatch.setenv("CANDIDATE_MIN_GAMES", "0")
+    _precompute()
+    with session_factory() as db:
+        recommender = Recommender(db, **recommender_settings())
+        payloads = dict(db.execute(select(PrecomputedRecommendation.steam_id, PrecomputedRecommendation.payload)).all())
+    assert recommender.candidate_budget == 30
+    for steam_id, games in libraries.items():
+        assert payloads[steam_id] == recommender.cards.render(recommender.rank(games, 10)).decode("utf-8")
+
+
+def test_rows_are_not_served_after_the_library_or_catalog_changed(main_module, session_factory, catalog, tmp_path):
+    checksum, appids, libraries = catalog
+    _precompute()
+    # "a" bought a game after the run
+    changed = dict(libraries, a=libraries["a"] + [{"appid": appids[40], "playtime_forever": 0}])
+    with session_factory() as db:
+        assert set(main_module.load_precomputed(db, _fingerprints(changed), 10, checksum)) == {"b"}
+        assert main_module.load_precomputed(db, _fingerprints(libraries), 10, "refreshed catalog") == {}
+
+
+def test_preference_change_during_ranking_is_not_served(main_module, session_factory, catalog, tmp_path,
+                                                        monkeypatch):
+    checksum, appids, libraries = catalog
+    rank_batch = Recommender.rank_batch
+
+    def rank_batch_with_concurrent_like(self, users, top_n, candidate_budget=None):
+        # The user likes a game after precompute read their preferences, before the payload is written
+        with session_factory() as db:
+            main_module.upsert_preferences(db, "a", {appids[20]: GameStatus.LIKED})
+        return rank_batch(self, users, top_n, candidate_budget)
+
+    monkeypatch.setattr(Recommender, "rank_batch", rank_batch_with_concurrent_like)
+    _precompute()
+    fingerprints = _fingerprints(libraries, {"a": {appids[20]: "liked"}})
+    with session_factory() as db:
+        written = set(db.scalars(select(PrecomputedRecommendation.steam_id)))
+        served = main_module.load_precomputed(db, fingerprints, 10, checksum)
+    assert written == {"b"}
+    assert set(served) == {"b"}
+
+
+def test_rows_ranked_on_other_preferences_are_not_served(main_module, session_factory, catalog, tmp_path):
+    checksum, appids, libraries = catalog
+    _precompute()
+    # A row that slipped past the write check, e.g. a like committed between the check and the upsert
+    with session_factory() as db:
+        main_module.upsert_preferences(db, "b", {appids[30]: GameStatus.DISLIKED})
+        row = {"steam_id": "b", "payload": "[]", "created_at": time.time(), "top_n": 10,
+               "preferences_updated_at": 0.0, "catalog_version": checksum,
+               "fingerprint": _fingerprints(libraries)["b"]}
+        db.execute(PrecomputedRecommendation.__table__.insert(), [row])
+        db.commit()
+        fingerprints = _fingerprints(libraries, {"b": {appids[30]: "disliked"}})
+        served = main_module.load_precomputed(db, fingerprints, 10, checksum)
+    assert set(served) == {"a"}
+
+
+def test_catalog_refreshes_drop_rows_of_older_catalogs(main_module, monkeypatch):
+    monkeypatch.setattr(main_module.recommender, "refresh", lambda db, full=False: {"changed": True})
+    with main_module.SessionLocal() as db:
+        db.execute(PrecomputedRecommendation.__table__.insert(), [
+            {"steam_id": steam_id, "payload": "[]", "created_at": time.time(), "top_n": 10,
+             "preferences_updated_at": 0.0, "catalog_version": version, "fingerprint": ""}
+            for steam_id, version in (("current", main_module.recommender.checksum), ("old", "older catalog"))
+        ])
+        db.commit()
+    main_module.refresh_recommender()
+    with main_module.SessionLocal() as db:
+        assert set(db.scalars(select(PrecomputedRecommendation.steam_id))) == {"current"}
+        db.query(PrecomputedRecommendation).delete()
+        db.commit()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from sqlalchemy import delete, update
+
+from models import Game, GameSyncState
+from recommender import Recommender
+
+
+def _library(recommender, n=5):
+    return [{"appid": int(appid), "playtime_forever": 60.0 * (i + 1)}
+            for i, appid in enumerate(recommender.index.appids[:n])]
+
+
+@pytest.mark.parametrize("embedding_dim", [None, 16])
+def test_incremental_refresh_that_only_removes_games(session_factory, embedding_dim):
+    with session_factory() as db:
+        recommender = Recommender(db, embedding_dim=embedding_dim)
+        before = recommender.index
+        removed = before.appids[[1, 7, 20]].tolist()
+        db.execute(delete(GameSyncState).where(GameSyncState.appid.in_(removed)))
+        db.execute(delete(Game).where(Game.appid.in_(removed)))
+        db.commit()
+
+        summary = recommender.refresh(db)
+
+    assert summary["changed"]
+    assert (summary["added"], summary["updated"], summary["removed"]) == (0, 0, 3)
+    index = recommender.index
+    assert len(index) == len(before) - 3
+    assert not np.isin(index.appids, removed).any()
+    keep = ~np.isin(before.appids, removed)
+    assert (index.feature_matrix != before.feature_matrix[keep]).nnz == 0
+    if embedding_dim:
+        np.testing.assert_array_equal(index.embeddings, before.embeddings[keep])
+    for appid in removed:
+        assert appid not in recommender.cards
+
+    ranked = recommender.rank(_library(recommender), top_n=10)
+    assert len(ranked) == 10
+    assert not {appid for appid, _ in ranked} & set(removed)
+
+
+def test_incremental_refresh_without_changes_keeps_the_index(session_factory):
+    with session_factory() as db:
+        recommender = Recommender(db)
+        before = recommender.index
+        summary = recommender.refresh(db)
+    assert not summary["changed"]
+    assert recommender.index is before
+
+
+def test_full_refit_reports_only_games_whose_content_changed(session_factory):
+    with session_factory() as db:
+        recommender = Recommender(db)
+        edited = int(recommender.index.appids[3])
+        db.execute(update(GameSyncState).where(GameSyncState.appid == edited).values(content_hash="0" * 32))
+        db.commit()
+
+        summary = recommender.refresh(db, full=True)
+    assert (summary["added"], summary["updated"], summary["removed"]) == (0, 1, 0)
+
+
+def test_games_without_a_sync_hash_are_refreshed_when_edited(session_factory):
+    with session_factory() as db:
+        unhashed = Recommender(db).index.appids[[2, 9]].tolist()
+        db.execute(delete(GameSyncState).where(GameSyncState.appid.in_(unhashed)))
+        db.commit()
+        recommender = Recommender(db)
+        assert not recommender.refresh(db)["changed"]
+
+        def features(appid):
+            index = recommender.index
+            return index.feature_matrix[int(np.flatnonzero(index.appids == appid)[0])]
+
+        before = features(unhashed[0])
+        db.execute(update(Game).where(Game.appid == unhashed[0]).values(genres=[], tags=[]))
+        db.commit()
+        summary = recommender.refresh(db)
+
+    assert (summary["added"], summary["updated"], summary["removed"]) == (0, 1, 0)
+    assert (features(unhashed[0]) != before).nnz > 0
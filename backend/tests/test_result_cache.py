@@ -0,0 +1,93 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from models import GameStatus
+
+
+@pytest.fixture
+def api(main_module, monkeypatch):
+    """Test client on the API with counted Steam fetches and database sessions."""
+    appids = main_module.recommender.index.appids.tolist()
+    library = [{"appid": appid, "playtime_forever": 60 * (i + 1)} for i, appid in enumerate(appids[:5])]
+    calls = {"steam": 0, "db": 0}
+
+    async def fetch_owned_games(steam_id):
+        calls["steam"] += 1
+        return library
+
+    with_session = main_module.with_session
+
+    def counted_session(fn, *args):
+        calls["db"] += 1
+        return with_session(fn, *args)
+
+    monkeypatch.setattr(main_module, "fetch_owned_games", fetch_owned_games)
+    monkeypatch.setattr(main_module, "with_session", counted_session)
+    main_module.recommendation_cache.clear()
+    yield TestClient(main_module.app), calls
+    main_module.recommendation_cache.clear()
+
+
+def _top_appid(client, steam_id: str) -> int:
+    return int(client.get("/recommendations", params={"steam_id": steam_id}).json()[0]["appid"])
+
+
+def test_cache_hit_makes_no_steam_or_database_call(api):
+    client, calls = api
+    first = client.get("/recommendations", params={"steam_id": "cache-hit"})
+    assert first.status_code == 200
+    assert calls["steam"] == 1
+
+    calls.update(steam=0, db=0)
+    second = client.get("/recommendations", params={"steam_id": "cache-hit"})
+    assert second.content == first.content
+    assert calls == {"steam": 0, "db": 0}
+
+
+def test_preference_write_is_seen_by_the_next_view(api, main_module):
+    client, calls = api
+    top = _top_appid(client, "cache-like")
+    with main_module.SessionLocal() as db:
+        main_module.upsert_preferences(db, "cache-like", {top: GameStatus.DISLIKED})
+
+    calls.update(steam=0, db=0)
+    response = client.get("/recommendations", params={"steam_id": "cache-like"})
+    assert calls["steam"] == 1
+    assert str(top) not in [game["appid"] for game in response.json()]
+
+
+def test_entries_past_their_window_are_revalidated_without_ranking(api, main_module, monkeypatch):
+    client, calls = api
+    monkeypatch.setattr(main_module.recommendation_cache, "revalidate_after", 0.0)
+    first = client.get("/recommendations", params={"steam_id": "cache-stale"})
+
+    async def no_ranking(*args):
+        raise AssertionError("an unchanged user was ranked again")
+
+    monkeypatch.setattr(main_module, "run_recommendation_job", no_ranking)
+    calls.update(steam=0, db=0)
+    second = client.get("/recommendations", params={"steam_id": "cache-stale"})
+    assert second.content == first.content
+    assert calls["steam"] == 1
+
+
+def test_entry_ranked_across_a_preference_write_is_revalidated(api, main_module, monkeypatch):
+    client, calls = api
+    # Every user owns the same library, so another user's top game is this one's too
+    top = _top_appid(client, "cache-race-probe")
+    run_recommendation_job = main_module.run_recommendation_job
+
+    async def rank_with_concurrent_like(*args):
+        # The like lands after the request read the preferences, before its result is cached
+        with main_module.SessionLocal() as db:
+            main_module.upsert_preferences(db, "cache-race", {top: GameStatus.DISLIKED})
+        return await run_recommendation_job(*args)
+
+    monkeypatch.setattr(main_module, "run_recommendation_job", rank_with_concurrent_like)
+    client.get("/recommendations", params={"steam_id": "cache-race"})
+    monkeypatch.setattr(main_module, "run_recommendation_job", run_recommendation_job)
+
+    calls.update(steam=0, db=0)
+    response = client.get("/recommendations", params={"steam_id": "cache-race"})
+    assert calls["steam"] == 1
+    assert str(top) not in [game["appid"] for game in response.json()]
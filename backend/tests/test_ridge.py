@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.linear_model import Ridge
+
+from recommender import DIRECT_SOLVE_MAX_SAMPLES, ridge_fit
+
+
+def _problem(n_samples, n_features, dense=False, seed=0):
+    rng = np.random.default_rng(seed)
+    X = sparse.random(n_samples, n_features, density=0.02, format="csr", random_state=seed, dtype=np.float32)
+    if dense:
+        X = rng.standard_normal((n_samples, n_features)).astype(np.float32)
+    # Playtime-like targets: mostly small, a few large
+    y = np.log1p(rng.pareto(1.0, n_samples) * 60)
+    return X, y
+
+
+@pytest.mark.parametrize("n_samples, n_features, dense", [
+    (40, 2000, False),                               # dual, direct solve
+    (DIRECT_SOLVE_MAX_SAMPLES, 2000, False),         # dual, direct solve at the threshold
+    (DIRECT_SOLVE_MAX_SAMPLES + 200, 3000, False),   # dual, conjugate gradients
+    (500, 32, True),                                 # primal, dense embedding rows
+    (600, 300, False),                               # primal, sparse rows
+])
+def test_ridge_fit_matches_sklearn(n_samples, n_features, dense):
+    X, y = _problem(n_samples, n_features, dense)
+    reference = Ridge(alpha=1.0, tol=1e-12).fit(X.astype(np.float64), y)
+
+    coef, intercept = ridge_fit(X, y, alpha=1.0)
+
+    np.testing.assert_allclose(coef, reference.coef_, rtol=1e-5, atol=1e-6)
+    assert intercept == pytest.approx(reference.intercept_, rel=1e-6, abs=1e-6)
+    # What the recommender uses: scores over unseen rows
+    unseen, _ = _problem(200, n_features, dense, seed=1)
+    np.testing.assert_allclose(unseen @ coef + intercept, reference.predict(unseen.astype(np.float64)),
+                               rtol=1e-5, atol=1e-5)
+
+
+def test_ridge_fit_with_a_single_game():
+    X, y = _problem(1, 500)
+    coef, intercept = ridge_fit(X, y)
+    np.testing.assert_allclose(coef, 0, atol=1e-12)
+    assert intercept == pytest.approx(y[0])
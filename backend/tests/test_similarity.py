@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from similarity import SimilarityIndex
+
+
+@pytest.mark.parametrize("matrix", [sparse.csr_matrix((0, 8), dtype=np.float32), np.empty((0, 8))])
+def test_empty_catalog_builds_an_index_without_neighbours(matrix):
+    index = SimilarityIndex(matrix, np.empty(0, dtype=np.int64), np.empty(0))
+    assert len(index) == 0
+    assert index.similar(10) is None
+    rebuilt = SimilarityIndex.from_state(matrix, index.appids, index.state())
+    assert rebuilt.similar(10) is None
+
+
+def test_neighbours_match_an_exact_scan():
+    rng = np.random.default_rng(0)
+    matrix = sparse.random(400, 60, density=0.1, format="csr", random_state=1)
+    index = SimilarityIndex(matrix, np.arange(400) * 10, rng.random(400), n_probe=64, n_precomputed=50)
+    for idx in range(0, 400, 37):
+        approximate, _ = index.neighbours(idx, 10)
+        exact, _ = index.neighbours(idx, 10, exact=True)
+        assert set(approximate) == set(exact)
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import utils
+from utils import SteamClient
+
+GAMES = [{"appid": 10, "playtime_forever": 120}, {"appid": 20, "playtime_forever": 5}]
+
+
+class FakeSteam:
+    def __init__(self):
+        """Local stand-in for the Steam Web API that serves scripted (status, body, delay) responses in order."""
+        self.responses = [(200, {"response": {"games": GAMES}}, 0.0)]
+        self.requests = []
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests.append(self.path)
+                    # The last scripted response repeats
+                    status, body, delay = fake.responses[min(len(fake.requests), len(fake.responses)) - 1]
+                time.sleep(delay)
+                # Bytes are sent as they are, e.g. to script a malformed body
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client timed out and hung up
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def steam():
+    fake = FakeSteam()
+    yield fake
+    fake.close()
+
+
+def _client(steam, **kwargs) -> SteamClient:
+    return SteamClient("key", base_url=steam.url, **{"backoff": 0.01, **kwargs})
+
+
+def _run(client: SteamClient, coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_for_a_user_share_one_upstream_call(steam):
+    steam.responses = [(200, {"response": {"games": GAMES}}, 0.2)]
+    client = _client(steam)
+
+    async def fetch_concurrently():
+        return await asyncio.gather(*(client.get_owned_games("76561198000000001") for _ in range(20)),
+                                    client.get_owned_games("76561198000000002"))
+
+    results = _run(client, fetch_concurrently())
+    assert all(result == GAMES for result in results)
+    assert sorted(path.split("steamid=")[1].split("&")[0] for path in steam.requests) == [
+        "76561198000000001", "76561198000000002"
+    ]
+
+
+def test_responses_are_cached_until_the_ttl_expires(steam):
+    client = _client(steam, cache_ttl=0.2)
+
+    async def fetch_three_times():
+        first = await client.get_owned_games("1")
+        second = await client.get_owned_games("1")
+        assert len(steam.requests) == 1
+        await asyncio.sleep(0.3)
+        third = await client.get_owned_games("1")
+        return first, second, third
+
+    assert _run(client, fetch_three_times()) == (GAMES, GAMES, GAMES)
+    assert len(steam.requests) == 2
+
+
+def test_invalidate_drops_the_cached_response(steam):
+    client = _client(steam)
+
+    async def fetch_invalidate_fetch():
+        await client.get_owned_games("1")
+        client.invalidate("1")
+        await client.get_owned_games("1")
+
+    _run(client, fetch_invalidate_fetch())
+    assert len(steam.requests) == 2
+
+
+def test_rate_limits_and_unavailability_are_retried_with_backoff(steam, monkeypatch):
+    steam.responses = [(429, {}, 0.0), (503, {}, 0.0), (200, {"response": {"games": GAMES}}, 0.0)]
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def recording_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(utils.random, "random", lambda: 0.5)
+    monkeypatch.setattr(utils.asyncio, "sleep", recording_sleep)
+    client = _client(steam, backoff=0.5)
+    assert _run(client, client.get_owned_games("1")) == GAMES
+    assert len(steam.requests) == 3
+    assert delays == [0.5, 1.0]
+
+
+def test_retries_give_up_with_the_last_error(steam):
+    steam.responses = [(503, {}, 0.0)]
+    client = _client(steam, retries=2)
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        _run(client, client.get_owned_games("1"))
+    assert error.value.response.status_code == 503
+    assert len(steam.requests) == 3
+
+
+def test_client_errors_are_not_retried(steam):
+    steam.responses = [(403, {}, 0.0)]
+    client = _client(steam)
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(client, client.get_owned_games("1"))
+    assert len(steam.requests) == 1
+
+
+def test_slow_responses_time_out_and_are_retried(steam):
+    steam.responses = [(200, {"response": {"games": GAMES}}, 1.0)]
+    client = _client(steam, timeout=0.1, retries=1)
+    start = time.perf_counter()
+    with pytest.raises(httpx.TimeoutException):
+        _run(client, client.get_owned_games("1"))
+    assert time.perf_counter() - start < 1.0
+    assert len(steam.requests) == 2
+
+
+@pytest.mark.parametrize("response, status_code", [
+    ((500, {}, 0.0), 502),
+    ((429, {}, 0.0), 502),
+    ((200, {"response": {}}, 0.0), 404),
+    ((200, {"response": {"games": []}}, 0.0), 404),
+    ((200, b"<html>Service Unavailable</html>", 0.0), 502),
+    ((200, ["not", "an", "object"], 0.0), 502),
+    ((200, {"response": {"games": "none"}}, 0.0), 502),
+])
+def test_upstream_errors_map_to_http_errors(steam, main_module, monkeypatch, response, status_code):
+    steam.responses = [response]
+    monkeypatch.setattr(utils, "steam_client", _client(steam, retries=1))
+    assert TestClient(main_module.app).get("/recommendations", params={"steam_id": "1"}).status_code == status_code
+
+
+def test_recommendations_are_ranked_from_the_fetched_library(steam, main_module, monkeypatch):
+    appids = main_module.recommender.index.appids[:5].tolist()
+    steam.responses = [(200, {"response": {"games": [
+        {"appid": appid, "playtime_forever": 60 * (i + 1)} for i, appid in enumerate(appids)
+    ]}}, 0.0)]
+    monkeypatch.setattr(utils, "steam_client", _client(steam))
+    response = TestClient(main_module.app).get("/recommendations", params={"steam_id": "2"})
+    assert response.status_code == 200
+    recommended = [int(game["appid"]) for game in response.json()]
+    assert len(recommended) == 10
+    assert not set(recommended) & set(appids)
@@ -1,29 +1,124 @@
+import asyncio
 import os
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 import httpx
 import pandas as pd
 import json
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 STEAM_API_KEY = os.getenv("STEAM_API_KEY")
+STEAM_API_URL = os.getenv("STEAM_API_URL", "http://api.steampowered.com")
 
-def fetch_owned_games(steam_id: str) -> list[dict]:
-    url = "http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/"
-    params = {
-        "key": STEAM_API_KEY,
-        "steamid": steam_id,
-        "format": "json",
-        "include_appinfo": True
-    }
-    response = requests.get(url, params=params)
-    try:
-        data = response.json()
-    except Exception as e:
-        print("Failed to decode JSON from Steam API. Response text:")
-        print(response.text)
-        raise
-    return data.get("response", {}).get("games", [])
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class SteamClient:
+    def __init__(self, api_key: Optional[str], base_url: str = STEAM_API_URL, timeout: float = 10.0,
+                 max_connections: int = 20, max_concurrency: int = 10, retries: int = 3,
+                 backoff: float = 0.5, cache_ttl: float = 300.0, cache_size: int = 10000):
+        """
+        Async Steam Web API client shared by all requests of a worker.
+
+        Args:
+            api_key: Steam Web API key
+            base_url: API root; point it at a local fake server for testing
+            timeout: Per-request timeout in seconds
+            max_connections: Size of the pooled keep-alive connection pool
+            max_concurrency: Maximum number of Steam calls in flight at once
+            retries: Retries after the first attempt on timeouts, network errors and 429/5xx
+            backoff: Base delay in seconds, doubled on every retry
+            cache_ttl: Seconds an owned-games response is reused for the same steam_id
+            cache_size: Maximum number of cached steam_ids (least recently used are dropped)
+        """
+        self.api_key = api_key
+        self.retries = retries
+        self.backoff = backoff
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache: OrderedDict[str, Tuple[float, list[dict]]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get_owned_games(self, steam_id: str) -> list[dict]:
+        """Return the user's owned games, from cache or from a single shared upstream call."""
+        cached = self._cache.get(steam_id)
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(steam_id)
+            return cached[1]
+
+        # Concurrent requests for the same user wait on the same upstream call
+        task = self._inflight.get(steam_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_owned_games(steam_id))
+            self._inflight[steam_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(steam_id, None))
+        return await asyncio.shield(task)
+
+    def invalidate(self, steam_id: str):
+        self._cache.pop(steam_id, None)
+
+    async def _fetch_owned_games(self, steam_id: str) -> list[dict]:
+        params = {
+            "key": self.api_key,
+            "steamid": steam_id,
+            "format": "json",
+            "include_appinfo": True
+        }
+        response = await self._get("/IPlayerService/GetOwnedGames/v0001/", params)
+        try:
+            games = response.json().get("response", {}).get("games", [])
+            if not isinstance(games, list):
+                raise TypeError(f"games is a {type(games).__name__}")
+        except (ValueError, AttributeError, TypeError) as e:
+            # Raised as an httpx error, so callers handle it like any other failed Steam call
+            print(f"Unexpected response from Steam API: {response.text[:200]!r}")
+            raise httpx.DecodingError(f"Steam API returned an invalid owned-games response: {e}",
+                                      request=response.request) from e
+
+        self._cache[steam_id] = (time.monotonic() + self.cache_ttl, games)
+        self._cache.move_to_end(steam_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return games
+
+    async def _get(self, path: str, params: dict) -> httpx.Response:
+        """GET with bounded concurrency and exponential backoff with jitter."""
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._client.get(path, params=params)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"Steam API returned {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt == self.retries:
+                raise error
+            await asyncio.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+steam_client = SteamClient(
+    STEAM_API_KEY,
+    cache_ttl=float(os.getenv("STEAM_CACHE_TTL", "300")),
+)
+
+async def fetch_owned_games(steam_id: str) -> list[dict]:
+    return await steam_client.get_owned_games(steam_id)
 
 
 def load_metadata(filepath: str = "games.json") -> pd.DataFrame:
@@ -1,19 +1,19 @@
 import { NextResponse } from "next/server";
 
 export async function POST(request: Request) {
-  const { appid, status, steamid } = await request.json();
-  
-  const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/games/${appid}/status`, {
+  const { steamid, events } = await request.json();
+
+  const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/games/status/batch`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ status, steamid }),
+    body: JSON.stringify({ steamid, events }),
   });
 
   if (!response.ok) {
-    return NextResponse.json({ error: 'Failed to update game status' }, { status: 500 });
+    return NextResponse.json({ error: 'Failed to update game statuses' }, { status: 500 });
   }
-  
-  return NextResponse.json({ success: true });
-}
\ No newline at end of file
+
+  return NextResponse.json({ success: true, ...(await response.json()) });
+}
@@ -6,7 +6,7 @@ import {
   CarouselNext,
   CarouselPrevious,
 } from "@/components/ui/carousel";
-import { getGames } from "@/lib/games";
+import { getGames, getSimilarGames } from "@/lib/games";
 import Image from "next/image";
 import { Separator } from "@/components/ui/separator";
 import { Badge } from "@/components/ui/badge";
@@ -17,7 +17,10 @@ interface PageProps {
 
 export default async function Page({ params }: PageProps) {
   const { appid } = await params;
-  const games = await getGames();
+  const [games, similarGames] = await Promise.all([
+    getGames(),
+    getSimilarGames(appid),
+  ]);
   const game = games.find((g) => g.appid == appid);
 
   const currentIndex = games.findIndex((g) => g.appid == appid);
@@ -136,6 +139,34 @@ export default async function Page({ params }: PageProps) {
             {game?.detailedDescription}
           </p>
         </div>
+        {similarGames.length > 0 && (
+          <div className="bg-neutral-900/30 p-2 rounded-xl my-4">
+            <span className="text-xs text-neutral-300">
+              SIMILAR GAMES:
+            </span>
+            <div className="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-6 gap-4 mt-2">
+              {similarGames.map((similar) => (
+                <a
+                  key={similar.appid}
+                  href={`https://store.steampowered.com/app/${similar.appid}`}
+                  target="_blank"
+                  rel="noopener noreferrer"
+                  className="space-y-1"
+                >
+                  <div className="relative w-full aspect-[2/1]">
+                    <Image
+                      src={similar.headerImage}
+                      alt={`${similar.name} header image`}
+                      fill
+                      className="rounded-lg object-cover"
+                    />
+                  </div>
+                  <p className="text-sm truncate">{similar.name}</p>
+                </a>
+              ))}
+            </div>
+          </div>
+        )}
       </div>
   );
 }
@@ -5,7 +5,47 @@ import { Button } from "./ui/button";
 import { ThumbsUp, ThumbsDown, ChevronLeft, ChevronRight } from "lucide-react";
 import { useRouter } from "next/navigation";
 import { useSession } from "next-auth/react";
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
+
+type GameStatus = "liked" | "disliked";
+
+// Likes and dislikes made while moving through the queue, sent in one request on Finish.
+// Buffered per Steam account, so signing in as someone else in the same tab never sends them
+function pendingStatusesKey(steamid: string): string {
+  return `pendingGameStatuses:${steamid}`;
+}
+
+function readPendingStatuses(steamid: string | undefined): Record<string, GameStatus> {
+  if (!steamid) {
+    return {};
+  }
+  try {
+    return JSON.parse(sessionStorage.getItem(pendingStatusesKey(steamid)) ?? "{}");
+  } catch {
+    return {};
+  }
+}
+
+function recordPendingStatus(steamid: string | undefined, appid: string, status: GameStatus | null) {
+  if (!steamid) {
+    return;
+  }
+  const pending = readPendingStatuses(steamid);
+  if (status) {
+    pending[appid] = status;
+  } else {
+    delete pending[appid];
+  }
+  sessionStorage.setItem(pendingStatusesKey(steamid), JSON.stringify(pending));
+}
+
+function pendingStatusBody(steamid: string): string | null {
+  const events = Object.entries(readPendingStatuses(steamid)).map(([appid, status]) => ({
+    appid: Number(appid),
+    status,
+  }));
+  return events.length ? JSON.stringify({ steamid, events }) : null;
+}
 
 interface GameNavigationProps {
   game: Game;
@@ -18,12 +58,55 @@ export default function GameNavigation({
   nextGameId,
   prevGameId,
 }: GameNavigationProps) {
-  const [status, setStatus] = useState<"liked" | "disliked" | null>(null);
+  const [status, setStatus] = useState<GameStatus | null>(null);
+  const statusRef = useRef(status);
+  statusRef.current = status;
 
   const router = useRouter();
   const session = useSession();
   // @ts-expect-error - Steam profile added by Steam provider
-  const steamid = session?.data?.user.steam.steamid;
+  const steamid: string | undefined = session?.data?.user.steam.steamid;
+
+  // Restore a status chosen earlier in this queue when navigating back to the game
+  useEffect(() => {
+    setStatus(readPendingStatuses(steamid)[game.appid] ?? null);
+  }, [game.appid, steamid]);
+
+  // Don't lose buffered statuses if the tab is closed before Finish
+  useEffect(() => {
+    const flushOnHide = () => {
+      if (!steamid) {
+        return;
+      }
+      recordPendingStatus(steamid, game.appid, statusRef.current);
+      const body = pendingStatusBody(steamid);
+      if (body && navigator.sendBeacon("/api/games/status/batch", body)) {
+        sessionStorage.removeItem(pendingStatusesKey(steamid));
+      }
+    };
+    window.addEventListener("pagehide", flushOnHide);
+    return () => window.removeEventListener("pagehide", flushOnHide);
+  }, [game.appid, steamid]);
+
+  const flushStatuses = async () => {
+    if (!steamid) {
+      return;
+    }
+    const body = pendingStatusBody(steamid);
+    if (!body) {
+      return;
+    }
+    const response = await fetch("/api/games/status/batch", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body,
+    });
+    if (response.ok) {
+      sessionStorage.removeItem(pendingStatusesKey(steamid));
+    }
+  };
 
   const handleLike = async () => {
     if (status === "liked") {
@@ -73,20 +156,8 @@ export default function GameNavigation({
           <Button
             variant="outline"
             className="bg-transparent"
-            onClick={async () => {
-              if (status) {
-                await fetch("/api/games/status", {
-                  method: "POST",
-                  headers: {
-                    "Content-Type": "application/json",
-                  },
-                  body: JSON.stringify({
-                    appid: game.appid,
-                    status: status,
-                    steamid,
-                  }),
-                });
-              }
+            onClick={() => {
+              recordPendingStatus(steamid, game.appid, status);
 
               router.push(`/recommendations/${prevGameId}`);
             }}
@@ -98,20 +169,8 @@ export default function GameNavigation({
           <Button
             variant="outline"
             className="bg-transparent"
-            onClick={async () => {
-              if (status) {
-                await fetch("/api/games/status", {
-                  method: "POST",
-                  headers: {
-                    "Content-Type": "application/json",
-                  },
-                  body: JSON.stringify({
-                    appid: game.appid,
-                    status: status,
-                    steamid,
-                  }),
-                });
-              }
+            onClick={() => {
+              recordPendingStatus(steamid, game.appid, status);
 
               router.push(`/recommendations/${nextGameId}`);
             }}
@@ -123,19 +182,8 @@ export default function GameNavigation({
             variant="outline"
             className="bg-transparent"
             onClick={async () => {
-              if (status) {
-                await fetch("/api/games/status", {
-                  method: "POST",
-                  headers: {
-                    "Content-Type": "application/json",
-                  },
-                  body: JSON.stringify({
-                    appid: game.appid,
-                    status: status,
-                    steamid,
-                  }),
-                });
-              }
+              recordPendingStatus(steamid, game.appid, status);
+              await flushStatuses();
 
               // Revalidate the recommendations page
               await fetch("/api/revalidate?path=/recommendations", {
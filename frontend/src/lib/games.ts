@@ -13,4 +13,15 @@ export const getGames = cache(async (): Promise<Game[]> => {
     { next: { revalidate: 3600 } }
   );
   return data.json();
-});
\ No newline at end of file
+});
+
+export const getSimilarGames = cache(async (appid: string): Promise<Game[]> => {
+  const data = await fetch(
+    `${process.env.NEXT_PUBLIC_API_URL}/games/${appid}/similar?top_n=6`,
+    { next: { revalidate: 3600 } }
+  );
+  if (!data.ok) {
+    return [];
+  }
+  return data.json();
+});